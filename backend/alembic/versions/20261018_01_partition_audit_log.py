@@ -0,0 +1,114 @@
+"""Partition audit_log by month on created_at
+
+Revision ID: 20261018_01
+Revises:
+Create Date: 2026-10-18 00:00:00
+
+Converts audit_log to RANGE partitioning on UNIX_TIMESTAMP(created_at) with
+one partition per month, or creates it partitioned on a fresh database.
+MySQL requires the partitioning column in the primary key and forbids
+foreign keys on partitioned tables, so the PK becomes (id, created_at) and
+the user_id foreign key is dropped. No-op on other databases.
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261018_01"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# Partitions created ahead of the current month; scripts/audit_log_maintenance.py
+# keeps extending them
+MONTHS_AHEAD = 3
+
+
+def _add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _partition_clause(first_month: date, last_month: date) -> str:
+    parts = []
+    month = first_month
+    while month <= last_month:
+        upper = _add_months(month, 1)
+        parts.append(
+            f"PARTITION p{month.year:04d}{month.month:02d} VALUES LESS THAN "
+            f"(UNIX_TIMESTAMP('{upper.isoformat()} 00:00:00'))"
+        )
+        month = upper
+    parts.append("PARTITION p_future VALUES LESS THAN MAXVALUE")
+    return "PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) (" + ", ".join(parts) + ")"
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "mysql":
+        return
+
+    today = date.today()
+    current = date(today.year, today.month, 1)
+    last_month = _add_months(current, MONTHS_AHEAD)
+    inspector = sa.inspect(bind)
+
+    if not inspector.has_table("audit_log"):
+        op.execute(
+            """
+            CREATE TABLE audit_log (
+                id INT NOT NULL AUTO_INCREMENT,
+                user_id INT NULL,
+                action_type VARCHAR(50) NOT NULL,
+                table_name VARCHAR(50) NOT NULL,
+                record_id INT NULL,
+                old_values JSON NULL,
+                new_values JSON NULL,
+                ip_address VARCHAR(45) NULL,
+                user_agent TEXT NULL,
+                created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (id, created_at),
+                INDEX ix_audit_log_user_id (user_id),
+                INDEX ix_audit_log_table_name (table_name),
+                INDEX ix_audit_log_record_id (record_id),
+                INDEX ix_audit_log_created_at (created_at),
+                INDEX idx_table_record (table_name, record_id)
+            ) """
+            + _partition_clause(current, last_month)
+        )
+        return
+
+    for fk in inspector.get_foreign_keys("audit_log"):
+        op.execute(f"ALTER TABLE audit_log DROP FOREIGN KEY `{fk['name']}`")
+
+    oldest = bind.execute(sa.text("SELECT MIN(created_at) FROM audit_log")).scalar()
+    first_month = date(oldest.year, oldest.month, 1) if oldest else current
+
+    op.execute(
+        "UPDATE audit_log SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL"
+    )
+    op.execute(
+        "ALTER TABLE audit_log "
+        "MODIFY created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+        "DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_at)"
+    )
+    op.execute("ALTER TABLE audit_log " + _partition_clause(first_month, last_month))
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "mysql":
+        return
+
+    op.execute("ALTER TABLE audit_log REMOVE PARTITIONING")
+    op.execute(
+        "ALTER TABLE audit_log DROP PRIMARY KEY, ADD PRIMARY KEY (id), "
+        "MODIFY created_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP"
+    )
+    op.execute(
+        "ALTER TABLE audit_log ADD CONSTRAINT audit_log_ibfk_1 "
+        "FOREIGN KEY (user_id) REFERENCES users (id)"
+    )
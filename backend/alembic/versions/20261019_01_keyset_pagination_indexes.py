@@ -0,0 +1,43 @@
+"""Composite indexes for keyset pagination of respondents and visits
+
+Revision ID: 20261019_01
+Revises: 20261018_01
+Create Date: 2026-10-19 00:00:00
+
+List endpoints seek on (created_at, id) and (visit_date, id), and per
+respondent on (respondent_id, visit_date, id). Indexes that already exist
+(e.g. created from the models on a fresh database) are left alone.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261019_01"
+down_revision = "20261018_01"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("idx_respondent_created_id", "respondents", ["created_at", "id"]),
+    ("idx_visit_date_id", "visits", ["visit_date", "id"]),
+    ("idx_visit_respondent_date_id", "visits", ["respondent_id", "visit_date", "id"]),
+]
+
+
+def _index_names(inspector, table: str) -> set:
+    return {index["name"] for index in inspector.get_indexes(table)}
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        if name not in _index_names(inspector, table):
+            op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    for name, table, _ in reversed(INDEXES):
+        if name in _index_names(inspector, table):
+            op.drop_index(name, table_name=table)
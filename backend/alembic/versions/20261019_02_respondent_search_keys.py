@@ -0,0 +1,113 @@
+"""Respondent search keys: digits-only phone column and trigram table
+
+Revision ID: 20261019_02
+Revises: 20261019_01
+Create Date: 2026-10-19 00:00:00
+
+Adds respondents.phone_normalized and respondent_search_tokens, then fills
+both for existing rows with the same functions the mapper events use
+(app.services.respondent_search), so search works right after the upgrade.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261019_02"
+down_revision = "20261019_01"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def _backfill(bind) -> None:
+    from app.services.respondent_search import normalize_phone, respondent_tokens
+
+    respondents = sa.table(
+        "respondents",
+        sa.column("id", sa.Integer),
+        sa.column("respondent_code", sa.String),
+        sa.column("phone", sa.String),
+        sa.column("email", sa.String),
+        sa.column("phone_normalized", sa.String),
+    )
+    tokens = sa.table(
+        "respondent_search_tokens",
+        sa.column("token", sa.String),
+        sa.column("respondent_id", sa.Integer),
+    )
+
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(
+                respondents.c.id,
+                respondents.c.respondent_code,
+                respondents.c.phone,
+                respondents.c.email,
+            )
+            .where(respondents.c.id > last_id)
+            .order_by(respondents.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        ids = [row.id for row in rows]
+        bind.execute(sa.delete(tokens).where(tokens.c.respondent_id.in_(ids)))
+        for row in rows:
+            bind.execute(
+                sa.update(respondents)
+                .where(respondents.c.id == row.id)
+                .values(phone_normalized=normalize_phone(row.phone) or None)
+            )
+        token_rows = [
+            {"token": token, "respondent_id": row.id}
+            for row in rows
+            for token in sorted(
+                respondent_tokens(row.respondent_code, row.phone, row.email)
+            )
+        ]
+        if token_rows:
+            bind.execute(sa.insert(tokens), token_rows)
+        last_id = ids[-1]
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    columns = {c["name"] for c in inspector.get_columns("respondents")}
+    if "phone_normalized" not in columns:
+        op.add_column(
+            "respondents", sa.Column("phone_normalized", sa.String(20), nullable=True)
+        )
+        op.create_index(
+            "ix_respondents_phone_normalized", "respondents", ["phone_normalized"]
+        )
+
+    if not inspector.has_table("respondent_search_tokens"):
+        op.create_table(
+            "respondent_search_tokens",
+            sa.Column("token", sa.String(16), nullable=False),
+            sa.Column(
+                "respondent_id",
+                sa.Integer,
+                sa.ForeignKey("respondents.id", ondelete="CASCADE"),
+                nullable=False,
+            ),
+            sa.PrimaryKeyConstraint("token", "respondent_id"),
+        )
+        op.create_index(
+            "ix_respondent_search_tokens_respondent_id",
+            "respondent_search_tokens",
+            ["respondent_id"],
+        )
+
+    _backfill(bind)
+
+
+def downgrade() -> None:
+    op.drop_table("respondent_search_tokens")
+    op.drop_index("ix_respondents_phone_normalized", table_name="respondents")
+    op.drop_column("respondents", "phone_normalized")
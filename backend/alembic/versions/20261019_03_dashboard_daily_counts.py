@@ -0,0 +1,63 @@
+"""Dashboard aggregates: dashboard_daily_counts
+
+Revision ID: 20261019_03
+Revises: 20261019_02
+Create Date: 2026-10-19 00:00:00
+
+Creates the per-bucket SANSA/MNA count table that /stats/summary reads and
+the response mapper events maintain, then fills it from the existing
+responses with app.services.dashboard_service.rebuild_dashboard_counts.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+
+# revision identifiers, used by Alembic.
+revision = "20261019_03"
+down_revision = "20261019_02"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if not sa.inspect(bind).has_table("dashboard_daily_counts"):
+        op.create_table(
+            "dashboard_daily_counts",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("instrument", sa.String(20), nullable=False),
+            sa.Column("visit_date", sa.Date, nullable=False),
+            sa.Column("facility_id", sa.Integer, nullable=False, server_default="0"),
+            sa.Column("sex", sa.String(20), nullable=False),
+            sa.Column("age_band", sa.String(10), nullable=False),
+            sa.Column("level", sa.String(50), nullable=False),
+            sa.Column(
+                "response_count", sa.Integer, nullable=False, server_default="0"
+            ),
+            sa.UniqueConstraint(
+                "instrument",
+                "visit_date",
+                "facility_id",
+                "sex",
+                "age_band",
+                "level",
+                name="unique_dashboard_bucket",
+            ),
+        )
+        op.create_index(
+            "ix_dashboard_daily_counts_id", "dashboard_daily_counts", ["id"]
+        )
+
+    from app.services.dashboard_service import rebuild_dashboard_counts
+
+    session = Session(bind=bind)
+    try:
+        rebuild_dashboard_counts(session)
+        session.flush()
+    finally:
+        session.close()
+
+
+def downgrade() -> None:
+    op.drop_table("dashboard_daily_counts")
@@ -0,0 +1,48 @@
+"""Code allocator counters: code_sequences
+
+Revision ID: 20261019_04
+Revises: 20261019_03
+Create Date: 2026-10-19 00:00:00
+
+Creates the named counters behind app.services.code_allocator and seeds the
+``respondent`` and ``facility`` rows at 0, so the first allocations update
+an existing row instead of racing to insert it. Rows that already exist keep
+their value; resetting a counter would reissue codes.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261019_04"
+down_revision = "20261019_03"
+branch_labels = None
+depends_on = None
+
+SEQUENCES = ["respondent", "facility"]
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if not sa.inspect(bind).has_table("code_sequences"):
+        op.create_table(
+            "code_sequences",
+            sa.Column("name", sa.String(50), primary_key=True),
+            sa.Column("next_value", sa.BigInteger, nullable=False, server_default="0"),
+        )
+
+    sequences = sa.table(
+        "code_sequences",
+        sa.column("name", sa.String),
+        sa.column("next_value", sa.BigInteger),
+    )
+    existing = set(bind.execute(sa.select(sequences.c.name)).scalars())
+    missing = [name for name in SEQUENCES if name not in existing]
+    if missing:
+        bind.execute(
+            sa.insert(sequences), [{"name": name, "next_value": 0} for name in missing]
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("code_sequences")
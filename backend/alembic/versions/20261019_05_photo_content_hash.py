@@ -0,0 +1,40 @@
+"""Food diary photos: content_sha256
+
+Revision ID: 20261019_05
+Revises: 20261019_04
+Create Date: 2026-10-19 00:00:00
+
+Adds the SHA-256 of the stored file to food_diary_photos. Photos uploaded
+before it keep a NULL hash; they are matched by their path instead.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261019_05"
+down_revision = "20261019_04"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    columns = {c["name"] for c in inspector.get_columns("food_diary_photos")}
+    if "content_sha256" not in columns:
+        op.add_column(
+            "food_diary_photos",
+            sa.Column("content_sha256", sa.String(64), nullable=True),
+        )
+        op.create_index(
+            "ix_food_diary_photos_content_sha256",
+            "food_diary_photos",
+            ["content_sha256"],
+        )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_food_diary_photos_content_sha256", table_name="food_diary_photos"
+    )
+    op.drop_column("food_diary_photos", "content_sha256")
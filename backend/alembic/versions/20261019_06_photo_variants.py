@@ -0,0 +1,32 @@
+"""Food diary photos: rendered variants
+
+Revision ID: 20261019_06
+Revises: 20261019_05
+Create Date: 2026-10-19 00:00:00
+
+Adds the JSON map of rendered variant URLs ({"thumb": url, "medium": url})
+to food_diary_photos. Existing photos start with NULL and are served at
+full size until ``scripts/generate_photo_variants.py`` renders them.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261019_06"
+down_revision = "20261019_05"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    columns = {c["name"] for c in inspector.get_columns("food_diary_photos")}
+    if "variants" not in columns:
+        op.add_column(
+            "food_diary_photos", sa.Column("variants", sa.JSON, nullable=True)
+        )
+
+
+def downgrade() -> None:
+    op.drop_column("food_diary_photos", "variants")
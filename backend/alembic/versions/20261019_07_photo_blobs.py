@@ -0,0 +1,87 @@
+"""Content-addressed photo storage: photo_blobs
+
+Revision ID: 20261019_07
+Revises: 20261019_06
+Create Date: 2026-10-19 00:00:00
+
+Creates the per-hash blob table behind app.services.photo_store and fills
+it from photos that already carry a content_sha256, with ref_count set to
+the number of photos sharing each hash. Blobs that already exist are left
+alone; ``scripts/photo_storage_maintenance.py gc`` repairs drifted counts.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261019_07"
+down_revision = "20261019_06"
+branch_labels = None
+depends_on = None
+
+
+def _backfill(bind) -> None:
+    photos = sa.table(
+        "food_diary_photos",
+        sa.column("content_sha256", sa.String),
+        sa.column("file_path", sa.String),
+        sa.column("file_size_bytes", sa.Integer),
+        sa.column("mime_type", sa.String),
+    )
+    blobs = sa.table(
+        "photo_blobs",
+        sa.column("sha256", sa.String),
+        sa.column("file_path", sa.String),
+        sa.column("size_bytes", sa.Integer),
+        sa.column("mime_type", sa.String),
+        sa.column("ref_count", sa.Integer),
+    )
+
+    # Photos with the same hash share one file, path and type
+    rows = bind.execute(
+        sa.select(
+            photos.c.content_sha256,
+            sa.func.min(photos.c.file_path),
+            sa.func.min(photos.c.file_size_bytes),
+            sa.func.min(photos.c.mime_type),
+            sa.func.count(),
+        )
+        .where(photos.c.content_sha256.isnot(None))
+        .group_by(photos.c.content_sha256)
+    ).all()
+    existing = set(bind.execute(sa.select(blobs.c.sha256)).scalars())
+    values = [
+        {
+            "sha256": sha256,
+            "file_path": file_path,
+            "size_bytes": size_bytes,
+            "mime_type": mime_type,
+            "ref_count": count,
+        }
+        for sha256, file_path, size_bytes, mime_type, count in rows
+        if sha256 not in existing
+    ]
+    if values:
+        bind.execute(sa.insert(blobs), values)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if not sa.inspect(bind).has_table("photo_blobs"):
+        op.create_table(
+            "photo_blobs",
+            sa.Column("sha256", sa.String(64), primary_key=True),
+            sa.Column("file_path", sa.String(500), nullable=False),
+            sa.Column("size_bytes", sa.Integer),
+            sa.Column("mime_type", sa.String(100)),
+            sa.Column("ref_count", sa.Integer, nullable=False, server_default="0"),
+            sa.Column("created_at", sa.TIMESTAMP, server_default=sa.func.now()),
+            sa.Column("updated_at", sa.TIMESTAMP, server_default=sa.func.now()),
+        )
+        op.create_index("ix_photo_blobs_ref_count", "photo_blobs", ["ref_count"])
+
+    _backfill(bind)
+
+
+def downgrade() -> None:
+    op.drop_table("photo_blobs")
@@ -0,0 +1,38 @@
+"""Composite index for food diary listings
+
+Revision ID: 20261019_08
+Revises: 20261019_07
+Create Date: 2026-10-19 00:00:00
+
+Diary listings filter by visit, date range and meal type. An index that
+already exists (e.g. created from the models on a fresh database) is left
+alone.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261019_08"
+down_revision = "20261019_07"
+branch_labels = None
+depends_on = None
+
+INDEX = "idx_food_diary_visit_date_meal"
+TABLE = "food_diary_entries"
+
+
+def _index_names(inspector, table: str) -> set:
+    return {index["name"] for index in inspector.get_indexes(table)}
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if INDEX not in _index_names(inspector, TABLE):
+        op.create_index(INDEX, TABLE, ["visit_id", "entry_date", "meal_type"])
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if INDEX in _index_names(inspector, TABLE):
+        op.drop_index(INDEX, table_name=TABLE)
@@ -0,0 +1,247 @@
+"""Audit trail capture and asynchronous batched writing.
+
+Changes to audited models are captured from the session's ``after_flush``
+attribute history, held on the session until the transaction commits, and
+then handed to ``audit_writer``. The writer drains its bounded queue on a
+background thread and stores rows with one multi-row INSERT per batch, so
+request handlers never wait on ``audit_log`` writes.
+
+Request context (user, IP address, user agent) is read from ``Session.info``,
+which ``get_db`` and the auth dependencies fill in.
+"""
+
+import enum
+import logging
+import queue
+import threading
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Optional
+
+from sqlalchemy import event, inspect, insert
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.database import engine
+from app.models import (
+    AuditLog,
+    BIARecord,
+    Facility,
+    FoodDiaryEntry,
+    KnowledgePost,
+    MNAResponse,
+    Respondent,
+    SANSAResponse,
+    SatisfactionResponse,
+    ScoringRuleValue,
+    ScoringRuleVersion,
+    User,
+    Visit,
+)
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+AUDITED_MODELS = (
+    Respondent,
+    Visit,
+    SANSAResponse,
+    MNAResponse,
+    BIARecord,
+    SatisfactionResponse,
+    FoodDiaryEntry,
+    Facility,
+    KnowledgePost,
+    ScoringRuleVersion,
+    ScoringRuleValue,
+    User,
+)
+
+# Never copied into audit rows
+EXCLUDED_COLUMNS = {"hashed_password"}
+
+# Session.info keys describing who made the change
+AUDIT_USER_ID = "audit_user_id"
+AUDIT_IP_ADDRESS = "audit_ip_address"
+AUDIT_USER_AGENT = "audit_user_agent"
+
+_PENDING = "audit_pending"
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+
+def _column_values(obj) -> dict:
+    # Only already-loaded values: reading expired server defaults would
+    # issue a SELECT in the middle of the flush
+    state = inspect(obj)
+    return {
+        attr.key: _jsonable(state.dict[attr.key])
+        for attr in state.mapper.column_attrs
+        if attr.key not in EXCLUDED_COLUMNS and attr.key in state.dict
+    }
+
+
+def _changed_values(obj) -> tuple[dict, dict]:
+    state = inspect(obj)
+    old_values, new_values = {}, {}
+    for attr in state.mapper.column_attrs:
+        if attr.key in EXCLUDED_COLUMNS:
+            continue
+        history = state.attrs[attr.key].history
+        if not history.has_changes():
+            continue
+        old_values[attr.key] = _jsonable(history.deleted[0]) if history.deleted else None
+        new_values[attr.key] = _jsonable(history.added[0]) if history.added else None
+    return old_values, new_values
+
+
+def _record(session: Session, action_type: str, obj, old_values, new_values) -> dict:
+    return {
+        "user_id": session.info.get(AUDIT_USER_ID),
+        "action_type": action_type,
+        "table_name": obj.__tablename__,
+        "record_id": inspect(obj).mapper.primary_key_from_instance(obj)[0],
+        "old_values": old_values,
+        "new_values": new_values,
+        "ip_address": session.info.get(AUDIT_IP_ADDRESS),
+        "user_agent": session.info.get(AUDIT_USER_AGENT),
+    }
+
+
+class AuditWriter:
+    """Background writer that stores audit records in batches
+
+    ``submit`` blocks for at most ``AUDIT_ENQUEUE_TIMEOUT_SECONDS`` when the
+    queue is full; if the writer still has not caught up, the records are
+    written inline so back-pressure slows the caller instead of losing audit
+    history.
+    """
+
+    def __init__(
+        self,
+        max_queue_size: int,
+        batch_size: int,
+        flush_interval_seconds: float,
+        enqueue_timeout_seconds: float,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.enqueue_timeout_seconds = enqueue_timeout_seconds
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        if self.is_running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="audit-writer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the writer after flushing everything already queued"""
+        if not self.is_running:
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        self._thread = None
+        # Anything submitted while the thread was exiting
+        self._write(self._drain(self._queue.qsize()))
+
+    def submit(self, records: list[dict]) -> None:
+        for i, record in enumerate(records):
+            try:
+                self._queue.put(record, timeout=self.enqueue_timeout_seconds)
+            except queue.Full:
+                self._write(records[i:])
+                return
+
+    def _drain(self, limit: int) -> list[dict]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not self._stopping.is_set() or not self._queue.empty():
+            try:
+                first = self._queue.get(timeout=self.flush_interval_seconds)
+            except queue.Empty:
+                continue
+            batch = [first] + self._drain(self.batch_size - 1)
+            try:
+                self._write(batch)
+            except Exception:
+                logger.exception("Audit writer failed to store %d records", len(batch))
+
+    def _write(self, records: list[dict]) -> None:
+        if not records:
+            return
+        # executemany on a single INSERT; PyMySQL sends it as one multi-row statement
+        with engine.begin() as conn:
+            conn.execute(insert(AuditLog.__table__), records)
+
+
+audit_writer = AuditWriter(
+    max_queue_size=settings.AUDIT_QUEUE_SIZE,
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_interval_seconds=settings.AUDIT_FLUSH_INTERVAL_SECONDS,
+    enqueue_timeout_seconds=settings.AUDIT_ENQUEUE_TIMEOUT_SECONDS,
+)
+
+
+@event.listens_for(Session, "after_flush")
+def _capture_changes(session: Session, flush_context) -> None:
+    if not audit_writer.is_running:
+        return
+    pending = session.info.setdefault(_PENDING, [])
+
+    for obj in session.new:
+        if isinstance(obj, AUDITED_MODELS):
+            pending.append(_record(session, "create", obj, None, _column_values(obj)))
+
+    for obj in session.dirty:
+        if isinstance(obj, AUDITED_MODELS) and session.is_modified(obj):
+            old_values, new_values = _changed_values(obj)
+            if new_values:
+                pending.append(
+                    _record(session, "update", obj, old_values, new_values)
+                )
+
+    for obj in session.deleted:
+        if isinstance(obj, AUDITED_MODELS):
+            pending.append(_record(session, "delete", obj, _column_values(obj), None))
+
+
+@event.listens_for(Session, "after_commit")
+def _submit_pending(session: Session) -> None:
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        audit_writer.submit(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session) -> None:
+    session.info.pop(_PENDING, None)
@@ -1,30 +1,55 @@
+import logging
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from starlette.concurrency import run_in_threadpool
+from app.cache import TTLCache
 from app.config import get_settings
-from app.database import get_db
+from app.database import get_db, use_primary
 from app.models import User
+from app.passwords import check_password, hash_password, hash_rounds, password_hasher
 from app.schemas import TokenData
 
 settings = get_settings()
 security = HTTPBearer()
+logger = logging.getLogger(__name__)
+
+# Decoded access/refresh tokens, each kept until the token itself expires
+_token_cache = TTLCache(
+    maxsize=settings.AUTH_TOKEN_CACHE_SIZE,
+    ttl_seconds=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+)
+
+# Column snapshots of active users, keyed by user id
+_user_cache = TTLCache(
+    maxsize=settings.AUTH_USER_CACHE_SIZE,
+    ttl_seconds=settings.AUTH_USER_CACHE_TTL_SECONDS,
+)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against a hash"""
-    return bcrypt.checkpw(
-        plain_password.encode("utf-8"), hashed_password.encode("utf-8")
-    )
+    """Verify a password against a hash (inline; for scripts)"""
+    return check_password(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    """Hash a password"""
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password.encode("utf-8"), salt).decode("utf-8")
+    """Hash a password at the configured cost (inline; for scripts)"""
+    return hash_password(password, settings.BCRYPT_ROUNDS)
+
+
+async def verify_password_pooled(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password in the password process pool"""
+    return await password_hasher.verify(plain_password, hashed_password)
+
+
+async def get_password_hash_pooled(password: str) -> str:
+    """Hash a password in the password process pool"""
+    return await password_hasher.hash(password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -55,57 +80,87 @@ def create_refresh_token(data: dict) -> str:
 
 
 def decode_token(token: str) -> TokenData:
-    """Decode and verify JWT token"""
+    """Decode and verify JWT token
+
+    Successful decodes are cached until the token's own expiry, so repeat
+    requests with the same token skip signature verification.
+    """
+    cached = _token_cache.get(token)
+    if cached is not None:
+        return cached
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        print(f"DEBUG decode_token: token={token[:50]}...")
-        print(f"DEBUG decode_token: secret={settings.JWT_SECRET_KEY}")
-        print(f"DEBUG decode_token: algorithm={settings.JWT_ALGORITHM}")
         payload = jwt.decode(
             token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM]
         )
-        print(f"DEBUG decode_token: payload={payload}")
-        user_id_str: str = payload.get("sub")
-        if user_id_str is None:
-            print("DEBUG decode_token: user_id is None!")
-            raise credentials_exception
-        user_id: int = int(user_id_str)
-        username: str = payload.get("username")
-        role: str = payload.get("role")
-        token_data = TokenData(user_id=user_id, username=username, role=role)
-        print(f"DEBUG decode_token: Success! token_data={token_data}")
-        return token_data
     except JWTError as e:
-        print(f"DEBUG decode_token: JWTError={e}")
+        logger.debug("Rejected token: %s", e)
         raise credentials_exception
 
+    user_id_str: str = payload.get("sub")
+    if user_id_str is None:
+        logger.debug("Rejected token without subject")
+        raise credentials_exception
+    token_data = TokenData(
+        user_id=int(user_id_str),
+        username=payload.get("username"),
+        role=payload.get("role"),
+    )
+
+    expires_in = payload.get("exp", 0) - time.time()
+    _token_cache.set(token, token_data, ttl_seconds=expires_in)
+    return token_data
+
+
+def _load_user(db: Session, user_id: int) -> Optional[User]:
+    """Load a user, serving repeat lookups from the snapshot cache
+
+    Cached snapshots are merged into the session without a SELECT, so the
+    returned object behaves like a normally loaded instance.
+    """
+    snapshot = _user_cache.get(user_id)
+    if snapshot is not None:
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        return db.merge(user, load=False)
+
+    with use_primary(db):
+        user = db.query(User).filter(User.id == user_id).first()
+    if user is not None and user.is_active:
+        _user_cache.set(
+            user_id,
+            {
+                attr.key: getattr(user, attr.key)
+                for attr in inspect(User).column_attrs
+            },
+        )
+    return user
+
+
+def invalidate_cached_user(user_id: int) -> None:
+    """Drop a user's cached snapshot after it has been changed"""
+    _user_cache.invalidate(user_id)
+
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db),
 ) -> User:
     """Get current authenticated user"""
-    try:
-        token = credentials.credentials
-        print(f"DEBUG: Received token: {token[:50]}...")
-        token_data = decode_token(token)
-        print(
-            f"DEBUG: Token data: user_id={token_data.user_id}, username={token_data.username}"
-        )
-        user = db.query(User).filter(User.id == token_data.user_id).first()
-        print(f"DEBUG: User found: {user}")
-        if user is None:
-            raise HTTPException(status_code=404, detail="User not found")
-        if not user.is_active:
-            raise HTTPException(status_code=400, detail="Inactive user")
-        return user
-    except Exception as e:
-        print(f"DEBUG: Error in get_current_user: {e}")
-        raise
+    token_data = decode_token(credentials.credentials)
+    user = _load_user(db, token_data.user_id)
+    if user is None:
+        logger.debug("Token for unknown user id %s", token_data.user_id)
+        raise HTTPException(status_code=404, detail="User not found")
+    if not user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    db.info["audit_user_id"] = user.id
+    return user
 
 
 async def get_current_active_admin(
@@ -142,21 +197,35 @@ async def get_current_user_optional(
         return None
 
     try:
-        token = credentials.credentials
-        token_data = decode_token(token)
-        user = db.query(User).filter(User.id == token_data.user_id).first()
+        token_data = decode_token(credentials.credentials)
+        user = _load_user(db, token_data.user_id)
         if user and user.is_active:
+            db.info["audit_user_id"] = user.id
             return user
         return None
     except:
         return None
 
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
-    """Authenticate a user"""
-    user = db.query(User).filter(User.username == username).first()
+async def authenticate_user(
+    db: Session, username: str, password: str
+) -> Optional[User]:
+    """Authenticate a user
+
+    Hashes made with a different cost than BCRYPT_ROUNDS are transparently
+    rehashed after a successful login. Database calls run in the threadpool;
+    bcrypt is awaited on the password pool.
+    """
+    user = await run_in_threadpool(
+        lambda: db.query(User).filter(User.username == username).first()
+    )
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_pooled(password, user.hashed_password):
         return None
+
+    if hash_rounds(user.hashed_password) != settings.BCRYPT_ROUNDS:
+        user.hashed_password = await get_password_hash_pooled(password)
+        await run_in_threadpool(db.commit)
+        invalidate_cached_user(user.id)
     return user
@@ -0,0 +1,330 @@
+"""In-process caches and HTTP validators.
+
+``TTLCache`` is a small thread-safe LRU map whose entries also expire after a
+time-to-live. It is per process: with several workers each one holds its own
+copy, so callers keep TTLs short and invalidate explicitly on writes.
+
+``etag_for`` and ``if_none_match`` let endpoints answer conditional GETs
+with 304 when the client already holds the current representation.
+``RenderedBody`` holds a response serialized and gzip-compressed once, for
+content that is read far more often than it changes.
+
+``CommitHook`` gathers changes made during a transaction, from mapper
+events or explicit calls, and applies them once the session commits; a
+rollback discards them. ``Snapshot`` builds on it: one per-process value
+loaded from the database, dropped whenever a commit writes the models it was
+built from. Both only see writes made through this process, so a snapshot
+also expires after a TTL to pick up writes made by other workers.
+
+``ResponseCache`` is a read-through cache of rendered bodies for reference
+data. Entries expire after a TTL and carry tags. ``invalidate_tags_on_change``
+ties tags to a model's mapper events, and ``invalidate_tags_on_commit`` queues
+them by hand for writes that bypass those events (bulk updates); either way
+every cached body depending on a tag is dropped once the transaction
+commits. Hits and misses are counted in ``response_cache_requests_total``.
+"""
+
+import gzip
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable, Iterable, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app.database import use_primary
+from app.metrics import Counter
+
+_MISSING = object()
+
+cache_requests = Counter(
+    "response_cache_requests_total",
+    "Response cache lookups by cache name and result (hit, miss)",
+)
+
+
+class TTLCache:
+    """Bounded LRU cache with per-entry expiry"""
+
+    def __init__(self, maxsize: int, ttl_seconds: float):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_matching(self, predicate: Callable[[Hashable], bool]) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if predicate(k)]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def etag_for(body: bytes) -> str:
+    """Strong ETag for a response body"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def if_none_match(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match already names ``etag``"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates
+
+
+@dataclass(frozen=True)
+class RenderedBody:
+    """A response body with its gzip encoding and strong ETags precomputed"""
+
+    body: bytes
+    gzipped: bytes
+    etag: str
+    gzip_etag: str  # strong ETags differ per content-coding
+
+    @classmethod
+    def from_bytes(cls, body: bytes) -> "RenderedBody":
+        etag = etag_for(body)
+        return cls(
+            body=body,
+            gzipped=gzip.compress(body, compresslevel=9, mtime=0),
+            etag=etag,
+            gzip_etag=etag[:-1] + '-gzip"',
+        )
+
+    def response(
+        self,
+        request: Request,
+        media_type: str = "application/json",
+        cache_control: str = "no-cache",
+    ) -> Response:
+        """200 in the best accepted encoding, or 304 if the client is current"""
+        use_gzip = "gzip" in request.headers.get("accept-encoding", "").lower()
+        etag = self.gzip_etag if use_gzip else self.etag
+        headers = {
+            "ETag": etag,
+            "Cache-Control": cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if any(if_none_match(request, tag) for tag in (self.etag, self.gzip_etag)):
+            return Response(status_code=304, headers=headers)
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+            body = self.gzipped
+        else:
+            body = self.body
+        return Response(content=body, media_type=media_type, headers=headers)
+
+
+_commit_hooks: list["CommitHook"] = []
+
+
+class CommitHook:
+    """Changes recorded during a transaction, applied once it commits
+
+    Items are collected per session in a ``factory()`` container (a set by
+    default; a ``Counter`` fed ``{item: delta}`` mappings adds up deltas) and
+    handed to ``apply`` after the commit.
+    """
+
+    def __init__(self, apply: Callable[[Any], None], factory: Callable[[], Any] = set):
+        self.apply = apply
+        self.factory = factory
+        _commit_hooks.append(self)
+
+    def record(self, session: Session, items: Iterable) -> None:
+        session.info.setdefault(self, self.factory()).update(items)
+
+    def watch(
+        self, model: type, changes: Optional[Callable[[Any], Iterable]] = None
+    ) -> None:
+        """Record ``changes(target)`` for every insert, update and delete of
+        ``model`` (by default the target's primary key)
+
+        Mapper events cover every ORM write path; bulk ``Query.update`` and
+        raw SQL bypass them.
+        """
+
+        def _record(mapper, connection, target):
+            session = object_session(target)
+            if session is None:
+                return
+            if changes is not None:
+                self.record(session, changes(target))
+            else:
+                key = mapper.primary_key_from_instance(target)
+                self.record(session, [key[0] if len(key) == 1 else tuple(key)])
+
+        for name in ("after_insert", "after_update", "after_delete"):
+            event.listen(model, name, _record)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_committed(session):
+    for hook in _commit_hooks:
+        items = session.info.pop(hook, None)
+        if items:
+            hook.apply(items)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    for hook in _commit_hooks:
+        session.info.pop(hook, None)
+
+
+class Snapshot:
+    """A per-process value built from the database, shared by all requests
+
+    ``get`` returns the current value, calling ``build(db)`` on the primary
+    first if there is none or it is older than ``ttl_seconds``. ``invalidate`` drops it, and
+    ``invalidate_on_change`` does so after every commit that writes the given
+    models.
+    """
+
+    def __init__(self, build: Callable[[Session], Any], ttl_seconds: float):
+        self._build = build
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entry: Optional[tuple[float, Any]] = None  # (built at, value)
+        self._generation = 0  # bumped on every invalidation
+        self._hook = CommitHook(lambda _: self.invalidate())
+
+    def _fresh(self) -> Any:
+        entry = self._entry
+        if entry is not None and time.monotonic() - entry[0] < self.ttl_seconds:
+            return entry[1]
+        return _MISSING
+
+    def get(self, db: Session) -> Any:
+        value = self._fresh()
+        if value is not _MISSING:
+            return value
+        with self._lock:
+            value = self._fresh()
+            if value is not _MISSING:
+                return value
+            generation = self._generation
+            with use_primary(db):
+                value = self._build(db)
+            # A commit that landed while it was being read may not be in it;
+            # serve it once but do not keep it
+            if generation == self._generation:
+                self._entry = (time.monotonic(), value)
+            return value
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._entry = None
+
+    def invalidate_on_change(self, *models: type) -> None:
+        for model in models:
+            self._hook.watch(model)
+
+
+_response_caches: list["ResponseCache"] = []
+
+
+class ResponseCache:
+    """Read-through cache of ``RenderedBody`` entries with TTL and tags
+
+    Each entry keeps the generation of its tags when it was rendered;
+    invalidating a tag bumps its generation, so older entries miss on their
+    next read and age out of the LRU like any other. Tags are meant to be a
+    few fixed names, such as one per reference table.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl_seconds: float):
+        self.name = name
+        self._entries = TTLCache(maxsize=maxsize, ttl_seconds=ttl_seconds)
+        self._lock = threading.Lock()
+        self._tag_generations: dict[str, int] = {}
+        _response_caches.append(self)
+
+    def _current(self, tags: Iterable[str]) -> tuple:
+        return tuple((tag, self._tag_generations.get(tag, 0)) for tag in tags)
+
+    def get_or_render(
+        self, key: Hashable, render: Callable[[], bytes], tags: Iterable[str] = ()
+    ) -> RenderedBody:
+        """The cached body for ``key``, or ``render()`` stored under ``tags``"""
+        cached = self._entries.get(key)
+        if cached is not None:
+            rendered, generations = cached
+            if generations == self._current(tag for tag, _ in generations):
+                cache_requests.inc(cache=self.name, result="hit")
+                return rendered
+            self._entries.invalidate(key)
+        cache_requests.inc(cache=self.name, result="miss")
+
+        # Taken before rendering, so an invalidation during render makes the
+        # new entry stale at once
+        generations = self._current(tags)
+        rendered = RenderedBody.from_bytes(render())
+        self._entries.set(key, (rendered, generations))
+        return rendered
+
+    def invalidate_tags(self, *tags: str) -> None:
+        with self._lock:
+            for tag in tags:
+                self._tag_generations[tag] = self._tag_generations.get(tag, 0) + 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+def invalidate_tags(*tags: str) -> None:
+    """Drop entries carrying any of ``tags`` from every response cache"""
+    for cache in _response_caches:
+        cache.invalidate_tags(*tags)
+
+
+_tag_invalidation = CommitHook(lambda tags: invalidate_tags(*tags))
+
+
+def invalidate_tags_on_commit(session: Session, *tags: str) -> None:
+    """Invalidate ``tags`` once ``session`` commits (nothing on rollback)"""
+    _tag_invalidation.record(session, tags)
+
+
+def invalidate_tags_on_change(model: type, *tags: str) -> None:
+    """Invalidate ``tags`` after every commit that writes ``model``"""
+    _tag_invalidation.watch(model, lambda target: tags)
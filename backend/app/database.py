@@ -1,6 +1,13 @@
-from sqlalchemy import create_engine
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from fastapi import Request
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql.dml import UpdateBase
 from app.config import get_settings
 
 settings = get_settings()
@@ -12,14 +19,148 @@ engine = create_engine(
     echo=settings.DEBUG
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Optional read replica; without READ_DATABASE_URL everything uses the primary
+read_engine = (
+    create_engine(
+        settings.READ_DATABASE_URL,
+        pool_pre_ping=True,
+        pool_recycle=3600,
+        echo=settings.DEBUG,
+    )
+    if settings.READ_DATABASE_URL
+    else None
+)
+
+# Session.info key: route this session's reads to the replica when healthy
+PREFER_REPLICA = "prefer_replica"
+# Session.info key: set once the session has written; later reads stay on primary
+HAS_WRITTEN = "has_written"
+
+
+class ReplicaLagMonitor:
+    """Periodically checks replication lag and reports whether reads may use it
+
+    The check runs at most once per interval and its result is shared by all
+    sessions. Any failure to read the lag counts as unhealthy so reads fall
+    back to the primary rather than serving stale data.
+    """
+
+    def __init__(self, replica, max_lag_seconds: int, interval_seconds: int):
+        self.replica = replica
+        self.max_lag_seconds = max_lag_seconds
+        self.interval_seconds = interval_seconds
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._healthy = False
+
+    def is_healthy(self) -> bool:
+        now = time.monotonic()
+        if now - self._checked_at < self.interval_seconds:
+            return self._healthy
+        with self._lock:
+            if now - self._checked_at >= self.interval_seconds:
+                self._healthy = self._check()
+                self._checked_at = time.monotonic()
+        return self._healthy
+
+    def _check(self) -> bool:
+        if self.replica.dialect.name != "mysql":
+            return True
+        try:
+            lag = self._read_lag()
+        except Exception:
+            return False
+        return lag is not None and lag <= self.max_lag_seconds
+
+    def _read_lag(self) -> Optional[int]:
+        with self.replica.connect() as conn:
+            try:
+                row = conn.execute(text("SHOW REPLICA STATUS")).mappings().first()
+                key = "Seconds_Behind_Source"
+            except Exception:
+                # MySQL < 8.0.22
+                row = conn.execute(text("SHOW SLAVE STATUS")).mappings().first()
+                key = "Seconds_Behind_Master"
+        if row is None:
+            # Not configured as a replica (e.g. a standby copy); treat as current
+            return 0
+        return row[key]
+
+
+replica_monitor = (
+    ReplicaLagMonitor(
+        read_engine,
+        max_lag_seconds=settings.REPLICA_MAX_LAG_SECONDS,
+        interval_seconds=settings.REPLICA_LAG_CHECK_INTERVAL_SECONDS,
+    )
+    if read_engine is not None
+    else None
+)
+
+
+class RoutingSession(Session):
+    """Session that sends reads to the replica and everything else to the primary
+
+    Reads go to the replica only when the session asked for it (see
+    ``use_replica``), has not written anything yet, and the replica is within
+    the allowed lag. Flushes and bulk DML always use the primary and make the
+    session sticky to it, so a request reads its own writes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info[HAS_WRITTEN] = True
+            return engine
+        if (
+            replica_monitor is not None
+            and self.info.get(PREFER_REPLICA)
+            and not self.info.get(HAS_WRITTEN)
+            and replica_monitor.is_healthy()
+        ):
+            return read_engine
+        return engine
+
+
+def use_replica(db: Session) -> Session:
+    """Mark a session's reads as safe to serve from the read replica"""
+    db.info[PREFER_REPLICA] = True
+    return db
+
+
+@contextmanager
+def use_primary(db: Session) -> Iterator[Session]:
+    """Read from the primary inside the block, whatever the session prefers
+
+    Anything loaded into a per-process cache must come from here: a cache
+    refilled from a lagging replica right after a commit invalidated it would
+    keep the old value for its whole TTL.
+    """
+    preferred = db.info.pop(PREFER_REPLICA, None)
+    try:
+        yield db
+    finally:
+        if preferred is not None:
+            db.info[PREFER_REPLICA] = preferred
+
+
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, bind=engine, class_=RoutingSession
+)
 
 Base = declarative_base()
 
 
-def get_db():
-    """Dependency for getting database session"""
+def get_db(request: Request):
+    """Dependency for getting database session
+
+    GET requests prefer the read replica when one is configured. The client
+    address and user agent are kept on the session for the audit trail.
+    """
     db = SessionLocal()
+    if request.method == "GET":
+        use_replica(db)
+    db.info["audit_ip_address"] = request.client.host if request.client else None
+    db.info["audit_user_agent"] = request.headers.get("user-agent")
     try:
         yield db
     finally:
@@ -1,8 +1,18 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+import logging
 import os
+from app.audit import audit_writer
 from app.config import get_settings
+from app.database import SessionLocal
+from app.metrics import render_prometheus
+from app.passwords import password_hasher
+from app.pagination import NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER
+from app.services.image_pipeline import image_pipeline
+from app.services.knowledge_search import load_search_index
+from app.services.menu_suggestions import rebuild_menu_index
+from app.services.respondent_lookup import warm_respondent_cache
 from app.routers import (
     auth,
     respondents,
@@ -16,9 +26,12 @@ from app.routers import (
     facilities,
     knowledge,
     scoring,
+    stats,
+    storage,
 )
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="SANSA Research System",
@@ -39,14 +52,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER],
 )
 
 # Create uploads directory if it doesn't exist
 os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
 
-# Mount static files for uploads
-app.mount("/uploads", StaticFiles(directory=settings.UPLOAD_DIR), name="uploads")
-
 # Include routers
 app.include_router(auth.router)
 app.include_router(respondents.router)
@@ -60,6 +71,74 @@ app.include_router(food_diary.router)
 app.include_router(facilities.router)
 app.include_router(knowledge.router)
 app.include_router(scoring.router)
+app.include_router(stats.router)
+app.include_router(storage.router)  # also serves /uploads
+
+
+@app.on_event("startup")
+def start_audit_writer():
+    if settings.AUDIT_ENABLED:
+        audit_writer.start()
+
+
+@app.on_event("startup")
+def warm_respondent_lookups():
+    # Preload today's scheduled respondents for the kiosk flow; a failure
+    # here only costs cache misses, so it must not block startup
+    if not settings.RESPONDENT_CACHE_WARMUP:
+        return
+    db = SessionLocal()
+    try:
+        count = warm_respondent_cache(db)
+        logger.info("Preloaded %d respondents into the lookup cache", count)
+    except Exception:
+        logger.warning("Respondent cache warm-up failed", exc_info=True)
+    finally:
+        db.close()
+
+
+@app.on_event("startup")
+def build_menu_index():
+    # Built lazily on the first suggestion request if this fails
+    db = SessionLocal()
+    try:
+        count = rebuild_menu_index(db)
+        logger.info("Indexed %d distinct menu names", count)
+    except Exception:
+        logger.warning("Menu name index build failed", exc_info=True)
+    finally:
+        db.close()
+
+
+@app.on_event("startup")
+def load_knowledge_search():
+    # Loads the saved snapshot and re-indexes only posts changed since;
+    # the first search retries if this fails
+    db = SessionLocal()
+    try:
+        count = load_search_index(db)
+        logger.info("Knowledge search index holds %d posts", count)
+    except Exception:
+        logger.warning("Knowledge search index load failed", exc_info=True)
+    finally:
+        db.close()
+
+
+@app.on_event("shutdown")
+def stop_audit_writer():
+    # Flush queued audit records before the process exits
+    audit_writer.stop()
+
+
+@app.on_event("shutdown")
+def stop_password_hasher():
+    password_hasher.shutdown()
+
+
+@app.on_event("shutdown")
+def stop_image_pipeline():
+    # Let queued thumbnails finish so their rows get updated
+    image_pipeline.shutdown()
 
 
 @app.get("/")
@@ -77,3 +156,9 @@ def root():
 def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Process-local metrics in Prometheus text format"""
+    return render_prometheus()
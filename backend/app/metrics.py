@@ -0,0 +1,96 @@
+"""Process-local metrics exposed at ``GET /metrics``.
+
+A deliberately small subset of the Prometheus data model (counters and
+gauges with optional labels) rendered in the text exposition format, so no
+client library is needed. Values are per worker process.
+"""
+
+import threading
+from typing import Callable, Optional
+
+_registry: dict[str, "_Metric"] = {}
+_registry_lock = threading.Lock()
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: tuple) -> str:
+    if not key:
+        return ""
+    inner = ",".join(f'{name}="{value}"' for name, value in key)
+    return "{" + inner + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+        self._values: dict[tuple, float] = {}
+        with _registry_lock:
+            _registry[name] = self
+
+    def samples(self) -> list[tuple[tuple, float]]:
+        with self._lock:
+            return list(self._values.items())
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Gauge set directly, or computed on scrape from ``callback``"""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        callback: Optional[Callable[[], float]] = None,
+    ):
+        super().__init__(name, description)
+        self.callback = callback
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self) -> list[tuple[tuple, float]]:
+        if self.callback is not None:
+            return [((), self.callback())]
+        return super().samples()
+
+
+def render_prometheus() -> str:
+    lines = []
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda m: m.name)
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.description}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for key, value in sorted(metric.samples()):
+            lines.append(f"{metric.name}{_format_labels(key)} {value:g}")
+    return "\n".join(lines) + "\n"
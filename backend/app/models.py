@@ -1,6 +1,7 @@
 from sqlalchemy import (
     Column,
     Integer,
+    BigInteger,
     String,
     Boolean,
     TIMESTAMP,
@@ -115,6 +116,9 @@ class Respondent(Base):
     phone = Column(String(20))
     email = Column(String(100))
 
+    # Search keys (maintained by app.services.respondent_search)
+    phone_normalized = Column(String(20), index=True)  # digits only
+
     # Metadata
     created_by = Column(Integer, ForeignKey("users.id"))
     created_at = Column(TIMESTAMP, server_default=func.now(), index=True)
@@ -129,6 +133,25 @@ class Respondent(Base):
         "Visit", back_populates="respondent", cascade="all, delete-orphan"
     )
 
+    __table_args__ = (
+        # Keyset pagination seeks on (created_at, id)
+        Index("idx_respondent_created_id", "created_at", "id"),
+    )
+
+
+class RespondentSearchToken(Base):
+    """Trigram index over respondent code, phone and email for substring search"""
+
+    __tablename__ = "respondent_search_tokens"
+
+    token = Column(String(16), primary_key=True)
+    respondent_id = Column(
+        Integer,
+        ForeignKey("respondents.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+    )
+
 
 class Facility(Base):
     __tablename__ = "facilities"
@@ -218,6 +241,9 @@ class Visit(Base):
         UniqueConstraint(
             "respondent_id", "visit_number", name="unique_respondent_visit"
         ),
+        # Keyset pagination seeks on (visit_date, id)
+        Index("idx_visit_date_id", "visit_date", "id"),
+        Index("idx_visit_respondent_date_id", "respondent_id", "visit_date", "id"),
     )
 
 
@@ -540,6 +566,13 @@ class FoodDiaryEntry(Base):
         "FoodDiaryPhoto", back_populates="diary_entry", cascade="all, delete-orphan"
     )
 
+    __table_args__ = (
+        # Diary listings filter by visit, date range and meal type
+        Index(
+            "idx_food_diary_visit_date_meal", "visit_id", "entry_date", "meal_type"
+        ),
+    )
+
 
 class FoodDiaryPhoto(Base):
     __tablename__ = "food_diary_photos"
@@ -557,7 +590,10 @@ class FoodDiaryPhoto(Base):
     stored_filename = Column(String(255), nullable=False)
     file_path = Column(String(500), nullable=False)
     file_size_bytes = Column(Integer)
-    mime_type = Column(String(100))
+    mime_type = Column(String(100))  # sniffed from the file contents
+    # Content address; rows with the same hash share one PhotoBlob file
+    content_sha256 = Column(String(64), index=True)
+    variants = Column(JSON(none_as_null=True))  # {"thumb": url, "medium": url}
 
     # Metadata
     uploaded_at = Column(TIMESTAMP, server_default=func.now())
@@ -566,6 +602,24 @@ class FoodDiaryPhoto(Base):
     diary_entry = relationship("FoodDiaryEntry", back_populates="photos")
 
 
+class PhotoBlob(Base):
+    """One stored photo file, shared by every FoodDiaryPhoto with its hash
+
+    ``ref_count`` is maintained by app.services.photo_store on photo insert
+    and delete; blobs that stay at zero are purged with their files.
+    """
+
+    __tablename__ = "photo_blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    file_path = Column(String(500), nullable=False)
+    size_bytes = Column(Integer)
+    mime_type = Column(String(100))
+    ref_count = Column(Integer, nullable=False, default=0, index=True)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+
 class KnowledgePost(Base):
     __tablename__ = "knowledge_posts"
 
@@ -595,13 +649,52 @@ class KnowledgePost(Base):
     creator = relationship("User", back_populates="knowledge_posts")
 
 
+class DashboardDailyCount(Base):
+    """Response counts per instrument level, kept current on every write
+
+    One row per (instrument, day, facility, sex, age band, level). Maintained
+    by app.services.dashboard_service in the same transaction as the response
+    insert/update/delete, and rebuilt by scripts/rebuild_dashboard_aggregates.py.
+    """
+
+    __tablename__ = "dashboard_daily_counts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    instrument = Column(String(20), nullable=False)  # SANSA / MNA
+    visit_date = Column(Date, nullable=False)
+    facility_id = Column(Integer, nullable=False, default=0)  # 0 = no facility
+    sex = Column(String(20), nullable=False)
+    age_band = Column(String(10), nullable=False)
+    level = Column(String(50), nullable=False)
+    response_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "instrument",
+            "visit_date",
+            "facility_id",
+            "sex",
+            "age_band",
+            "level",
+            name="unique_dashboard_bucket",
+        ),
+    )
+
+
 class AuditLog(Base):
+    """Change history, range-partitioned by month on created_at in MySQL
+
+    MySQL requires the partitioning column in every unique key and does not
+    allow foreign keys on partitioned tables, hence the composite primary
+    key and the plain (unconstrained) user_id column.
+    """
+
     __tablename__ = "audit_log"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
 
     # Action details
-    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    user_id = Column(Integer, index=True)
     action_type = Column(String(50), nullable=False)
     table_name = Column(String(50), nullable=False, index=True)
     record_id = Column(Integer, index=True)
@@ -613,6 +706,26 @@ class AuditLog(Base):
     # Metadata
     ip_address = Column(String(45))
     user_agent = Column(Text)
-    created_at = Column(TIMESTAMP, server_default=func.now(), index=True)
+    created_at = Column(
+        TIMESTAMP, primary_key=True, server_default=func.now(), index=True
+    )
 
     __table_args__ = (Index("idx_table_record", "table_name", "record_id"),)
+
+
+class CodeSequence(Base):
+    """Named counters feeding app.services.code_allocator
+
+    Each allocation advances ``next_value`` in its own short transaction; the
+    issued values are permuted into codes, so they never repeat.
+    """
+
+    __tablename__ = "code_sequences"
+
+    name = Column(String(50), primary_key=True)
+    next_value = Column(BigInteger, nullable=False, default=0)
+
+
+# Registers the mapper events that keep respondent search keys and dashboard
+# counts in sync, so scripts that never import the routers maintain them too
+from app.services import dashboard_service, respondent_search  # noqa: E402,F401
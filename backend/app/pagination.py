@@ -0,0 +1,211 @@
+"""Keyset (seek) pagination helpers.
+
+List endpoints page by seeking past the last row of the previous page on a
+``(sort_column, id)`` pair instead of using ``OFFSET``, so every page costs
+the same regardless of how deep into the table it is. The position is handed
+to clients as an opaque cursor in the ``X-Next-Cursor`` response header, which
+keeps the JSON body a plain list for existing callers.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+from typing import Any, Callable, Hashable, Optional, Sequence
+
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, or_, text
+from sqlalchemy.orm import Query, Session
+
+from app.cache import TTLCache
+from app.database import use_primary
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+# How long an approximate total is reused before it is recounted, and how
+# many distinct totals (e.g. per search term) are kept
+COUNT_CACHE_TTL_SECONDS = 60
+COUNT_CACHE_SIZE = 256
+
+
+def encode_cursor(*values: Any) -> str:
+    """Encode the last row's sort key into an opaque, URL-safe cursor"""
+    values = [v.isoformat() if hasattr(v, "isoformat") else v for v in values]
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_keyset(
+    cursor: str, parsers: Sequence[Callable[[Any], Any]]
+) -> tuple[Any, ...]:
+    """Decode a cursor produced by encode_cursor, one parser per value"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+        if len(values) != len(parsers):
+            raise ValueError("cursor length")
+        return tuple(parse(value) for parse, value in zip(parsers, values))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+def decode_cursor(cursor: str, parse: Callable[[str], Any]) -> tuple[Any, int]:
+    """Decode a ``(sort_value, id)`` cursor
+
+    ``parse`` converts the serialized sort value back into the column type,
+    e.g. ``datetime.fromisoformat`` or ``date.fromisoformat``.
+    """
+    return decode_keyset(cursor, (parse, int))
+
+
+def apply_keyset(
+    query: Query,
+    sort_column,
+    id_column,
+    after: Optional[tuple[Any, int]] = None,
+    descending: bool = True,
+) -> Query:
+    """Order ``query`` by ``(sort_column, id_column)`` and seek past ``after``
+
+    The row comparison is spelled out as ``a < x OR (a = x AND id < y)`` so
+    MySQL can use a composite index on both columns for the range scan.
+    """
+    if after is not None:
+        sort_value, row_id = after
+        if descending:
+            query = query.filter(
+                or_(
+                    sort_column < sort_value,
+                    and_(sort_column == sort_value, id_column < row_id),
+                )
+            )
+        else:
+            query = query.filter(
+                or_(
+                    sort_column > sort_value,
+                    and_(sort_column == sort_value, id_column > row_id),
+                )
+            )
+
+    if descending:
+        return query.order_by(sort_column.desc(), id_column.desc())
+    return query.order_by(sort_column.asc(), id_column.asc())
+
+
+def apply_multi_keyset(
+    query: Query,
+    columns: Sequence,
+    after: Optional[Sequence[Any]] = None,
+    descending: bool = True,
+) -> Query:
+    """``apply_keyset`` for a sort key of any number of columns (last = id)
+
+    The row comparison expands to ``a < x OR (a = x AND b < y) OR ...``.
+    """
+    if after is not None:
+        branches = []
+        for i, (column, value) in enumerate(zip(columns, after)):
+            equal = [c == v for c, v in zip(columns[:i], after[:i])]
+            beyond = column < value if descending else column > value
+            branches.append(and_(*equal, beyond))
+        query = query.filter(or_(*branches))
+
+    return query.order_by(
+        *(column.desc() if descending else column.asc() for column in columns)
+    )
+
+
+def fetch_page(
+    query: Query,
+    limit: int,
+    response: Response,
+    sort_key: Callable[[Any], tuple],
+) -> list:
+    """Fetch one page and set ``X-Next-Cursor`` when more rows follow
+
+    One extra row is read to find out whether another page exists without
+    a separate count query.
+    """
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(*sort_key(rows[-1]))
+    return rows
+
+
+def estimated_row_count(db: Session, table: str) -> Optional[int]:
+    """The table's row estimate from the statistics, without scanning it
+
+    MySQL only (``information_schema.TABLES.TABLE_ROWS``); None elsewhere or
+    when no estimate is available.
+    """
+    if db.get_bind().dialect.name != "mysql":
+        return None
+    rows = db.execute(
+        text(
+            "SELECT TABLE_ROWS FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+        ),
+        {"table": table},
+    ).scalar()
+    return int(rows) if rows is not None else None
+
+
+class ApproximateCounter:
+    """Totals for list endpoints, reused for a short TTL
+
+    Totals only drive "about N results" labels in the admin screens, so a
+    value up to a minute old is fine. Unfiltered totals come from the table
+    statistics when the database keeps them; filtered ones are counted and
+    kept in a bounded LRU, since their keys include user input.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = COUNT_CACHE_TTL_SECONDS,
+        maxsize: int = COUNT_CACHE_SIZE,
+    ):
+        self._entries = TTLCache(maxsize=maxsize, ttl_seconds=ttl_seconds)
+
+    def count(self, key: Hashable, query: Query, table: Optional[str] = None) -> int:
+        """Total rows of ``query``; estimated from ``table`` when it is given"""
+        total = self._entries.get(key)
+        if total is not None:
+            return total
+        with use_primary(query.session):
+            if table is not None:
+                total = estimated_row_count(query.session, table)
+            if total is None:
+                total = query.order_by(None).count()
+        self._entries.set(key, total)
+        return total
+
+    def invalidate(self, prefix: Optional[str] = None) -> None:
+        if prefix is None:
+            self._entries.clear()
+        else:
+            self._entries.invalidate_matching(lambda k: _key_prefix(k) == prefix)
+
+
+def _key_prefix(key: Hashable) -> Hashable:
+    return key[0] if isinstance(key, tuple) and key else key
+
+
+approximate_counter = ApproximateCounter()
+
+
+def set_total_header(
+    response: Response,
+    key: Sequence[Hashable],
+    query: Query,
+    table: Optional[str] = None,
+) -> None:
+    """Attach a cached approximate total to ``X-Total-Count``
+
+    Pass ``table`` when ``query`` is the whole table (give or take soft
+    deletes), so the total can be estimated instead of counted.
+    """
+    response.headers[TOTAL_COUNT_HEADER] = str(
+        approximate_counter.count(tuple(key), query, table)
+    )
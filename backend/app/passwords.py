@@ -0,0 +1,125 @@
+"""bcrypt hashing off the request threads.
+
+bcrypt is deliberately slow (~250 ms at cost 12). Running it inline burns
+a CPU core for that long, and under the GIL it slows every other request
+in the worker, so a burst of logins at shift change can starve the other
+endpoints. ``password_hasher`` runs the work in a small dedicated process
+pool instead, and rejects new work with 503 once
+``PASSWORD_HASH_MAX_PENDING`` jobs are already waiting. Callers are async
+handlers that await the pool's future, so a waiting login holds neither a
+threadpool thread nor the worker's CPU. Keep ``PASSWORD_HASH_WORKERS +
+PASSWORD_HASH_MAX_PENDING`` below ``RATE_LIMIT_LOGIN_CONCURRENCY``, or the
+concurrency cap fills up first and the pool never sheds.
+
+The module-level functions are the pool's work items. Pool processes are
+started with ``spawn``, because forking the multi-threaded server (audit
+writer, pool threads) can leave a child holding a lock no thread will ever
+release.
+"""
+
+import asyncio
+import multiprocessing
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import bcrypt
+from fastapi import HTTPException, status
+
+from app.config import get_settings
+from app.metrics import Counter, Gauge
+
+settings = get_settings()
+
+_ROUNDS_RE = re.compile(r"^\$2[abxy]?\$(\d{2})\$")
+
+
+def hash_password(password: str, rounds: int) -> str:
+    salt = bcrypt.gensalt(rounds=rounds)
+    return bcrypt.hashpw(password.encode("utf-8"), salt).decode("utf-8")
+
+
+def check_password(plain_password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(
+        plain_password.encode("utf-8"), hashed_password.encode("utf-8")
+    )
+
+
+def hash_rounds(hashed_password: str) -> Optional[int]:
+    """Cost factor encoded in a bcrypt hash, or None if it is not bcrypt"""
+    match = _ROUNDS_RE.match(hashed_password or "")
+    return int(match.group(1)) if match else None
+
+
+class PasswordHasher:
+    """Bounded process pool for bcrypt work"""
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.rejected = Counter(
+            "password_hash_rejected_total",
+            "Password hash/verify jobs rejected because the pool was saturated",
+        )
+        Gauge(
+            "password_hash_in_flight",
+            "Password hash/verify jobs running or waiting in the pool",
+            callback=lambda: self._in_flight,
+        )
+        Gauge(
+            "password_hash_queue_depth",
+            "Password hash/verify jobs waiting for a free pool worker",
+            callback=lambda: self.queue_depth,
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self._in_flight - self.workers)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+        return self._executor
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_pending:
+                self.rejected.inc()
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many sign-in attempts in progress, please retry",
+                    headers={"Retry-After": "1"},
+                )
+            self._in_flight += 1
+        try:
+            return await asyncio.wrap_future(self._get_executor().submit(fn, *args))
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    async def hash(self, password: str, rounds: Optional[int] = None) -> str:
+        return await self._run(hash_password, password, rounds or settings.BCRYPT_ROUNDS)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(check_password, plain_password, hashed_password)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
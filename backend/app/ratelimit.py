@@ -0,0 +1,248 @@
+"""Admission control for the anonymous public endpoints.
+
+Kiosk and respondent submissions, code checks and logins need no token, so
+nothing stops one misbehaving client from holding every database connection.
+Each protected route belongs to a route class (``login``, ``submit``,
+``lookup``), and ``admit(route_class)`` is a dependency that applies two limits:
+
+* a token bucket per client key (client IP) and route class, answered with
+  429 when the client is over its rate;
+* a concurrency cap per route class. A request that finds no free slot waits
+  up to ``RATE_LIMIT_QUEUE_TIMEOUT_SECONDS`` and is then answered with 503.
+
+Both responses carry ``Retry-After``. Buckets live in process memory by
+default. Setting ``RATE_LIMIT_REDIS_URL`` shares them between workers; that
+needs the ``redis`` package (4.2+, for ``redis.asyncio``), and the bucket
+script is awaited so a slow Redis never blocks the event loop. Concurrency
+caps are always per process.
+"""
+
+import asyncio
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import HTTPException, Request, status
+
+from app.cache import TTLCache
+from app.config import get_settings
+from app.metrics import Counter, Gauge
+
+settings = get_settings()
+
+
+@dataclass(frozen=True)
+class RouteClass:
+    per_minute: float
+    burst: int
+    concurrency: int
+
+    @property
+    def rate(self) -> float:
+        """Tokens added per second"""
+        return self.per_minute / 60.0
+
+
+ROUTE_CLASSES = {
+    "login": RouteClass(
+        settings.RATE_LIMIT_LOGIN_PER_MINUTE,
+        settings.RATE_LIMIT_LOGIN_BURST,
+        settings.RATE_LIMIT_LOGIN_CONCURRENCY,
+    ),
+    "submit": RouteClass(
+        settings.RATE_LIMIT_SUBMIT_PER_MINUTE,
+        settings.RATE_LIMIT_SUBMIT_BURST,
+        settings.RATE_LIMIT_SUBMIT_CONCURRENCY,
+    ),
+    "lookup": RouteClass(
+        settings.RATE_LIMIT_LOOKUP_PER_MINUTE,
+        settings.RATE_LIMIT_LOOKUP_BURST,
+        settings.RATE_LIMIT_LOOKUP_CONCURRENCY,
+    ),
+}
+
+admission_requests = Counter(
+    "admission_requests_total",
+    "Requests to rate limited routes by route class and outcome",
+)
+admission_queued = Counter(
+    "admission_queued_total",
+    "Requests that had to wait for a concurrency slot",
+)
+admission_waiting = Gauge(
+    "admission_waiting",
+    "Requests currently waiting for a concurrency slot",
+)
+
+
+class MemoryBucketStore:
+    """Token buckets in process memory
+
+    A bucket left idle for ``burst / rate`` seconds is full again, so entries
+    expire after that long and the store stays bounded by active clients.
+    """
+
+    def __init__(self, maxsize: int = 65536):
+        self._buckets = TTLCache(maxsize=maxsize, ttl_seconds=60)
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """Take one token; return 0 if admitted, else seconds until one is free"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (float(burst), now))
+            tokens = min(float(burst), tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets.set(key, (tokens, now), ttl_seconds=burst / rate)
+        return wait
+
+
+_REDIS_TAKE = """
+local burst = tonumber(ARGV[2])
+local rate = tonumber(ARGV[1])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate))
+return tostring(wait)
+"""
+
+
+class RedisBucketStore:
+    """Token buckets shared between workers through Redis"""
+
+    def __init__(self, url: str):
+        try:
+            from redis import asyncio as redis
+        except ImportError:
+            raise RuntimeError(
+                "RATE_LIMIT_REDIS_URL is set but the redis package is not installed"
+            )
+        self._client = redis.Redis.from_url(url, socket_timeout=0.2)
+        self._take = self._client.register_script(_REDIS_TAKE)
+        self._fallback = MemoryBucketStore()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        try:
+            wait = await self._take(keys=[f"ratelimit:{key}"], args=[rate, burst])
+            return float(wait)
+        except Exception:
+            # Keep limiting per process rather than failing open or closed
+            return await self._fallback.take(key, rate, burst)
+
+
+class ConcurrencyLimit:
+    """At most ``limit`` requests of a route class in flight per process"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the server's running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        return self._semaphore
+
+    async def acquire(self, route_class: str, timeout: float) -> bool:
+        semaphore = self._get_semaphore()
+        if not semaphore.locked():
+            await semaphore.acquire()
+            return True
+
+        admission_queued.inc(route_class=route_class)
+        admission_waiting.inc(route_class=route_class)
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            admission_waiting.dec(route_class=route_class)
+
+    def release(self) -> None:
+        self._get_semaphore().release()
+
+
+def _create_store():
+    if settings.RATE_LIMIT_REDIS_URL:
+        return RedisBucketStore(settings.RATE_LIMIT_REDIS_URL)
+    return MemoryBucketStore()
+
+
+bucket_store = _create_store()
+concurrency_limits = {
+    name: ConcurrencyLimit(route.concurrency) for name, route in ROUTE_CLASSES.items()
+}
+
+
+def client_key(request: Request) -> str:
+    """Identify the caller; honours X-Forwarded-For only when configured"""
+    if settings.RATE_LIMIT_TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def _reject(status_code: int, detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status_code,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+def admit(route_class: str):
+    """Dependency enforcing the rate and concurrency limits of ``route_class``"""
+    route = ROUTE_CLASSES[route_class]
+    concurrency = concurrency_limits[route_class]
+
+    async def dependency(request: Request):
+        if not settings.RATE_LIMIT_ENABLED:
+            yield
+            return
+
+        wait = await bucket_store.take(
+            f"{route_class}:{client_key(request)}", route.rate, route.burst
+        )
+        if wait > 0:
+            admission_requests.inc(route_class=route_class, outcome="rate_limited")
+            raise _reject(
+                status.HTTP_429_TOO_MANY_REQUESTS,
+                "Too many requests, please slow down",
+                wait,
+            )
+
+        timeout = settings.RATE_LIMIT_QUEUE_TIMEOUT_SECONDS
+        if not await concurrency.acquire(route_class, timeout):
+            admission_requests.inc(route_class=route_class, outcome="overloaded")
+            raise _reject(
+                status.HTTP_503_SERVICE_UNAVAILABLE,
+                "Server is busy, please retry",
+                timeout,
+            )
+
+        admission_requests.inc(route_class=route_class, outcome="admitted")
+        try:
+            yield
+        finally:
+            concurrency.release()
+
+    return dependency
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from datetime import timedelta
 from app.database import get_db
 from app.models import User
@@ -16,23 +17,25 @@ from app.auth import (
     authenticate_user,
     create_access_token,
     create_refresh_token,
-    get_password_hash,
+    get_password_hash_pooled,
     decode_token,
     get_current_user,
     get_current_active_admin,
+    invalidate_cached_user,
 )
 from app.config import get_settings
+from app.ratelimit import admit
 
 settings = get_settings()
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
-@router.post("/login", response_model=Token)
-def login(
+@router.post("/login", response_model=Token, dependencies=[Depends(admit("login"))])
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
 ):
     """Login with username and password"""
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -103,15 +106,15 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
 
 
 @router.post("/register", response_model=UserResponse)
-def register_user(
+async def register_user(
     user_create: UserCreate,
     db: Session = Depends(get_db),
     current_admin: User = Depends(get_current_active_admin),
 ):
     """Register a new user (admin only)"""
     # Check if username or email already exists
-    existing_user = (
-        db.query(User)
+    existing_user = await run_in_threadpool(
+        lambda: db.query(User)
         .filter(
             (User.username == user_create.username) | (User.email == user_create.email)
         )
@@ -128,14 +131,17 @@ def register_user(
     new_user = User(
         username=user_create.username,
         email=user_create.email,
-        hashed_password=get_password_hash(user_create.password),
+        hashed_password=await get_password_hash_pooled(user_create.password),
         full_name=user_create.full_name,
         role=user_create.role,
     )
 
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    def save():
+        db.add(new_user)
+        db.commit()
+        db.refresh(new_user)
+
+    await run_in_threadpool(save)
 
     return new_user
 
@@ -170,6 +176,7 @@ def update_user(
         setattr(user, field, value)
 
     db.commit()
+    invalidate_cached_user(user.id)
     db.refresh(user)
 
     return user
@@ -195,5 +202,6 @@ def delete_user(
     # Soft delete by deactivating
     user.is_active = False
     db.commit()
+    invalidate_cached_user(user.id)
 
     return {"message": "User deactivated successfully"}
@@ -12,11 +12,14 @@ from app.schemas import (
 )
 from app.services.scoring_service import ScoringService
 from app.auth import get_current_staff_or_admin
+from app.ratelimit import admit
 
 router = APIRouter(prefix="/bia", tags=["bia"])
 
 
-@router.post("", response_model=BIARecordResponse)
+@router.post(
+    "", response_model=BIARecordResponse, dependencies=[Depends(admit("submit"))]
+)
 def create_bia_record(bia_create: BIARecordCreate, db: Session = Depends(get_db)):
     """
     Create BIA (Body Impedance Analysis) record
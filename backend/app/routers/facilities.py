@@ -1,31 +1,44 @@
 from __future__ import annotations
 
-import random
-import string
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 
 from app.auth import get_current_staff_or_admin, get_current_user_optional
-from app.database import get_db
+from app.cache import ResponseCache, invalidate_tags_on_change
+from app.config import get_settings
+from app.database import get_db, use_primary
 from app.models import Facility, User
 from app.schemas import (
     FacilityCreate,
     FacilityUpdate,
+    FacilityNearbyResponse,
     FacilityResponse,
     MessageResponse,
 )
+from app.services.code_allocator import facility_codes
+from app.services.facility_locator import nearby_facilities
+
+settings = get_settings()
 
 router = APIRouter(prefix="/facilities", tags=["facilities"])
 
+FACILITIES_TAG = "facilities"
 
-def _generate_facility_code() -> str:
-    return "FAC" + "".join(random.choices(string.ascii_uppercase + string.digits, k=6))
+_cache = ResponseCache(
+    "facilities",
+    maxsize=settings.REFERENCE_CACHE_SIZE,
+    ttl_seconds=settings.REFERENCE_CACHE_TTL_SECONDS,
+)
+invalidate_tags_on_change(Facility, FACILITIES_TAG)
+_facility_list = TypeAdapter(list[FacilityResponse])
 
 
 @router.get("", response_model=list[FacilityResponse])
 def list_facilities(
+    request: Request,
     include_inactive: bool = False,
     db: Session = Depends(get_db),
     current_user: Optional[User] = Depends(get_current_user_optional),
@@ -35,24 +48,56 @@ def list_facilities(
     - Public: active & not deleted
     - Staff/Admin: can request include_inactive=true to see all
     """
-    query = db.query(Facility).filter(Facility.is_deleted == False)
-
-    if not current_user or not include_inactive:
-        query = query.filter(Facility.is_active == True)
-
-    return query.order_by(Facility.display_order.asc(), Facility.name.asc()).all()
+    include_inactive = bool(current_user and include_inactive)
+
+    def render() -> bytes:
+        query = db.query(Facility).filter(Facility.is_deleted == False)
+        if not include_inactive:
+            query = query.filter(Facility.is_active == True)
+        rows = query.order_by(Facility.display_order.asc(), Facility.name.asc())
+        return _facility_list.dump_json(
+            _facility_list.validate_python(rows.all(), from_attributes=True)
+        )
+
+    with use_primary(db):
+        body = _cache.get_or_render(
+            ("list", include_inactive), render, [FACILITIES_TAG]
+        )
+    cache_control = "private, no-cache" if include_inactive else "public, no-cache"
+    return body.response(request, cache_control=cache_control)
+
+
+@router.get("/nearby", response_model=list[FacilityNearbyResponse])
+def list_nearby_facilities(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    limit: int = Query(10, ge=1, le=50),
+    radius_km: Optional[float] = Query(None, gt=0, le=20000),
+    db: Session = Depends(get_db),
+):
+    """Active facilities nearest to a point, closest first, with distance_km"""
+    return nearby_facilities(db, lat, lng, limit, radius_km)
 
 
 @router.get("/{facility_id}", response_model=FacilityResponse)
-def get_facility(facility_id: int, db: Session = Depends(get_db)):
-    facility = (
-        db.query(Facility)
-        .filter(Facility.id == facility_id, Facility.is_deleted == False)
-        .first()
-    )
-    if not facility or not facility.is_active:
-        raise HTTPException(status_code=404, detail="Facility not found")
-    return facility
+def get_facility(
+    facility_id: int, request: Request, db: Session = Depends(get_db)
+):
+    def render() -> bytes:
+        facility = (
+            db.query(Facility)
+            .filter(Facility.id == facility_id, Facility.is_deleted == False)
+            .first()
+        )
+        if not facility or not facility.is_active:
+            raise HTTPException(status_code=404, detail="Facility not found")
+        return FacilityResponse.model_validate(facility).model_dump_json().encode()
+
+    with use_primary(db):
+        body = _cache.get_or_render(
+            ("facility", facility_id), render, [FACILITIES_TAG]
+        )
+    return body.response(request, cache_control="public, no-cache")
 
 
 @router.post("", response_model=FacilityResponse)
@@ -63,12 +108,7 @@ def create_facility(
 ):
     code = payload.code
     if not code:
-        while True:
-            candidate = _generate_facility_code()
-            existing = db.query(Facility).filter(Facility.code == candidate).first()
-            if not existing:
-                code = candidate
-                break
+        code = facility_codes.allocate()
 
     facility = Facility(
         name=payload.name,
@@ -1,15 +1,46 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
-from sqlalchemy import select
-from typing import List, Optional
-from datetime import date, time
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    HTTPException,
+    Query,
+    Response,
+    UploadFile,
+)
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import func, select
+from typing import Dict, List, Optional
+from datetime import date, datetime, time
 import os
-import uuid
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
 
+from ..config import get_settings
 from ..database import get_db
-from ..models import FoodDiaryEntry, FoodDiaryPhoto, Visit
-from ..auth import get_current_user_optional
+from ..models import FoodDiaryEntry, FoodDiaryPhoto, MealType, Visit
+from ..auth import get_current_staff_or_admin, get_current_user_optional
+from ..pagination import apply_multi_keyset, decode_keyset, fetch_page
+from ..services.image_pipeline import image_pipeline
+from ..services.menu_suggestions import suggest_menu_names
+from ..services.photo_store import (
+    known_variants,
+    photo_key,
+    photo_url,
+    reserve_blobs,
+)
+from ..storage import get_storage, presign_expiry, sign_token, verify_token
+from ..uploads import (
+    SNIFF_BYTES,
+    allowed_image_types,
+    content_name,
+    discard_uploads,
+    receive_upload,
+    sniff_image_type,
+)
+
+settings = get_settings()
+
+FINALIZE_AUDIENCE = "food-diary-photo"
 
 router = APIRouter(prefix="/food-diary", tags=["food-diary"])
 
@@ -29,11 +60,43 @@ class FoodDiaryPhotoResponse(BaseModel):
     id: int
     file_path: str
     original_filename: str
+    # Downscaled copies ({"thumb": url, "medium": url}); null until rendered
+    variants: Optional[Dict[str, str]] = None
 
     class Config:
         from_attributes = True
 
 
+class MenuSuggestion(BaseModel):
+    menu_name: str
+    count: int  # entries using this name (all spellings that match alike)
+
+
+class PhotoPresignRequest(BaseModel):
+    filename: str
+    content_type: str
+    size_bytes: int = Field(gt=0)
+    sha256: str = Field(pattern="^[0-9a-f]{64}$")
+
+
+class PresignedUpload(BaseModel):
+    method: str
+    url: str
+    headers: Dict[str, str]
+    expires_at: datetime
+
+
+class PhotoPresignResponse(BaseModel):
+    # Pass back to /finalize once the upload (if any) has completed
+    upload_id: str
+    # Null when identical content is already stored; finalize right away
+    upload: Optional[PresignedUpload] = None
+
+
+class PhotoFinalizeRequest(BaseModel):
+    upload_id: str
+
+
 class FoodDiaryEntryResponse(BaseModel):
     id: int
     entry_date: date
@@ -80,26 +143,113 @@ async def create_food_diary_entry(
     return db_entry
 
 
+# Entries without a time sort as if at midnight, i.e. last within their day
+_ENTRY_TIME = func.coalesce(FoodDiaryEntry.entry_time, time.min)
+
+
+def _list_entries(
+    query,
+    response: Response,
+    start_date: Optional[date],
+    end_date: Optional[date],
+    meal_type: Optional[List[MealType]],
+    limit: int,
+    cursor: Optional[str],
+):
+    """Filter, eager-load and page a food diary query, most recent first
+
+    Pages seek on (entry_date, entry_time, id) via the X-Next-Cursor header.
+    """
+    if start_date:
+        query = query.filter(FoodDiaryEntry.entry_date >= start_date)
+    if end_date:
+        query = query.filter(FoodDiaryEntry.entry_date <= end_date)
+    if meal_type:
+        query = query.filter(FoodDiaryEntry.meal_type.in_(meal_type))
+
+    after = (
+        decode_keyset(cursor, (date.fromisoformat, time.fromisoformat, int))
+        if cursor
+        else None
+    )
+    query = apply_multi_keyset(
+        query.options(selectinload(FoodDiaryEntry.photos)),
+        (FoodDiaryEntry.entry_date, _ENTRY_TIME, FoodDiaryEntry.id),
+        after,
+    )
+    return fetch_page(
+        query,
+        limit,
+        response,
+        lambda e: (e.entry_date, e.entry_time or time.min, e.id),
+    )
+
+
 @router.get("/visit/{visit_id}", response_model=List[FoodDiaryEntryResponse])
-async def get_food_diary_entries(
+def get_food_diary_entries(
     visit_id: int,
+    response: Response,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    meal_type: Optional[List[MealType]] = Query(None),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user_optional),
 ):
-    """Get all food diary entries for a visit"""
-    entries = (
-        db.execute(
-            select(FoodDiaryEntry)
-            .where(FoodDiaryEntry.visit_id == visit_id)
-            .order_by(
-                FoodDiaryEntry.entry_date.desc(), FoodDiaryEntry.entry_time.desc()
-            )
-        )
-        .scalars()
-        .all()
+    """Get food diary entries for a visit, most recent first
+
+    Filter by date range and (repeatable) ``meal_type``; follow the
+    X-Next-Cursor header for more than ``limit`` entries.
+    """
+    query = db.query(FoodDiaryEntry).filter(FoodDiaryEntry.visit_id == visit_id)
+    return _list_entries(
+        query, response, start_date, end_date, meal_type, limit, cursor
     )
 
-    return entries
+
+@router.get(
+    "/respondent/{respondent_id}", response_model=List[FoodDiaryEntryResponse]
+)
+def get_respondent_food_diary(
+    respondent_id: int,
+    response: Response,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    meal_type: Optional[List[MealType]] = Query(None),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_staff_or_admin),
+):
+    """Get a respondent's food diary across all visits (staff/admin only)
+
+    Same filters and paging as the per-visit listing.
+    """
+    visit_ids = select(Visit.id).where(
+        Visit.respondent_id == respondent_id, Visit.is_deleted == False
+    )
+    query = db.query(FoodDiaryEntry).filter(FoodDiaryEntry.visit_id.in_(visit_ids))
+    return _list_entries(
+        query, response, start_date, end_date, meal_type, limit, cursor
+    )
+
+
+@router.get("/menu-suggestions", response_model=List[MenuSuggestion])
+def get_menu_suggestions(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(
+        settings.MENU_SUGGEST_TOP_K, ge=1, le=settings.MENU_SUGGEST_TOP_K
+    ),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user_optional),
+):
+    """Most used menu names starting with ``q`` (or with a word starting with it)
+
+    Served from an in-memory index; Thai and Latin input is normalized the
+    same way as the stored names.
+    """
+    return suggest_menu_names(db, q, limit)
 
 
 @router.get("/{entry_id}", response_model=FoodDiaryEntryResponse)
@@ -119,6 +269,26 @@ async def get_food_diary_entry(
     return entry
 
 
+def _attach_photos(db: Session, photos: List[FoodDiaryPhoto], keys: List[str]):
+    """Insert photo rows for stored files and commit, in one short transaction
+
+    The flush takes the blob references (and their row locks), so nothing
+    slow may run in between. Returns (photo_id, key, sha256) for each content
+    that still needs variants; read before the commit expires the rows.
+    """
+    for photo in photos:
+        photo.variants = known_variants(db, photo.content_sha256)
+        db.add(photo)
+    db.flush()
+    pending = {
+        photo.content_sha256: (photo.id, key)
+        for photo, key in zip(photos, keys)
+        if photo.variants is None
+    }
+    db.commit()
+    return [(photo_id, key, sha256) for sha256, (photo_id, key) in pending.items()]
+
+
 @router.post("/{entry_id}/photos")
 async def upload_food_photos(
     entry_id: int,
@@ -126,52 +296,174 @@ async def upload_food_photos(
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user_optional),
 ):
-    """Upload photos for a food diary entry"""
+    """Upload photos for a food diary entry
+
+    Async only to stream the request body; every database and storage call
+    runs in the threadpool.
+    """
     # Verify entry exists
-    entry = db.execute(
-        select(FoodDiaryEntry).where(FoodDiaryEntry.id == entry_id)
-    ).scalar_one_or_none()
+    entry = await run_in_threadpool(
+        lambda: db.execute(
+            select(FoodDiaryEntry.id).where(FoodDiaryEntry.id == entry_id)
+        ).scalar_one_or_none()
+    )
 
     if not entry:
         raise HTTPException(status_code=404, detail="Entry not found")
 
-    # Create uploads directory if not exists
-    upload_dir = "uploads/food_diary"
-    os.makedirs(upload_dir, exist_ok=True)
-
+    storage = get_storage()
+    received = []
+    photos = []
     uploaded_photos = []
+    try:
+        for file in files:
+            # Streamed to disk in chunks; type, size and hash checked on the way
+            upload = await receive_upload(file, storage.staging_dir)
+            received.append(upload)
+            file_path = photo_url(upload.content_name)
+
+            # Photo record; identical content shares one stored file
+            photos.append(
+                FoodDiaryPhoto(
+                    diary_entry_id=entry_id,
+                    original_filename=file.filename,
+                    stored_filename=os.path.basename(upload.content_name),
+                    file_path=file_path,
+                    file_size_bytes=upload.size_bytes,
+                    mime_type=upload.mime_type,
+                    content_sha256=upload.sha256,
+                )
+            )
+            uploaded_photos.append(
+                {
+                    "filename": file.filename,
+                    "path": file_path,
+                }
+            )
+
+        # Keep the blobs from being purged, then store files with no lock held
+        await run_in_threadpool(reserve_blobs, db, photos)
+        keys = [photo_key(upload.content_name) for upload in received]
+        for upload, key in zip(received, keys):
+            await run_in_threadpool(
+                storage.store_file, upload.tmp_path, key, upload.mime_type
+            )
+        pending = await run_in_threadpool(_attach_photos, db, photos, keys)
+    except BaseException:
+        db.rollback()
+        discard_uploads(received)
+        raise
 
-    for file in files:
-        # Generate unique filename
-        file_extension = os.path.splitext(file.filename)[1]
-        stored_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = os.path.join(upload_dir, stored_filename)
-
-        # Save file
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-
-        # Create photo record
-        photo = FoodDiaryPhoto(
-            diary_entry_id=entry_id,
-            original_filename=file.filename,
-            stored_filename=stored_filename,
-            file_path=f"/{file_path}",  # Store path with leading slash for frontend
-            file_size_bytes=len(content),
-            mime_type=file.content_type,
+    # Thumbnails are rendered in the background and recorded on the rows
+    image_pipeline.submit_many(pending)
+
+    return {"message": f"Uploaded {len(files)} photos", "photos": uploaded_photos}
+
+
+@router.post("/{entry_id}/photos/presign", response_model=PhotoPresignResponse)
+async def presign_food_photo(
+    entry_id: int,
+    request: PhotoPresignRequest,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user_optional),
+):
+    """Get a URL to upload one photo straight to storage
+
+    The client sends the bytes to ``upload.url`` (if any), then calls
+    ``/finalize`` with ``upload_id`` to attach the photo to the entry.
+    """
+    entry = db.execute(
+        select(FoodDiaryEntry.id).where(FoodDiaryEntry.id == entry_id)
+    ).scalar_one_or_none()
+    if not entry:
+        raise HTTPException(status_code=404, detail="Entry not found")
+
+    if request.content_type not in allowed_image_types():
+        raise HTTPException(
+            status_code=415, detail=f"{request.filename}: unsupported image type"
         )
-        db.add(photo)
-        uploaded_photos.append(
-            {
-                "filename": file.filename,
-                "path": f"/{file_path}",
-            }
+    if request.size_bytes > settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024:
+        raise HTTPException(
+            status_code=413,
+            detail=(
+                f"{request.filename}: larger than "
+                f"{settings.MAX_UPLOAD_SIZE_MB} MB"
+            ),
         )
 
-    db.commit()
+    storage = get_storage()
+    key = photo_key(content_name(request.sha256, request.content_type))
+    upload_id = sign_token(
+        {
+            "entry_id": entry_id,
+            "key": key,
+            "filename": request.filename,
+            "content_type": request.content_type,
+            "size": request.size_bytes,
+            "sha256": request.sha256,
+        },
+        FINALIZE_AUDIENCE,
+        presign_expiry(),
+    )
 
-    return {"message": f"Uploaded {len(files)} photos", "photos": uploaded_photos}
+    upload = None
+    if not await run_in_threadpool(storage.exists, key):
+        upload = storage.presign_put(
+            key, request.content_type, request.size_bytes, request.sha256
+        )
+    return {"upload_id": upload_id, "upload": upload}
+
+
+@router.post(
+    "/{entry_id}/photos/finalize", response_model=FoodDiaryPhotoResponse
+)
+def finalize_food_photo(
+    entry_id: int,
+    request: PhotoFinalizeRequest,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user_optional),
+):
+    """Attach a photo uploaded through a presigned URL to the entry"""
+    claims = verify_token(request.upload_id, FINALIZE_AUDIENCE)
+    if claims is None or claims["entry_id"] != entry_id:
+        raise HTTPException(status_code=400, detail="Invalid or expired upload_id")
+
+    entry = db.execute(
+        select(FoodDiaryEntry.id).where(FoodDiaryEntry.id == entry_id)
+    ).scalar_one_or_none()
+    if not entry:
+        raise HTTPException(status_code=404, detail="Entry not found")
+
+    storage = get_storage()
+    key = claims["key"]
+    photo = FoodDiaryPhoto(
+        diary_entry_id=entry_id,
+        original_filename=claims["filename"],
+        stored_filename=os.path.basename(key),
+        file_path=photo_url(content_name(claims["sha256"], claims["content_type"])),
+        file_size_bytes=claims["size"],
+        mime_type=claims["content_type"],
+        content_sha256=claims["sha256"],
+    )
+
+    # Keep the blob from being purged, then check the upload with no lock
+    # held. A rejected upload stays an unreferenced blob and is purged later.
+    reserve_blobs(db, [photo])
+    if storage.size(key) != claims["size"]:
+        raise HTTPException(status_code=409, detail="Upload not received")
+
+    # S3 verifies length and checksum on PUT, not that it is an image
+    head = storage.read_head(key, SNIFF_BYTES)
+    if sniff_image_type(head) != claims["content_type"]:
+        raise HTTPException(
+            status_code=415,
+            detail=f"{claims['filename']}: unsupported image type",
+        )
+
+    for pending in _attach_photos(db, [photo], [key]):
+        image_pipeline.submit(*pending)
+    db.refresh(photo)
+    return photo
 
 
 @router.delete("/{entry_id}")
@@ -188,12 +480,8 @@ async def delete_food_diary_entry(
     if not entry:
         raise HTTPException(status_code=404, detail="Entry not found")
 
-    # Delete associated photo files
-    for photo in entry.photos:
-        if os.path.exists(photo.file_path.lstrip("/")):
-            os.remove(photo.file_path.lstrip("/"))
-
-    # Delete entry (cascade will delete photos from DB)
+    # Delete entry (cascade deletes the photo rows; their stored files are
+    # released and purged later once no other photo references them)
     db.delete(entry)
     db.commit()
 
@@ -4,8 +4,9 @@ import re
 from datetime import datetime
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import or_
+from sqlalchemy.orm import Session, defer
 
 from app.auth import get_current_staff_or_admin, get_current_user_optional
 from app.database import get_db
@@ -14,8 +15,12 @@ from app.schemas import (
     KnowledgePostCreate,
     KnowledgePostUpdate,
     KnowledgePostResponse,
+    KnowledgePostSummary,
+    KnowledgeSearchResult,
     MessageResponse,
 )
+from app.services.knowledge_cache import get_snapshot
+from app.services.knowledge_search import search_knowledge_posts
 
 router = APIRouter(prefix="/knowledge", tags=["knowledge"])
 
@@ -30,53 +35,96 @@ def _slugify(text: str) -> str:
 def _ensure_unique_slug(
     db: Session, slug: str, exclude_id: Optional[int] = None
 ) -> str:
-    base = slug
-    suffix = 1
-    while True:
-        q = db.query(KnowledgePost).filter(KnowledgePost.slug == slug)
-        if exclude_id is not None:
-            q = q.filter(KnowledgePost.id != exclude_id)
-        existing = q.first()
-        if not existing:
-            return slug
-        suffix += 1
-        slug = f"{base}-{suffix}"
-
-
-@router.get("", response_model=list[KnowledgePostResponse])
+    """``slug``, or ``slug-N`` with N one past the highest suffix in use"""
+    pattern = slug.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    q = db.query(KnowledgePost.slug).filter(
+        or_(
+            KnowledgePost.slug == slug,
+            KnowledgePost.slug.like(pattern + "-%", escape="\\"),
+        )
+    )
+    if exclude_id is not None:
+        q = q.filter(KnowledgePost.id != exclude_id)
+
+    # Case-insensitive like LIKE, and like slug uniqueness under MySQL collations
+    numbered = re.compile(re.escape(slug) + r"(?:-(\d+))?", re.IGNORECASE)
+    taken = False
+    highest = 1
+    for (existing,) in q:
+        match = numbered.fullmatch(existing)
+        if match is None:
+            continue  # e.g. "post-intro" when allocating "post"
+        taken = True
+        if match.group(1):
+            highest = max(highest, int(match.group(1)))
+    return f"{slug}-{highest + 1}" if taken else slug
+
+
+@router.get("", response_model=list[KnowledgePostSummary])
 def list_knowledge_posts(
+    request: Request,
     include_unpublished: bool = False,
     db: Session = Depends(get_db),
     current_user: Optional[User] = Depends(get_current_user_optional),
 ):
-    """List knowledge posts.
+    """List knowledge posts, without their content.
 
-    - Public (no auth): only published posts
+    - Public (no auth): only published posts, served from the read cache
     - Staff/Admin: can request include_unpublished=true to see all
     """
-    query = db.query(KnowledgePost).filter(KnowledgePost.is_deleted == False)
-
     if not current_user or not include_unpublished:
-        query = query.filter(KnowledgePost.is_published == True)
+        return get_snapshot(db).listing.response(
+            request, cache_control="public, no-cache"
+        )
 
-    return query.order_by(
-        KnowledgePost.display_order.asc(), KnowledgePost.created_at.desc()
-    ).all()
+    return (
+        db.query(KnowledgePost)
+        .options(defer(KnowledgePost.content))
+        .filter(KnowledgePost.is_deleted == False)
+        .order_by(KnowledgePost.display_order.asc(), KnowledgePost.created_at.desc())
+        .all()
+    )
+
+
+@router.get("/search", response_model=list[KnowledgeSearchResult])
+def search_knowledge(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+):
+    """Published posts matching ``q``, best first (Thai-aware BM25)"""
+    ranked = search_knowledge_posts(db, q, limit)
+    if not ranked:
+        return []
+    posts = {
+        post.id: post
+        for post in db.query(KnowledgePost)
+        .options(defer(KnowledgePost.content))
+        .filter(
+            KnowledgePost.id.in_([post_id for post_id, _ in ranked]),
+            KnowledgePost.is_published == True,
+            KnowledgePost.is_deleted == False,
+        )
+    }
+    return [
+        KnowledgeSearchResult(
+            **KnowledgePostSummary.model_validate(posts[post_id]).model_dump(),
+            score=score,
+        )
+        for post_id, score in ranked
+        if post_id in posts
+    ]
 
 
 @router.get("/{post_id}", response_model=KnowledgePostResponse)
-def get_knowledge_post(post_id: int, db: Session = Depends(get_db)):
-    post = (
-        db.query(KnowledgePost)
-        .filter(KnowledgePost.id == post_id, KnowledgePost.is_deleted == False)
-        .first()
-    )
-    if not post:
-        raise HTTPException(status_code=404, detail="Knowledge post not found")
-    if not post.is_published:
-        # For simplicity: unpublished posts require staff/admin
+def get_knowledge_post(
+    post_id: int, request: Request, db: Session = Depends(get_db)
+):
+    # Unpublished and deleted posts are not in the snapshot, so they 404 too
+    body = get_snapshot(db).posts.get(post_id)
+    if body is None:
         raise HTTPException(status_code=404, detail="Knowledge post not found")
-    return post
+    return body.response(request, cache_control="public, no-cache")
 
 
 @router.post("", response_model=KnowledgePostResponse)
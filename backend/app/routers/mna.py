@@ -12,11 +12,14 @@ from app.schemas import (
 )
 from app.services.scoring_service import ScoringService
 from app.auth import get_current_staff_or_admin
+from app.ratelimit import admit
 
 router = APIRouter(prefix="/mna", tags=["mna"])
 
 
-@router.post("", response_model=MNAResponseFull)
+@router.post(
+    "", response_model=MNAResponseFull, dependencies=[Depends(admit("submit"))]
+)
 def create_mna_response(mna_create: MNAResponseCreate, db: Session = Depends(get_db)):
     """
     Create MNA (Mini Nutritional Assessment) response with automatic scoring
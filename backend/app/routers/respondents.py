@@ -1,28 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
+from datetime import datetime
 from typing import Optional
-import random
-import string
 from app.database import get_db
 from app.models import Respondent, User
 from app.schemas import (
     RespondentCreate,
     RespondentUpdate,
     RespondentResponse,
+    RespondentTimeline,
     MessageResponse,
 )
 from app.auth import get_current_staff_or_admin, get_current_user_optional
+from app.ratelimit import admit
+from app.services.code_allocator import respondent_codes
+from app.services.respondent_lookup import (
+    invalidate_respondent_codes,
+    lookup_respondent,
+)
+from app.services.respondent_search import apply_respondent_search
+from app.services.timeline_service import get_timeline
+from app.pagination import (
+    apply_keyset,
+    approximate_counter,
+    decode_cursor,
+    fetch_page,
+    set_total_header,
+)
 
 router = APIRouter(prefix="/respondents", tags=["respondents"])
 
 
-def generate_respondent_code() -> str:
-    """Generate a random anonymous respondent code"""
-    # Format: RES + 8 random alphanumeric characters
-    return "RES" + "".join(random.choices(string.ascii_uppercase + string.digits, k=8))
-
-
-@router.post("", response_model=RespondentResponse)
+@router.post(
+    "", response_model=RespondentResponse, dependencies=[Depends(admit("submit"))]
+)
 async def create_respondent(
     respondent_create: RespondentCreate,
     db: Session = Depends(get_db),
@@ -34,15 +45,8 @@ async def create_respondent(
     """
     # Generate code if not provided
     if not respondent_create.respondent_code:
-        while True:
-            code = generate_respondent_code()
-            # Check if code exists
-            existing = (
-                db.query(Respondent).filter(Respondent.respondent_code == code).first()
-            )
-            if not existing:
-                respondent_create.respondent_code = code
-                break
+        # Format: RES + 8 alphanumeric characters, unique by construction
+        respondent_create.respondent_code = respondent_codes.allocate()
     else:
         # Check if provided code already exists
         existing = (
@@ -62,6 +66,9 @@ async def create_respondent(
     db.add(new_respondent)
     db.commit()
     db.refresh(new_respondent)
+    approximate_counter.invalidate("respondents")
+    # The code may be cached as unknown from an earlier check
+    invalidate_respondent_codes(new_respondent.respondent_code)
 
     return new_respondent
 
@@ -69,41 +76,74 @@ async def create_respondent(
 @router.get("/{respondent_code}", response_model=RespondentResponse)
 def get_respondent_by_code(respondent_code: str, db: Session = Depends(get_db)):
     """Get respondent by code (no auth required for self-service)"""
+    respondent = lookup_respondent(db, respondent_code)
+
+    if not respondent:
+        raise HTTPException(status_code=404, detail="Respondent not found")
+
+    return respondent
+
+
+@router.get("/{respondent_id}/timeline", response_model=RespondentTimeline)
+def get_respondent_timeline(
+    respondent_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_staff_or_admin),
+):
+    """SANSA, MNA, BMI and body fat across visits with deltas and slopes
+
+    Slopes are per day since the first visit. Cached until the respondent or
+    one of their visits or instruments changes.
+    """
     respondent = (
-        db.query(Respondent)
-        .filter(
-            Respondent.respondent_code == respondent_code,
-            Respondent.is_deleted == False,
-        )
+        db.query(Respondent.id)
+        .filter(Respondent.id == respondent_id, Respondent.is_deleted == False)
         .first()
     )
-
     if not respondent:
         raise HTTPException(status_code=404, detail="Respondent not found")
 
-    return respondent
+    return get_timeline(db, respondent_id)
 
 
 @router.get("", response_model=list[RespondentResponse])
 def list_respondents(
+    response: Response,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
     search: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_staff_or_admin),
 ):
-    """List respondents (staff/admin only)"""
+    """List respondents, newest first (staff/admin only)
+
+    ``search`` matches code and phone prefixes, and substrings of at least
+    three characters in code, phone or email, all through indexes.
+
+    Pages seek on (created_at, id): pass the X-Next-Cursor header from the
+    previous page as ``cursor``. ``skip`` is kept for older clients and is
+    ignored once a cursor is given. ``include_total=true`` adds a cached
+    approximate X-Total-Count header.
+    """
     query = db.query(Respondent).filter(Respondent.is_deleted == False)
 
     if search:
-        query = query.filter(
-            (Respondent.respondent_code.contains(search))
-            | (Respondent.phone.contains(search))
-            | (Respondent.email.contains(search))
-        )
+        query = apply_respondent_search(query, search)
+
+    if include_total:
+        if search:
+            set_total_header(response, ("respondents", search), query)
+        else:
+            set_total_header(response, ("respondents",), query, "respondents")
+
+    after = decode_cursor(cursor, datetime.fromisoformat) if cursor else None
+    query = apply_keyset(query, Respondent.created_at, Respondent.id, after)
+    if after is None and skip:
+        query = query.offset(skip)
 
-    respondents = query.offset(skip).limit(limit).all()
-    return respondents
+    return fetch_page(query, limit, response, lambda r: (r.created_at, r.id))
 
 
 @router.put("/{respondent_id}", response_model=RespondentResponse)
@@ -123,12 +163,14 @@ async def update_respondent(
     if not respondent:
         raise HTTPException(status_code=404, detail="Respondent not found")
 
+    previous_code = respondent.respondent_code
     update_data = respondent_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(respondent, field, value)
 
     db.commit()
     db.refresh(respondent)
+    invalidate_respondent_codes(previous_code, respondent.respondent_code)
 
     return respondent
 
@@ -147,24 +189,22 @@ def delete_respondent(
 
     respondent.is_deleted = True
     db.commit()
+    approximate_counter.invalidate("respondents")
+    invalidate_respondent_codes(respondent.respondent_code)
 
     return {"message": "Respondent deleted successfully"}
 
 
-@router.post("/check-code")
+@router.post("/check-code", dependencies=[Depends(admit("lookup"))])
 def check_respondent_code(request: dict, db: Session = Depends(get_db)):
     """Check if respondent code exists (for login/registration flow)"""
     code = request.get("code")
     if not code:
         raise HTTPException(status_code=400, detail="Code is required")
 
-    respondent = (
-        db.query(Respondent)
-        .filter(Respondent.respondent_code == code, Respondent.is_deleted == False)
-        .first()
-    )
+    respondent = lookup_respondent(db, code)
 
     return {
         "exists": respondent is not None,
-        "respondent_id": respondent.id if respondent else None,
+        "respondent_id": respondent["id"] if respondent else None,
     }
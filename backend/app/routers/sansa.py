@@ -6,12 +6,31 @@ from app.models import SANSAResponse, Visit, User
 from app.schemas import SANSAResponseCreate, SANSAResponseFull, MessageResponse
 from app.services.scoring_service import ScoringService
 from app.auth import get_current_staff_or_admin
+from app.ratelimit import admit
 from typing import Optional
 
 router = APIRouter(prefix="/sansa", tags=["sansa"])
 
-
-@router.post("", response_model=SANSAResponseFull)
+# Advice by result level
+SANSA_ADVICE = {
+    "normal": {
+        "th": "สถานะโภชนาการปกติ ควรรักษาพฤติกรรมการกินที่ดีนี้ไว้ และตรวจสุขภาพอย่างสม่ำเสมอ",
+        "en": "Normal nutritional status. Maintain good eating habits and regular health checkups.",
+    },
+    "at_risk": {
+        "th": "มีความเสี่ยงต่อภาวะทุพโภชนาการ ควรปรับพฤติกรรมการกิน เพิ่มการบริโภคอาหารที่มีคุณค่าทางโภชนาการ และปรึกษานักโภชนาการ",
+        "en": "At risk of malnutrition. Adjust eating behaviors, increase nutritious food intake, and consult a nutritionist.",
+    },
+    "malnourished": {
+        "th": "พบภาวะทุพโภชนาการ ควรพบแพทย์และนักโภชนาการโดยด่วนเพื่อรับการดูแลและวางแผนการรักษา",
+        "en": "Malnourished. Urgently consult a doctor and nutritionist for care and treatment planning.",
+    },
+}
+
+
+@router.post(
+    "", response_model=SANSAResponseFull, dependencies=[Depends(admit("submit"))]
+)
 def create_sansa_response(
     sansa_create: SANSAResponseCreate, db: Session = Depends(get_db)
 ):
@@ -220,23 +239,7 @@ def get_sansa_advice(sansa_response_id: int, db: Session = Depends(get_db)):
     if not sansa_response:
         raise HTTPException(status_code=404, detail="SANSA response not found")
 
-    # Return advice based on result level
-    advice_map = {
-        "normal": {
-            "th": "สถานะโภชนาการปกติ ควรรักษาพฤติกรรมการกินที่ดีนี้ไว้ และตรวจสุขภาพอย่างสม่ำเสมอ",
-            "en": "Normal nutritional status. Maintain good eating habits and regular health checkups.",
-        },
-        "at_risk": {
-            "th": "มีความเสี่ยงต่อภาวะทุพโภชนาการ ควรปรับพฤติกรรมการกิน เพิ่มการบริโภคอาหารที่มีคุณค่าทางโภชนาการ และปรึกษานักโภชนาการ",
-            "en": "At risk of malnutrition. Adjust eating behaviors, increase nutritious food intake, and consult a nutritionist.",
-        },
-        "malnourished": {
-            "th": "พบภาวะทุพโภชนาการ ควรพบแพทย์และนักโภชนาการโดยด่วนเพื่อรับการดูแลและวางแผนการรักษา",
-            "en": "Malnourished. Urgently consult a doctor and nutritionist for care and treatment planning.",
-        },
-    }
-
-    advice = advice_map.get(sansa_response.result_level, advice_map["normal"])
+    advice = SANSA_ADVICE.get(sansa_response.result_level, SANSA_ADVICE["normal"])
 
     return {
         "result_level": sansa_response.result_level,
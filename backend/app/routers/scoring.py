@@ -3,11 +3,14 @@ from __future__ import annotations
 from decimal import Decimal
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session, joinedload
 
 from app.auth import get_current_active_admin, get_current_staff_or_admin
-from app.database import get_db
+from app.cache import ResponseCache, invalidate_tags_on_commit
+from app.config import get_settings
+from app.database import get_db, use_primary
 from app.models import ScoringRuleValue, ScoringRuleVersion, User
 from app.schemas import (
     MessageResponse,
@@ -15,33 +18,56 @@ from app.schemas import (
     ScoringRuleVersionResponse,
 )
 
+settings = get_settings()
+
 router = APIRouter(prefix="/scoring", tags=["scoring"])
 
+SCORING_TAG = "scoring"
+
+_cache = ResponseCache(
+    "scoring",
+    maxsize=settings.REFERENCE_CACHE_SIZE,
+    ttl_seconds=settings.REFERENCE_CACHE_TTL_SECONDS,
+)
+_version_list = TypeAdapter(list[ScoringRuleVersionResponse])
+
 
 @router.get("/versions", response_model=list[ScoringRuleVersionResponse])
 def list_scoring_versions(
+    request: Request,
     instrument_name: Optional[str] = None,
     include_inactive: bool = True,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_staff_or_admin),
 ):
-    query = db.query(ScoringRuleVersion).options(
-        joinedload(ScoringRuleVersion.scoring_rule_values)
-    )
+    def render() -> bytes:
+        query = db.query(ScoringRuleVersion).options(
+            joinedload(ScoringRuleVersion.scoring_rule_values)
+        )
+
+        if instrument_name:
+            query = query.filter(
+                ScoringRuleVersion.instrument_name == instrument_name
+            )
 
-    if instrument_name:
-        query = query.filter(ScoringRuleVersion.instrument_name == instrument_name)
+        if not include_inactive:
+            query = query.filter(ScoringRuleVersion.is_active == True)
 
-    if not include_inactive:
-        query = query.filter(ScoringRuleVersion.is_active == True)
+        versions = _version_list.validate_python(
+            query.order_by(ScoringRuleVersion.created_at.desc()).all(),
+            from_attributes=True,
+        )
 
-    versions = query.order_by(ScoringRuleVersion.created_at.desc()).all()
+        # Sort nested rule values for stable output (once per cache fill)
+        for version in versions:
+            version.rule_values.sort(key=lambda rv: (rv.level_order, rv.id))
 
-    # Sort nested rule values for stable output
-    for version in versions:
-        version.scoring_rule_values.sort(key=lambda rv: (rv.level_order, rv.id))
+        return _version_list.dump_json(versions)
 
-    return versions
+    key = ("versions", instrument_name, include_inactive)
+    with use_primary(db):
+        body = _cache.get_or_render(key, render, [SCORING_TAG])
+    return body.response(request, cache_control="private, no-cache")
 
 
 @router.put("/values/{value_id}", response_model=ScoringRuleValueResponse)
@@ -70,6 +96,7 @@ def update_scoring_value(
     if level_order is not None:
         value.level_order = level_order
 
+    invalidate_tags_on_commit(db, SCORING_TAG)
     db.commit()
     db.refresh(value)
     return value
@@ -95,6 +122,7 @@ def activate_scoring_version(
     )
 
     version.is_active = True
+    invalidate_tags_on_commit(db, SCORING_TAG)
     db.commit()
 
     return {
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from datetime import date
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from app.auth import get_current_staff_or_admin
+from app.database import get_db
+from app.models import User
+from app.schemas import StatsSummaryRow
+from app.services.dashboard_service import summarize
+
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+
+@router.get("/summary", response_model=list[StatsSummaryRow])
+def get_stats_summary(
+    group_by: list[Literal["facility", "day", "sex", "age_band"]] = Query([]),
+    instrument: Optional[Literal["SANSA", "MNA"]] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    facility_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_staff_or_admin),
+):
+    """Counts of SANSA result levels and MNA result categories.
+
+    Reads only the pre-aggregated dashboard table. Repeat ``group_by`` to split
+    counts by facility, day, sex and/or age band.
+    """
+    return summarize(
+        db,
+        group_by=group_by,
+        instrument=instrument,
+        start_date=start_date,
+        end_date=end_date,
+        facility_id=facility_id,
+    )
@@ -0,0 +1,226 @@
+"""Endpoints backing the storage layer (app.storage)
+
+- ``PUT /storage/direct/{token}``: target of presigned uploads with the
+  local backend. With S3 clients upload to the bucket instead.
+- ``GET /uploads/{key}``: serves stored files, but only those belonging to
+  a photo that is still referenced. Hash-named files never change, so they
+  are sent with a year-long ``immutable`` Cache-Control. Conditional
+  (ETag) and single-range requests are answered here. With
+  ``UPLOADS_SENDFILE`` the bytes themselves are sent by the front proxy
+  (``X-Accel-Redirect`` / ``X-Sendfile``), so workers only do the checks.
+  With S3 the response redirects to a short-lived signed URL.
+"""
+
+import mimetypes
+import os
+import posixpath
+import re
+from email.utils import formatdate
+from typing import Iterator, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import RedirectResponse, StreamingResponse
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.cache import TTLCache, if_none_match
+from app.config import get_settings
+from app.database import get_db, use_primary
+from app.metrics import Counter
+from app.services.photo_store import content_hash, is_referenced
+from app.storage import (
+    DIRECT_UPLOAD_AUDIENCE,
+    StorageError,
+    get_storage,
+    verify_token,
+)
+from app.uploads import CHUNK_SIZE, discard_uploads, receive_stream
+
+settings = get_settings()
+
+router = APIRouter(tags=["storage"])
+
+# Keys found to be referenced; repeat views skip the database
+_access_cache = TTLCache(
+    maxsize=settings.UPLOADS_ACCESS_CACHE_SIZE,
+    ttl_seconds=settings.UPLOADS_ACCESS_CACHE_TTL_SECONDS,
+)
+
+upload_responses = Counter(
+    "upload_responses_total",
+    "Responses for /uploads by delivery "
+    "(not_modified, offloaded, streamed, redirected, not_found)",
+)
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+@router.put("/storage/direct/{token}", status_code=status.HTTP_204_NO_CONTENT)
+async def direct_upload(token: str, request: Request):
+    """Receive the body of a presigned upload (local backend)"""
+    claims = verify_token(token, DIRECT_UPLOAD_AUDIENCE)
+    if claims is None:
+        raise HTTPException(status_code=403, detail="Invalid or expired upload URL")
+
+    storage = get_storage()
+    if storage.name != "local":
+        raise HTTPException(status_code=404, detail="Not found")
+
+    key = claims["key"]
+    if await run_in_threadpool(storage.exists, key):
+        # Content-addressed: the same bytes are already stored
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+    received = await receive_stream(
+        request.stream(),
+        posixpath.basename(key),
+        storage.staging_dir,
+        max_bytes=claims["size"],
+    )
+    if (
+        received.size_bytes != claims["size"]
+        or received.sha256 != claims["sha256"]
+        or received.mime_type != claims["content_type"]
+    ):
+        discard_uploads([received])
+        raise HTTPException(
+            status_code=400,
+            detail="Upload does not match the presigned size, type or checksum",
+        )
+
+    await run_in_threadpool(
+        storage.store_file, received.tmp_path, key, received.mime_type
+    )
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+def _check_access(db: Session, key: str) -> None:
+    if _access_cache.get(key):
+        return
+    with use_primary(db):
+        referenced = is_referenced(db, key)
+    if not referenced:
+        upload_responses.inc(delivery="not_found")
+        raise HTTPException(status_code=404, detail="Not found")
+    _access_cache.set(key, True)
+
+
+def _cache_control(key: str) -> str:
+    if content_hash(key) is not None:
+        return f"private, max-age={settings.UPLOADS_IMMUTABLE_MAX_AGE}, immutable"
+    return f"private, max-age={settings.UPLOADS_MAX_AGE}"
+
+
+def _etag(key: str, stat: os.stat_result) -> str:
+    if content_hash(key) is not None:
+        # Hash-named: the name (including any variant suffix) is the version
+        return '"' + posixpath.splitext(posixpath.basename(key))[0] + '"'
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def _byte_range(
+    request: Request, etag: str, size: int
+) -> Optional[tuple[int, int]]:
+    """(start, end) inclusive for a single satisfiable Range, else None
+
+    Multiple ranges and stale If-Range validators get the whole file;
+    unsatisfiable ranges raise 416.
+    """
+    header = request.headers.get("range")
+    if not header or request.headers.get("if-range", etag) != etag:
+        return None
+    match = _RANGE.match(header.strip())
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
+
+def _file_chunks(path: str, start: int, length: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@router.api_route(
+    "/uploads/{key:path}", methods=["GET", "HEAD"], include_in_schema=False
+)
+def stored_file(key: str, request: Request, db: Session = Depends(get_db)):
+    """Serve a stored upload after checking it belongs to a live photo"""
+    _check_access(db, key)
+    storage = get_storage()
+
+    if storage.name == "s3":
+        url = storage.presign_get(key)
+        upload_responses.inc(delivery="redirected")
+        # Cacheable for well under the signed URL's lifetime
+        max_age = settings.STORAGE_PRESIGN_EXPIRE_SECONDS // 2
+        return RedirectResponse(
+            url,
+            status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+            headers={"Cache-Control": f"private, max-age={max_age}"},
+        )
+
+    try:
+        path = storage.path(key)
+        stat = os.stat(path)
+    except (StorageError, FileNotFoundError):
+        upload_responses.inc(delivery="not_found")
+        raise HTTPException(status_code=404, detail="Not found")
+
+    etag = _etag(key, stat)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": _cache_control(key),
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+    }
+    if if_none_match(request, etag):
+        upload_responses.inc(delivery="not_modified")
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if settings.UPLOADS_SENDFILE == "x-accel-redirect":
+        # nginx serves the file (and any Range) from its internal location
+        headers["X-Accel-Redirect"] = settings.UPLOADS_ACCEL_PREFIX + key
+    elif settings.UPLOADS_SENDFILE == "x-sendfile":
+        headers["X-Sendfile"] = os.path.abspath(path)
+    if settings.UPLOADS_SENDFILE:
+        upload_responses.inc(delivery="offloaded")
+        return Response(media_type=media_type, headers=headers)
+
+    status_code = status.HTTP_200_OK
+    start, end = 0, stat.st_size - 1
+    byte_range = _byte_range(request, etag, stat.st_size)
+    if byte_range is not None:
+        start, end = byte_range
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    if request.method == "HEAD":
+        return Response(
+            status_code=status_code, media_type=media_type, headers=headers
+        )
+    upload_responses.inc(delivery="streamed")
+    return StreamingResponse(
+        _file_chunks(path, start, end - start + 1),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers,
+    )
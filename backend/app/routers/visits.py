@@ -1,11 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.orm import Session, selectinload
+from datetime import date, datetime, time
 from typing import Optional
 from app.database import get_db
-from app.models import Visit, Respondent, User
-from app.schemas import VisitCreate, VisitResponse
+from app.models import FoodDiaryEntry, Visit, Respondent, User
+from app.schemas import VisitCreate, VisitFullResponse, VisitResponse
 from app.auth import get_current_staff_or_admin, get_current_user_optional
+from app.cache import etag_for, if_none_match
+from app.pagination import (
+    apply_keyset,
+    approximate_counter,
+    decode_cursor,
+    fetch_page,
+    set_total_header,
+)
 
 router = APIRouter(prefix="/visits", tags=["visits"])
 
@@ -47,6 +55,7 @@ async def create_visit(
     db.add(new_visit)
     db.commit()
     db.refresh(new_visit)
+    approximate_counter.invalidate("visits")
 
     return new_visit
 
@@ -62,33 +71,95 @@ def get_visit(visit_id: int, db: Session = Depends(get_db)):
     return visit
 
 
-@router.get("/respondent/{respondent_id}", response_model=list[VisitResponse])
-def get_respondent_visits(respondent_id: int, db: Session = Depends(get_db)):
-    """Get all visits for a respondent"""
-    visits = (
+@router.get(
+    "/{visit_id}/full",
+    response_model=VisitFullResponse,
+    responses={304: {"description": "Not modified"}},
+)
+def get_visit_full(visit_id: int, request: Request, db: Session = Depends(get_db)):
+    """Get a visit with all of its instruments in one response
+
+    Relationships are loaded with one SELECT ... IN per collection, so the
+    query count does not depend on the number of diary entries or photos.
+    Send the returned ETag as If-None-Match to get 304 for unchanged visits.
+    """
+    visit = (
         db.query(Visit)
-        .filter(Visit.respondent_id == respondent_id)
-        .order_by(Visit.visit_date.desc())
-        .all()
+        .options(
+            selectinload(Visit.sansa_response),
+            selectinload(Visit.mna_response),
+            selectinload(Visit.bia_records),
+            selectinload(Visit.satisfaction_response),
+            selectinload(Visit.food_diary_entries).selectinload(
+                FoodDiaryEntry.photos
+            ),
+        )
+        .filter(Visit.id == visit_id)
+        .first()
     )
 
-    return visits
+    if not visit:
+        raise HTTPException(status_code=404, detail="Visit not found")
+
+    payload = VisitFullResponse.model_validate(visit)
+    # Same order as GET /food-diary/visit/{visit_id}
+    payload.food_diary_entries.sort(
+        key=lambda e: (e.entry_date, e.entry_time or time.min, e.id),
+        reverse=True,
+    )
+    body = payload.model_dump_json().encode("utf-8")
+    etag = etag_for(body)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if if_none_match(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get("/respondent/{respondent_id}", response_model=list[VisitResponse])
+def get_respondent_visits(
+    respondent_id: int,
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Get visits for a respondent, most recent first
+
+    Follow the X-Next-Cursor header for respondents with more than ``limit``
+    visits.
+    """
+    query = db.query(Visit).filter(Visit.respondent_id == respondent_id)
+
+    after = decode_cursor(cursor, date.fromisoformat) if cursor else None
+    query = apply_keyset(query, Visit.visit_date, Visit.id, after)
+
+    return fetch_page(query, limit, response, lambda v: (v.visit_date, v.id))
 
 
 @router.get("", response_model=list[VisitResponse])
 def list_visits(
+    response: Response,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_staff_or_admin),
 ):
-    """List all visits (staff/admin only)"""
-    visits = (
-        db.query(Visit)
-        .order_by(Visit.visit_date.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
+    """List all visits, most recent first (staff/admin only)
+
+    Pages seek on (visit_date, id) via the X-Next-Cursor header; ``skip`` is
+    only honoured when no cursor is given.
+    """
+    query = db.query(Visit)
+
+    if include_total:
+        set_total_header(response, ("visits",), query, "visits")
+
+    after = decode_cursor(cursor, date.fromisoformat) if cursor else None
+    query = apply_keyset(query, Visit.visit_date, Visit.id, after)
+    if after is None and skip:
+        query = query.offset(skip)
 
-    return visits
+    return fetch_page(query, limit, response, lambda v: (v.visit_date, v.id))
@@ -1,5 +1,5 @@
 from pydantic import AliasChoices, BaseModel, ConfigDict, EmailStr, Field, validator
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime, date, time
 from decimal import Decimal
 from enum import Enum
@@ -658,6 +658,7 @@ class FoodDiaryPhotoResponse(BaseModel):
     file_path: str
     file_size_bytes: Optional[int]
     mime_type: Optional[str]
+    variants: Optional[Dict[str, str]] = None  # thumb / medium URLs
     uploaded_at: datetime
 
     class Config:
@@ -680,6 +681,16 @@ class FoodDiaryEntryResponse(BaseModel):
         from_attributes = True
 
 
+class VisitFullResponse(VisitResponse):
+    """A visit with every instrument recorded for it"""
+
+    sansa_response: Optional[SANSAResponseFull]
+    mna_response: Optional[MNAResponseFull]
+    bia_records: List[BIARecordResponse]
+    satisfaction_response: Optional[SatisfactionResponseFull]
+    food_diary_entries: List[FoodDiaryEntryResponse]
+
+
 # Knowledge Post Schemas
 class KnowledgePostCreate(BaseModel):
     title: str = Field(..., min_length=1, max_length=255)
@@ -703,11 +714,12 @@ class KnowledgePostUpdate(BaseModel):
     display_order: Optional[int] = None
 
 
-class KnowledgePostResponse(BaseModel):
+class KnowledgePostSummary(BaseModel):
+    """List view of a post: everything but ``content``"""
+
     id: int
     title: str
     slug: str
-    content: Optional[str]
     summary: Optional[str]
     featured_image_path: Optional[str]
     category: Optional[str]
@@ -721,6 +733,14 @@ class KnowledgePostResponse(BaseModel):
         from_attributes = True
 
 
+class KnowledgePostResponse(KnowledgePostSummary):
+    content: Optional[str]
+
+
+class KnowledgeSearchResult(KnowledgePostSummary):
+    score: float
+
+
 # Facility Schemas
 class FacilityCreate(BaseModel):
     name: str = Field(..., min_length=1, max_length=255)
@@ -775,6 +795,10 @@ class FacilityResponse(BaseModel):
         from_attributes = True
 
 
+class FacilityNearbyResponse(FacilityResponse):
+    distance_km: float
+
+
 # Scoring Rule Schemas
 class ScoringRuleValueInput(BaseModel):
     level_code: str
@@ -816,13 +840,50 @@ class ScoringRuleVersionResponse(BaseModel):
     description: Optional[str]
     is_active: bool
     effective_date: Optional[date]
-    rule_values: List[ScoringRuleValueResponse]
+    rule_values: List[ScoringRuleValueResponse] = Field(
+        validation_alias=AliasChoices("rule_values", "scoring_rule_values")
+    )
     created_at: datetime
 
     class Config:
         from_attributes = True
 
 
+# Dashboard Statistics Schemas
+class StatsSummaryRow(BaseModel):
+    instrument: str
+    level: str
+    count: int
+    facility_id: Optional[int] = None
+    visit_date: Optional[date] = None
+    sex: Optional[str] = None
+    age_band: Optional[str] = None
+
+
+# Respondent Timeline Schemas
+class TimelineMetrics(BaseModel):
+    sansa_total: Optional[float] = None
+    mna_total: Optional[float] = None
+    bmi: Optional[float] = None
+    body_fat_percentage: Optional[float] = None
+
+
+class TimelineVisit(BaseModel):
+    visit_id: int
+    visit_number: int
+    visit_date: date
+    sansa_level: Optional[str]
+    mna_category: Optional[str]
+    values: TimelineMetrics
+    deltas: TimelineMetrics  # change since the previous visit with a value
+
+
+class RespondentTimeline(BaseModel):
+    respondent_id: int
+    visits: List[TimelineVisit]
+    slopes_per_day: TimelineMetrics  # least-squares trend across visits
+
+
 # Message Response
 class MessageResponse(BaseModel):
     message: str
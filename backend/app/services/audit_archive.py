@@ -0,0 +1,319 @@
+"""Monthly partition maintenance and cold archive for ``audit_log``.
+
+``audit_log`` is RANGE-partitioned on ``UNIX_TIMESTAMP(created_at)`` with one
+partition per month (``pYYYYMM``) and a catch-all ``p_future``. Expiring old
+history is then an O(1) ``DROP PARTITION`` instead of a large ``DELETE``.
+
+Before a partition is dropped its rows are streamed to a gzip-compressed
+JSONL file next to a manifest holding the row count and SHA-256 checksum.
+The archive is re-read and verified before the partition goes away, and the
+same files can be searched later with ``iter_archived_records``.
+
+Partition management is MySQL-only; the archive reader works anywhere.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Iterator, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+TABLE_NAME = "audit_log"
+FUTURE_PARTITION = "p_future"
+
+_PARTITION_RE = re.compile(r"^p(\d{4})(\d{2})$")
+
+ARCHIVE_COLUMNS = (
+    "id",
+    "user_id",
+    "action_type",
+    "table_name",
+    "record_id",
+    "old_values",
+    "new_values",
+    "ip_address",
+    "user_agent",
+    "created_at",
+)
+
+
+class ArchiveError(Exception):
+    """Raised when an archive file is missing, incomplete or corrupt"""
+
+
+@dataclass
+class ArchiveResult:
+    partition: str
+    rows: int
+    path: Path
+    sha256: str
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"p{month.year:04d}{month.month:02d}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    match = _PARTITION_RE.match(name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def partition_definition(month: date) -> str:
+    """DDL for the partition holding rows created during ``month``"""
+    upper = add_months(month, 1)
+    return (
+        f"PARTITION {partition_name(month)} VALUES LESS THAN "
+        f"(UNIX_TIMESTAMP('{upper.isoformat()} 00:00:00'))"
+    )
+
+
+def list_partitions(conn: Connection) -> list[str]:
+    rows = conn.execute(
+        text(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table "
+            "AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION"
+        ),
+        {"table": TABLE_NAME},
+    )
+    return [row[0] for row in rows]
+
+
+def ensure_future_partitions(
+    conn: Connection, months_ahead: int, today: Optional[date] = None
+) -> list[str]:
+    """Split ``p_future`` so each month up to ``months_ahead`` has a partition
+
+    ``p_future`` is normally empty, so reorganizing it only rewrites metadata.
+    """
+    existing = set(list_partitions(conn))
+    if FUTURE_PARTITION not in existing:
+        raise ArchiveError(f"{TABLE_NAME} is not partitioned; run the migrations")
+
+    current = month_start(today or date.today())
+    months = [add_months(current, i) for i in range(months_ahead + 1)]
+    latest = max(
+        (m for m in (partition_month(p) for p in existing) if m), default=None
+    )
+    missing = [
+        m
+        for m in months
+        if partition_name(m) not in existing and (latest is None or m > latest)
+    ]
+    if not missing:
+        return []
+
+    definitions = ", ".join(partition_definition(m) for m in missing)
+    conn.execute(
+        text(
+            f"ALTER TABLE {TABLE_NAME} REORGANIZE PARTITION {FUTURE_PARTITION} INTO "
+            f"({definitions}, PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE)"
+        )
+    )
+    return [partition_name(m) for m in missing]
+
+
+def expired_partitions(
+    conn: Connection, retain_months: int, today: Optional[date] = None
+) -> list[str]:
+    """Monthly partitions whose whole month is older than the retention window"""
+    cutoff = add_months(month_start(today or date.today()), -retain_months)
+    return [
+        name
+        for name in list_partitions(conn)
+        if (month := partition_month(name)) is not None and month < cutoff
+    ]
+
+
+def archive_paths(archive_dir: Path, partition: str) -> tuple[Path, Path]:
+    stem = f"{TABLE_NAME}_{partition[1:]}"
+    return archive_dir / f"{stem}.jsonl.gz", archive_dir / f"{stem}.manifest.json"
+
+
+def _jsonable(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8")
+    return value
+
+
+def _row_to_record(row) -> dict:
+    record = {key: _jsonable(row[key]) for key in ARCHIVE_COLUMNS}
+    for key in ("old_values", "new_values"):
+        if isinstance(record[key], str):
+            record[key] = json.loads(record[key])
+    return record
+
+
+class _HashingWriter:
+    """File wrapper that hashes the compressed bytes as they are written"""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.fileobj.write(data)
+
+    def flush(self) -> None:
+        self.fileobj.flush()
+
+
+def file_sha256(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def export_partition(
+    conn: Connection, partition: str, archive_dir: Path
+) -> ArchiveResult:
+    """Stream one partition into a compressed JSONL file plus manifest"""
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    data_path, manifest_path = archive_paths(archive_dir, partition)
+    tmp_path = data_path.with_suffix(data_path.suffix + ".tmp")
+
+    rows = 0
+    min_created = max_created = None
+    result = conn.execution_options(stream_results=True).execute(
+        text(
+            f"SELECT {', '.join(ARCHIVE_COLUMNS)} FROM {TABLE_NAME} "
+            f"PARTITION ({partition}) ORDER BY created_at, id"
+        )
+    )
+    with open(tmp_path, "wb") as raw:
+        hashing = _HashingWriter(raw)
+        with gzip.GzipFile(fileobj=hashing, mode="wb", mtime=0) as gz:
+            for row in result.mappings():
+                record = _row_to_record(row)
+                gz.write(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+                gz.write(b"\n")
+                rows += 1
+                min_created = min_created or record["created_at"]
+                max_created = record["created_at"]
+        raw.flush()
+        os.fsync(raw.fileno())
+
+    os.replace(tmp_path, data_path)
+    checksum = hashing.sha256.hexdigest()
+    manifest = {
+        "table": TABLE_NAME,
+        "partition": partition,
+        "month": partition_month(partition).isoformat(),
+        "file": data_path.name,
+        "format": "jsonl+gzip",
+        "rows": rows,
+        "bytes": hashing.size,
+        "sha256": checksum,
+        "min_created_at": min_created,
+        "max_created_at": max_created,
+        "archived_at": datetime.utcnow().isoformat(),
+    }
+    manifest_path.write_text(json.dumps(manifest, indent=2))
+    return ArchiveResult(partition, rows, data_path, checksum)
+
+
+def read_manifest(manifest_path: Path) -> dict:
+    try:
+        return json.loads(manifest_path.read_text())
+    except (OSError, ValueError) as e:
+        raise ArchiveError(f"Unreadable manifest {manifest_path}: {e}")
+
+
+def verify_archive(manifest_path: Path, count_rows: bool = True) -> dict:
+    """Check an archive file against its manifest checksum and row count"""
+    manifest = read_manifest(manifest_path)
+    data_path = manifest_path.parent / manifest["file"]
+    if not data_path.exists():
+        raise ArchiveError(f"Missing archive file {data_path}")
+    if file_sha256(data_path) != manifest["sha256"]:
+        raise ArchiveError(f"Checksum mismatch for {data_path}")
+    if count_rows:
+        with gzip.open(data_path, "rb") as f:
+            rows = sum(1 for _ in f)
+        if rows != manifest["rows"]:
+            raise ArchiveError(
+                f"{data_path} holds {rows} rows, manifest says {manifest['rows']}"
+            )
+    return manifest
+
+
+def archive_and_drop(
+    conn: Connection, partition: str, archive_dir: Path
+) -> ArchiveResult:
+    """Archive a partition, verify the file, then drop the partition"""
+    result = export_partition(conn, partition, archive_dir)
+    verify_archive(archive_paths(archive_dir, partition)[1])
+    conn.execute(text(f"ALTER TABLE {TABLE_NAME} DROP PARTITION {partition}"))
+    return result
+
+
+def iter_archived_records(
+    archive_dir: Path,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    table_name: Optional[str] = None,
+    record_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+) -> Iterator[dict]:
+    """Yield archived audit records matching the filters, oldest first
+
+    Manifests are used to skip whole months outside ``since``/``until``; each
+    file that is opened is checksum-verified first.
+    """
+    since_key = since.isoformat() if since else None
+    until_key = until.isoformat() if until else None
+
+    for manifest_path in sorted(archive_dir.glob(f"{TABLE_NAME}_*.manifest.json")):
+        manifest = read_manifest(manifest_path)
+        if not manifest["rows"]:
+            continue
+        if since_key and manifest["max_created_at"] < since_key:
+            continue
+        if until_key and manifest["min_created_at"] > until_key:
+            continue
+
+        verify_archive(manifest_path, count_rows=False)
+        with gzip.open(manifest_path.parent / manifest["file"], "rt") as f:
+            for line in f:
+                record = json.loads(line)
+                created = record["created_at"]
+                if since_key and created < since_key:
+                    continue
+                if until_key and created > until_key:
+                    continue
+                if table_name and record["table_name"] != table_name:
+                    continue
+                if record_id is not None and record["record_id"] != record_id:
+                    continue
+                if user_id is not None and record["user_id"] != user_id:
+                    continue
+                yield record
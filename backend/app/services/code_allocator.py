@@ -0,0 +1,125 @@
+"""Collision-free respondent and facility codes.
+
+Codes used to be random strings checked against the table in a retry loop.
+Now each code comes from a counter in ``code_sequences``, and a keyed
+permutation of the code space turns each counter value into a code.
+
+The permutation is a four-round Feistel network whose round function is an
+HMAC. It is a bijection on ``[0, 36**length)``, so distinct counter values
+always give distinct codes, and without the key the codes look random.
+Issuing a code therefore needs no lookup and cannot loop.
+
+``CODE_ALLOCATOR_KEY`` must never change once codes have been issued. A new
+key maps the counter onto a different permutation, which can reproduce codes
+that already exist. Codes typed in by hand, or random legacy codes, can
+still coincide with generated ones. The unique indexes on the code columns
+remain the backstop for those.
+"""
+
+import hashlib
+import hmac
+import string
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.config import get_settings
+from app.database import engine
+from app.models import CodeSequence
+
+settings = get_settings()
+
+ALPHABET = string.ascii_uppercase + string.digits
+FEISTEL_ROUNDS = 4
+
+
+class FeistelPermutation:
+    """Keyed bijection on ``[0, half_size ** 2)``"""
+
+    def __init__(self, key: bytes, half_size: int, rounds: int = FEISTEL_ROUNDS):
+        self.key = key
+        self.half_size = half_size
+        self.size = half_size * half_size
+        self.rounds = rounds
+
+    def _round(self, index: int, value: int) -> int:
+        digest = hmac.new(self.key, f"{index}:{value}".encode(), hashlib.sha256)
+        return int.from_bytes(digest.digest()[:8], "big") % self.half_size
+
+    def permute(self, value: int) -> int:
+        if not 0 <= value < self.size:
+            raise ValueError(f"{value} is outside the permutation domain")
+        left, right = divmod(value, self.half_size)
+        for index in range(self.rounds):
+            left, right = right, (left + self._round(index, right)) % self.half_size
+        return left * self.half_size + right
+
+
+def _encode(value: int, length: int) -> str:
+    chars = []
+    for _ in range(length):
+        value, digit = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[digit])
+    return "".join(reversed(chars))
+
+
+def _reserve(sequence: str, count: int) -> int:
+    """Advance ``sequence`` by ``count``; return the first reserved value
+
+    Runs in its own transaction on the primary so the counter row is locked
+    only briefly. Values reserved by a request that later fails are skipped.
+    """
+    table = CodeSequence.__table__
+    while True:
+        with engine.begin() as conn:
+            advanced = conn.execute(
+                update(table)
+                .where(table.c.name == sequence)
+                .values(next_value=table.c.next_value + count)
+            )
+            if advanced.rowcount:
+                next_value = conn.execute(
+                    select(table.c.next_value).where(table.c.name == sequence)
+                ).scalar_one()
+                return next_value - count
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(table).values(name=sequence, next_value=count))
+            return 0
+        except IntegrityError:
+            # Another worker created the row first; advance it instead
+            continue
+
+
+class CodeAllocator:
+    """Issues ``prefix`` + ``length`` characters from a named sequence"""
+
+    def __init__(self, sequence: str, prefix: str, length: int):
+        if length % 2:
+            raise ValueError("Code length must be even")
+        self.sequence = sequence
+        self.prefix = prefix
+        self.length = length
+        key = hmac.new(
+            settings.CODE_ALLOCATOR_KEY.encode(), sequence.encode(), hashlib.sha256
+        ).digest()
+        self.permutation = FeistelPermutation(key, len(ALPHABET) ** (length // 2))
+
+    def code_for(self, value: int) -> str:
+        return self.prefix + _encode(self.permutation.permute(value), self.length)
+
+    def allocate(self) -> str:
+        return self.allocate_many(1)[0]
+
+    def allocate_many(self, count: int) -> list[str]:
+        """Reserve ``count`` consecutive sequence values in one round trip"""
+        if count < 1:
+            return []
+        first = _reserve(self.sequence, count)
+        if first + count > self.permutation.size:
+            raise RuntimeError(f"The {self.sequence} code space is exhausted")
+        return [self.code_for(value) for value in range(first, first + count)]
+
+
+respondent_codes = CodeAllocator("respondent", "RES", 8)
+facility_codes = CodeAllocator("facility", "FAC", 6)
@@ -0,0 +1,383 @@
+"""Incrementally maintained dashboard counts for SANSA and MNA results.
+
+Every SANSA/MNA insert, level change and delete records a +1/-1 delta for
+its ``dashboard_daily_counts`` bucket from mapper events. The deltas are
+summed per session on a ``app.cache.CommitHook`` and upserted once the
+transaction commits, in one short transaction of their own, so a busy
+bucket row is locked only for that upsert rather than for the rest of every
+submitting request. A rolled back transaction leaves the counts alone; a
+crash between the two commits loses its deltas until the next rebuild. The
+``/stats/summary`` endpoint then reads only these aggregates, so its cost
+depends on facilities x days rather than the number of responses.
+
+Buckets are keyed by the visit's date and facility and the respondent's sex
+and age band at the time of the write. Responses of soft-deleted visits or
+respondents are not counted: setting ``is_deleted`` on either removes their
+responses from the buckets, and clearing it adds them back. Other edits to
+visits or respondents are not propagated; ``rebuild_dashboard_counts``
+recomputes everything.
+
+The listeners are registered when ``app.models`` is imported, so scripts
+and workers that never load the stats router keep the counts current too.
+"""
+
+import logging
+from collections import Counter
+from datetime import date
+from typing import Iterable, Optional
+
+from sqlalchemy import case, delete, event, func, insert, inspect, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session, object_session
+
+from app.cache import CommitHook
+from app.database import engine
+from app.models import (
+    DashboardDailyCount,
+    MNAResponse,
+    Respondent,
+    SANSAResponse,
+    Visit,
+)
+
+logger = logging.getLogger(__name__)
+
+# Instrument name -> (model, level attribute)
+INSTRUMENTS = {
+    "SANSA": (SANSAResponse, "result_level"),
+    "MNA": (MNAResponse, "result_category"),
+}
+
+UNKNOWN = "unknown"
+NO_FACILITY = 0
+
+# (upper bound exclusive, label); ages at or above the last bound get "90+"
+AGE_BANDS = ((60, "<60"), (70, "60-69"), (80, "70-79"), (90, "80-89"))
+TOP_AGE_BAND = "90+"
+
+GROUP_BY_COLUMNS = {
+    "facility": DashboardDailyCount.facility_id,
+    "day": DashboardDailyCount.visit_date,
+    "sex": DashboardDailyCount.sex,
+    "age_band": DashboardDailyCount.age_band,
+}
+
+_BUCKET_KEYS = ("instrument", "visit_date", "facility_id", "sex", "age_band", "level")
+
+
+def age_band(age: Optional[int]) -> str:
+    if age is None:
+        return UNKNOWN
+    for upper, label in AGE_BANDS:
+        if age < upper:
+            return label
+    return TOP_AGE_BAND
+
+
+def _sex_key(sex) -> str:
+    if sex is None:
+        return UNKNOWN
+    return getattr(sex, "value", sex)
+
+
+def _bucket(
+    instrument: str, visit_date: date, facility_id, sex, age, level
+) -> dict:
+    return {
+        "instrument": instrument,
+        "visit_date": visit_date,
+        "facility_id": facility_id or NO_FACILITY,
+        "sex": _sex_key(sex),
+        "age_band": age_band(age),
+        "level": level or UNKNOWN,
+    }
+
+
+def _upsert_delta(connection: Connection, bucket: dict, delta: int) -> None:
+    """Add ``delta`` to a bucket's count, creating the bucket if needed"""
+    table = DashboardDailyCount.__table__
+    values = {**bucket, "response_count": delta}
+
+    if connection.dialect.name == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+        stmt = mysql_insert(table).values(**values)
+        stmt = stmt.on_duplicate_key_update(
+            response_count=table.c.response_count + delta
+        )
+    else:
+        if connection.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+        stmt = dialect_insert(table).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(_BUCKET_KEYS),
+            set_={"response_count": table.c.response_count + delta},
+        )
+    connection.execute(stmt)
+
+
+def _flush_deltas(deltas: Counter) -> None:
+    """Upsert the summed deltas of a committed transaction
+
+    Buckets are written in key order so concurrent flushes lock rows in the
+    same order. A failure is logged rather than raised, since the response
+    itself is already committed; ``rebuild_dashboard_counts`` repairs it.
+    """
+    try:
+        with engine.begin() as connection:
+            for key, delta in sorted(deltas.items()):
+                if delta:
+                    _upsert_delta(connection, dict(zip(_BUCKET_KEYS, key)), delta)
+    except Exception:
+        logger.exception("Failed to apply dashboard count deltas")
+
+
+_dashboard_deltas = CommitHook(_flush_deltas, factory=Counter)
+
+
+def _record(target, bucket: dict, delta: int) -> None:
+    session = object_session(target)
+    if session is not None:
+        key = tuple(bucket[name] for name in _BUCKET_KEYS)
+        _dashboard_deltas.record(session, {key: delta})
+
+
+def _visit_dimensions(connection: Connection, visit_id: int):
+    """Bucket dimensions of a live visit; None if it or its respondent is deleted"""
+    return connection.execute(
+        select(Visit.visit_date, Visit.facility_id, Respondent.sex, Respondent.age)
+        .join(Respondent, Respondent.id == Visit.respondent_id)
+        .where(
+            Visit.id == visit_id,
+            Visit.is_deleted == False,
+            Respondent.is_deleted == False,
+        )
+    ).first()
+
+
+def _apply(
+    connection: Connection, target, instrument: str, level, delta: int
+) -> None:
+    dims = _visit_dimensions(connection, target.visit_id)
+    if dims is None:
+        return
+    _record(
+        target,
+        _bucket(instrument, dims.visit_date, dims.facility_id, dims.sex, dims.age, level),
+        delta,
+    )
+
+
+def _register(instrument: str, model, level_attr: str) -> None:
+    # active_history loads the previous level even if the attribute was
+    # expired, so the old bucket can always be decremented
+    @event.listens_for(getattr(model, level_attr), "set", active_history=True)
+    def _track_level(target, value, oldvalue, initiator):
+        return value
+
+    @event.listens_for(model, "after_insert")
+    def _count_insert(mapper, connection, target):
+        _apply(connection, target, instrument, getattr(target, level_attr), 1)
+
+    @event.listens_for(model, "after_update")
+    def _count_update(mapper, connection, target):
+        history = inspect(target).attrs[level_attr].history
+        if not history.has_changes():
+            return
+        old_level = history.deleted[0] if history.deleted else None
+        new_level = getattr(target, level_attr)
+        if old_level == new_level:
+            return
+        _apply(connection, target, instrument, old_level, -1)
+        _apply(connection, target, instrument, new_level, 1)
+
+    @event.listens_for(model, "after_delete")
+    def _count_delete(mapper, connection, target):
+        _apply(connection, target, instrument, getattr(target, level_attr), -1)
+
+
+for _name, (_model, _level_attr) in INSTRUMENTS.items():
+    _register(_name, _model, _level_attr)
+
+
+def _shift_responses(
+    connection: Connection, target, delta: int, *conditions
+) -> None:
+    """Add ``delta`` per response matching ``conditions`` to its bucket"""
+    for instrument, (model, level_attr) in INSTRUMENTS.items():
+        level = getattr(model, level_attr)
+        rows = connection.execute(
+            select(
+                Visit.visit_date,
+                Visit.facility_id,
+                Respondent.sex,
+                Respondent.age,
+                level,
+                func.count(),
+            )
+            .select_from(model)
+            .join(Visit, Visit.id == model.visit_id)
+            .join(Respondent, Respondent.id == Visit.respondent_id)
+            .where(*conditions)
+            .group_by(
+                Visit.visit_date,
+                Visit.facility_id,
+                Respondent.sex,
+                Respondent.age,
+                level,
+            )
+        ).all()
+        for visit_date, facility_id, sex, age, level_value, count in rows:
+            _record(
+                target,
+                _bucket(instrument, visit_date, facility_id, sex, age, level_value),
+                delta * count,
+            )
+
+
+# Load the previous is_deleted even if it was expired, so a restore is seen
+@event.listens_for(Visit.is_deleted, "set", active_history=True)
+@event.listens_for(Respondent.is_deleted, "set", active_history=True)
+def _track_deleted(target, value, oldvalue, initiator):
+    return value
+
+
+def _deletion_delta(target) -> int:
+    """-1 if ``target`` was just soft-deleted, +1 if restored, else 0"""
+    history = inspect(target).attrs.is_deleted.history
+    if not history.has_changes():
+        return 0
+    was_deleted = bool(history.deleted[0]) if history.deleted else False
+    if was_deleted == bool(target.is_deleted):
+        return 0
+    return -1 if target.is_deleted else 1
+
+
+@event.listens_for(Visit, "after_update")
+def _visit_deleted_or_restored(mapper, connection, target):
+    delta = _deletion_delta(target)
+    if delta:
+        _shift_responses(
+            connection,
+            target,
+            delta,
+            Visit.id == target.id,
+            Respondent.is_deleted == False,
+        )
+
+
+@event.listens_for(Respondent, "after_update")
+def _respondent_deleted_or_restored(mapper, connection, target):
+    delta = _deletion_delta(target)
+    if delta:
+        _shift_responses(
+            connection,
+            target,
+            delta,
+            Visit.respondent_id == target.id,
+            Visit.is_deleted == False,
+        )
+
+
+def _age_band_expression():
+    return case(
+        (Respondent.age.is_(None), UNKNOWN),
+        *[(Respondent.age < upper, label) for upper, label in AGE_BANDS],
+        else_=TOP_AGE_BAND,
+    )
+
+
+def rebuild_dashboard_counts(db: Session) -> int:
+    """Recompute all dashboard buckets from the response tables
+
+    Returns the number of buckets written. Runs in the caller's transaction.
+    """
+    db.execute(delete(DashboardDailyCount))
+
+    buckets = 0
+    for instrument, (model, level_attr) in INSTRUMENTS.items():
+        band = _age_band_expression()
+        level = getattr(model, level_attr)
+        rows = db.execute(
+            select(
+                Visit.visit_date,
+                Visit.facility_id,
+                Respondent.sex,
+                band,
+                level,
+                func.count(),
+            )
+            .select_from(model)
+            .join(Visit, Visit.id == model.visit_id)
+            .join(Respondent, Respondent.id == Visit.respondent_id)
+            .where(Visit.is_deleted == False, Respondent.is_deleted == False)
+            .group_by(Visit.visit_date, Visit.facility_id, Respondent.sex, band, level)
+        ).all()
+
+        values = [
+            {
+                "instrument": instrument,
+                "visit_date": visit_date,
+                "facility_id": facility_id or NO_FACILITY,
+                "sex": _sex_key(sex),
+                "age_band": band_label,
+                "level": level_value or UNKNOWN,
+                "response_count": count,
+            }
+            for visit_date, facility_id, sex, band_label, level_value, count in rows
+        ]
+        if values:
+            db.execute(insert(DashboardDailyCount), values)
+        buckets += len(values)
+
+    return buckets
+
+
+def summarize(
+    db: Session,
+    group_by: Iterable[str] = (),
+    instrument: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    facility_id: Optional[int] = None,
+) -> list[dict]:
+    """Sum bucket counts per instrument and level, split by ``group_by`` dims"""
+    dims = [d for d in GROUP_BY_COLUMNS if d in set(group_by)]
+    dim_columns = [GROUP_BY_COLUMNS[d] for d in dims]
+    total = func.sum(DashboardDailyCount.response_count)
+
+    query = select(
+        DashboardDailyCount.instrument,
+        DashboardDailyCount.level,
+        *dim_columns,
+        total,
+    ).group_by(DashboardDailyCount.instrument, DashboardDailyCount.level, *dim_columns)
+
+    if instrument:
+        query = query.where(DashboardDailyCount.instrument == instrument)
+    if start_date:
+        query = query.where(DashboardDailyCount.visit_date >= start_date)
+    if end_date:
+        query = query.where(DashboardDailyCount.visit_date <= end_date)
+    if facility_id is not None:
+        query = query.where(DashboardDailyCount.facility_id == facility_id)
+
+    query = query.having(total > 0).order_by(
+        DashboardDailyCount.instrument, *dim_columns, DashboardDailyCount.level
+    )
+
+    results = []
+    for row in db.execute(query):
+        item = {"instrument": row[0], "level": row[1], "count": int(row[-1])}
+        for dim, value in zip(dims, row[2:-1]):
+            if dim == "facility":
+                item["facility_id"] = value or None
+            elif dim == "day":
+                item["visit_date"] = value
+            else:
+                item[dim] = value
+        results.append(item)
+    return results
@@ -5,6 +5,7 @@ import io
 from decimal import Decimal
 from sqlalchemy.orm import Session
 from sqlalchemy import and_
+from app.database import use_replica
 from app.models import (
     Respondent,
     Visit,
@@ -16,10 +17,14 @@ from app.models import (
 
 
 class ExportService:
-    """Service for exporting data to SPSS-compatible CSV format"""
+    """Service for exporting data to SPSS-compatible CSV format
+
+    Exports are read-only scans, so they run on the read replica when one
+    is configured.
+    """
 
     def __init__(self, db: Session):
-        self.db = db
+        self.db = use_replica(db)
 
     def export_sansa_csv(
         self,
@@ -0,0 +1,168 @@
+"""Nearest-facility lookups from an in-memory spatial index.
+
+Active facilities with coordinates are loaded once per worker into a
+KD-tree over points on the unit sphere (x, y, z). Straight-line distance
+between such points grows with great-circle distance, so the k nearest in
+the tree are the k nearest on the map, and no longitude wrap-around or
+pole handling is needed. Candidates are then ranked by haversine distance
+in kilometres and returned with the facility data serialized at build
+time, so a lookup runs no query.
+
+The index is an ``app.cache.Snapshot``: committed writes to ``Facility``
+drop it and the next lookup rebuilds it, and it expires after
+``FACILITY_INDEX_TTL_SECONDS``.
+"""
+
+import heapq
+import math
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.cache import Snapshot
+from app.config import get_settings
+from app.models import Facility
+from app.schemas import FacilityResponse
+
+settings = get_settings()
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lng2 - lng1)
+    a = (
+        math.sin(dphi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _unit_vector(lat: float, lng: float) -> tuple[float, float, float]:
+    phi, lam = math.radians(lat), math.radians(lng)
+    return (
+        math.cos(phi) * math.cos(lam),
+        math.cos(phi) * math.sin(lam),
+        math.sin(phi),
+    )
+
+
+def _chord(distance_km: float) -> float:
+    """Unit-sphere chord length for a great-circle distance"""
+    angle = min(distance_km / EARTH_RADIUS_KM, math.pi)
+    return 2 * math.sin(angle / 2)
+
+
+class KDTree:
+    """Static 3-d tree answering k-nearest queries within a bound"""
+
+    def __init__(self, points: list[tuple[float, float, float]]):
+        self.points = points
+        self._root = self._build(list(range(len(points))), 0)
+
+    def _build(self, indices: list[int], depth: int):
+        if not indices:
+            return None
+        axis = depth % 3
+        indices.sort(key=lambda i: self.points[i][axis])
+        middle = len(indices) // 2
+        return (
+            indices[middle],
+            axis,
+            self._build(indices[:middle], depth + 1),
+            self._build(indices[middle + 1 :], depth + 1),
+        )
+
+    def nearest(
+        self, target: tuple[float, float, float], k: int, max_distance: float
+    ) -> list[int]:
+        """Indices of up to ``k`` points within ``max_distance``, nearest first"""
+        best: list[tuple[float, int]] = []  # max-heap of (-squared distance, index)
+        bound = max_distance * max_distance
+
+        def limit() -> float:
+            return -best[0][0] if len(best) == k else bound
+
+        def visit(node) -> None:
+            if node is None:
+                return
+            index, axis, left, right = node
+            point = self.points[index]
+            squared = sum((a - b) ** 2 for a, b in zip(point, target))
+            if squared <= limit():
+                heapq.heappush(best, (-squared, index))
+                if len(best) > k:
+                    heapq.heappop(best)
+            diff = target[axis] - point[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            if diff * diff <= limit():
+                visit(far)
+
+        if k > 0:
+            visit(self._root)
+        return [index for _, index in sorted(best, reverse=True)]
+
+
+@dataclass(frozen=True)
+class FacilityIndex:
+    tree: KDTree
+    coordinates: list[tuple[float, float]]
+    facilities: list[dict]  # FacilityResponse data, aligned with the tree
+
+
+def build_index(db: Session) -> FacilityIndex:
+    rows = (
+        db.query(Facility)
+        .filter(
+            Facility.is_deleted == False,
+            Facility.is_active == True,
+            Facility.latitude.isnot(None),
+            Facility.longitude.isnot(None),
+        )
+        .all()
+    )
+    coordinates = [(float(f.latitude), float(f.longitude)) for f in rows]
+    return FacilityIndex(
+        tree=KDTree([_unit_vector(lat, lng) for lat, lng in coordinates]),
+        coordinates=coordinates,
+        facilities=[FacilityResponse.model_validate(f).model_dump() for f in rows],
+    )
+
+
+facility_index = Snapshot(
+    build_index, ttl_seconds=settings.FACILITY_INDEX_TTL_SECONDS
+)
+facility_index.invalidate_on_change(Facility)
+
+
+def get_index(db: Session) -> FacilityIndex:
+    """The current index, rebuilt if it was invalidated or has expired"""
+    return facility_index.get(db)
+
+
+def nearby_facilities(
+    db: Session,
+    lat: float,
+    lng: float,
+    limit: int,
+    radius_km: Optional[float] = None,
+) -> list[dict]:
+    """Up to ``limit`` facilities nearest to (lat, lng), with ``distance_km``"""
+    index = get_index(db)
+    # Pad the bound slightly so float error cannot drop a point on the edge
+    max_distance = _chord(radius_km) * (1 + 1e-9) if radius_km else 2.0
+    candidates = index.tree.nearest(_unit_vector(lat, lng), limit, max_distance)
+
+    results = []
+    for i in candidates:
+        distance = haversine_km(lat, lng, *index.coordinates[i])
+        if radius_km is None or distance <= radius_km:
+            results.append({**index.facilities[i], "distance_km": round(distance, 3)})
+    results.sort(
+        key=lambda f: (f["distance_km"], f["display_order"], f["name"])
+    )
+    return results
@@ -0,0 +1,206 @@
+"""Downscaled derivatives of food diary photos.
+
+Phone photos are several megabytes, far too much for list views on clinic
+Wi-Fi. After an upload commits, each photo is queued here. A worker process
+then writes a ``thumb`` and a ``medium`` variant with Pillow. Each variant
+has EXIF orientation applied and all metadata (EXIF, GPS, ICC) stripped,
+and is written as WebP by default. Workers read the original from, and
+write the variants back to, the configured storage backend (app.storage),
+next to the original under ``variants/``. The variant URLs are recorded on
+``FoodDiaryPhoto.variants``.
+
+Rendering runs in a small process pool, so neither the event loop nor the
+request threads spend CPU on image decoding. Photos without variants (older
+uploads, or a worker that died) can be regenerated with
+scripts/generate_photo_variants.py.
+"""
+
+import logging
+import multiprocessing
+import os
+import posixpath
+import shutil
+import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterable, Optional
+
+from PIL import Image, ImageOps
+
+from app.config import get_settings
+from app.storage import get_storage, url_for
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+VARIANTS = {
+    "thumb": settings.IMAGE_THUMB_SIZE,
+    "medium": settings.IMAGE_MEDIUM_SIZE,
+}
+
+_FORMATS = {
+    "webp": ("WEBP", ".webp", "image/webp"),
+    "jpeg": ("JPEG", ".jpg", "image/jpeg"),
+}
+
+VARIANT_DIR = "variants"
+
+
+def render_variants(
+    source_path: str,
+    dest_dir: str,
+    stem: str,
+    sizes: dict[str, int],
+    image_format: str,
+    quality: int,
+) -> dict[str, str]:
+    """Write one downscaled copy per entry in ``sizes``; return name -> filename
+
+    Runs in a worker process, so it only takes and returns plain values.
+    """
+    pil_format, extension, _ = _FORMATS[image_format]
+    os.makedirs(dest_dir, exist_ok=True)
+    written = {}
+
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        has_alpha = "A" in image.mode or "transparency" in image.info
+        mode = "RGBA" if has_alpha and pil_format == "WEBP" else "RGB"
+        if image.mode != mode:
+            image = image.convert(mode)
+
+        for name, max_side in sizes.items():
+            variant = image.copy()
+            variant.thumbnail((max_side, max_side), Image.LANCZOS)
+            filename = f"{stem}_{name}{extension}"
+
+            # New images carry no EXIF/ICC unless passed explicitly
+            fd, tmp_path = tempfile.mkstemp(dir=dest_dir, suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    variant.save(out, pil_format, quality=quality, optimize=True)
+                os.replace(tmp_path, os.path.join(dest_dir, filename))
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            written[name] = filename
+
+    return written
+
+
+def render_stored_variants(
+    key: str, sizes: dict[str, int], image_format: str, quality: int
+) -> dict[str, str]:
+    """Render variants of the stored file ``key``; return name -> storage key
+
+    Runs in a worker process. Existing variants are overwritten.
+    """
+    storage = get_storage()
+    source_path, is_copy = storage.fetch(key)
+    work_dir = tempfile.mkdtemp(dir=storage.staging_dir, prefix=".render-")
+    try:
+        stem = posixpath.splitext(posixpath.basename(key))[0]
+        written = render_variants(
+            source_path, work_dir, stem, sizes, image_format, quality
+        )
+        variant_dir = posixpath.join(posixpath.dirname(key), VARIANT_DIR)
+        keys = {}
+        for name, filename in written.items():
+            keys[name] = posixpath.join(variant_dir, filename)
+            storage.store_file(
+                os.path.join(work_dir, filename),
+                keys[name],
+                _FORMATS[image_format][2],
+                replace=True,
+            )
+        return keys
+    finally:
+        if is_copy:
+            os.remove(source_path)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+class ImagePipeline:
+    """Process pool that renders variants and records them on the photo rows"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Not fork: the server is multi-threaded, and a forked child
+                # can inherit a lock held by a thread that does not exist
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def submit(
+        self, photo_id: int, key: str, content_sha256: Optional[str] = None
+    ) -> Future:
+        """Render variants for one photo stored under ``key``
+
+        With ``content_sha256`` the result is recorded on every photo row
+        sharing that content which has no variants yet.
+        """
+        future = self._get_executor().submit(
+            render_stored_variants,
+            key,
+            VARIANTS,
+            settings.IMAGE_VARIANT_FORMAT,
+            settings.IMAGE_VARIANT_QUALITY,
+        )
+        future.add_done_callback(
+            lambda f: self._record(photo_id, content_sha256, f)
+        )
+        return future
+
+    def submit_many(self, photos: Iterable[tuple]) -> list[Future]:
+        """Submit (photo_id, key[, content_sha256]) tuples"""
+        return [self.submit(*photo) for photo in photos]
+
+    def _record(
+        self, photo_id: int, content_sha256: Optional[str], future: Future
+    ) -> None:
+        # Imported here to keep worker processes free of the DB layer
+        from app.database import SessionLocal
+        from app.models import FoodDiaryPhoto
+
+        try:
+            written = future.result()
+        except Exception:
+            logger.exception("Could not render variants for photo %s", photo_id)
+            return
+
+        db = SessionLocal()
+        try:
+            query = db.query(FoodDiaryPhoto)
+            if content_sha256:
+                query = query.filter(
+                    FoodDiaryPhoto.content_sha256 == content_sha256,
+                    FoodDiaryPhoto.variants.is_(None),
+                )
+            else:
+                query = query.filter(FoodDiaryPhoto.id == photo_id)
+            variants = {name: url_for(key) for name, key in written.items()}
+            for photo in query:
+                photo.variants = variants
+            db.commit()
+        except Exception:
+            logger.exception("Could not record variants for photo %s", photo_id)
+        finally:
+            db.close()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+image_pipeline = ImagePipeline(workers=settings.IMAGE_WORKERS)
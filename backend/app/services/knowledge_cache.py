@@ -0,0 +1,71 @@
+"""In-memory snapshot of the published knowledge center.
+
+The public knowledge endpoints are read on every page load and change only
+when staff edit a post. Each worker keeps one snapshot of all published,
+non-deleted posts, loaded with a single query and serialized up front:
+
+- the list body, a ``KnowledgePostSummary`` projection without ``content``;
+- one body per post, with its content.
+
+Every body is stored as a ``RenderedBody`` (app.cache), so a request is a
+dict lookup that returns gzip or identity bytes with a strong ETag, or a
+304.
+
+The snapshot is an ``app.cache.Snapshot``: committed writes to
+``KnowledgePost`` drop it and the next read rebuilds it, and it expires
+after ``KNOWLEDGE_CACHE_TTL_SECONDS``.
+"""
+
+from dataclasses import dataclass
+
+from sqlalchemy.orm import Session
+
+from app.cache import RenderedBody, Snapshot
+from app.config import get_settings
+from app.models import KnowledgePost
+from app.schemas import KnowledgePostResponse, KnowledgePostSummary
+
+settings = get_settings()
+
+
+@dataclass(frozen=True)
+class KnowledgeSnapshot:
+    listing: RenderedBody
+    posts: dict[int, RenderedBody]
+
+
+def _json_array(items: list[bytes]) -> bytes:
+    return b"[" + b",".join(items) + b"]"
+
+
+def build_snapshot(db: Session) -> KnowledgeSnapshot:
+    posts = (
+        db.query(KnowledgePost)
+        .filter(KnowledgePost.is_deleted == False, KnowledgePost.is_published == True)
+        .order_by(KnowledgePost.display_order.asc(), KnowledgePost.created_at.desc())
+        .all()
+    )
+    summaries = [
+        KnowledgePostSummary.model_validate(post).model_dump_json().encode()
+        for post in posts
+    ]
+    return KnowledgeSnapshot(
+        listing=RenderedBody.from_bytes(_json_array(summaries)),
+        posts={
+            post.id: RenderedBody.from_bytes(
+                KnowledgePostResponse.model_validate(post).model_dump_json().encode()
+            )
+            for post in posts
+        },
+    )
+
+
+knowledge_snapshot = Snapshot(
+    build_snapshot, ttl_seconds=settings.KNOWLEDGE_CACHE_TTL_SECONDS
+)
+knowledge_snapshot.invalidate_on_change(KnowledgePost)
+
+
+def get_snapshot(db: Session) -> KnowledgeSnapshot:
+    """The current snapshot, rebuilt if it was invalidated or has expired"""
+    return knowledge_snapshot.get(db)
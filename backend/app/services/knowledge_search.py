@@ -0,0 +1,408 @@
+"""In-process BM25 search over published knowledge posts.
+
+Thai is written without spaces between words, so neither MySQL FULLTEXT
+nor splitting on whitespace finds words inside a sentence. Text is
+tokenized here instead:
+
+- Latin and digit runs become one term per word;
+- Thai runs are segmented against a word list by maximal matching (fewest
+  characters left outside known words, then fewest words), and unknown
+  stretches are kept as terms of their own;
+- every Thai run also contributes its character bigrams, so misspellings,
+  names and words missing from the list still match.
+
+The word list is a small built-in nutrition vocabulary, extended with
+``KNOWLEDGE_SEARCH_DICTIONARY`` (a UTF-8 file with one word per line, such
+as the Thai word list shipped with PyThaiNLP).
+
+Posts are ranked with BM25 over ``title``, ``summary``, ``content`` and
+``tags``, with term frequencies and lengths weighted per field
+(``FIELD_WEIGHTS``).
+
+The index keeps a hash of each post's indexed fields as its version.
+Committed changes made through this process are applied on the next search
+through mapper events; every ``KNOWLEDGE_SEARCH_REFRESH_SECONDS`` the index
+also reads the id and hash of every published post (hashed in SQL on MySQL)
+and loads and re-indexes only the posts that changed, which picks up other
+workers. Loading and tokenizing happen outside the index lock, so searches
+keep running during a sync. Each change is saved to
+``KNOWLEDGE_SEARCH_SNAPSHOT``, and startup loads that snapshot and catches
+up the same way instead of re-indexing every post.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from typing import Iterable, Optional
+
+from sqlalchemy import func, literal, select
+from sqlalchemy.orm import Session
+
+from app.cache import CommitHook
+from app.config import get_settings
+from app.database import use_primary
+from app.models import KnowledgePost
+from app.text import normalize_text
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# Bump when tokenization changes so old snapshots are rebuilt
+TOKENIZER_VERSION = 1
+
+FIELD_WEIGHTS = {"title": 3.0, "tags": 2.0, "summary": 1.5, "content": 1.0}
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Changed posts are loaded this many at a time during a sync
+SYNC_BATCH_SIZE = 500
+
+# Thai vowel and tone marks are not \w, so Thai runs are matched explicitly
+_TERM_RE = re.compile("([\u0e01-\u0e5b]+)|[^\\W_\u0e00-\u0e7f]+")
+_BIGRAM = "\x02"  # marks bigram terms apart from two-letter words
+_MARKUP_RE = re.compile(r"<[^>]+>|&[a-z]+;|&#\d+;")
+
+BUILTIN_THAI_WORDS = """
+กิน ดื่ม รับประทาน อาหาร อาหารเสริม มื้อ เช้า กลางวัน เย็น ว่าง นอน หลับ
+โภชนาการ ทุพโภชนาการ สารอาหาร ขาดสารอาหาร พลังงาน แคลอรี่ ปริมาณ สัดส่วน
+โปรตีน ไขมัน คาร์โบไฮเดรต วิตามิน แร่ธาตุ ใยอาหาร แคลเซียม โซเดียม ธาตุเหล็ก
+น้ำ น้ำตาล เกลือ นม ไข่ ปลา เนื้อ ไก่ หมู ถั่ว ข้าว ผัก ผลไม้ ธัญพืช
+ผู้สูงอายุ สุขภาพ ร่างกาย น้ำหนัก ส่วนสูง ดัชนีมวลกาย กล้ามเนื้อ กระดูก ฟัน
+ออกกำลังกาย เดิน เคี้ยว กลืน ย่อย ลำไส้ ท้องผูก ความอยากอาหาร
+โรค เบาหวาน ความดัน ความดันโลหิตสูง หัวใจ ไต ภาวะ ความเสี่ยง
+ดูแล ป้องกัน ประเมิน คำแนะนำ วิธี ลด เพิ่ม ควร หลีกเลี่ยง
+การ ความ และ หรือ ที่ ของ ใน กับ สำหรับ เพื่อ ให้ มี เป็น ได้ จาก ไม่ ดี
+"""
+
+
+def _strip_markup(text: str) -> str:
+    return _MARKUP_RE.sub(" ", text)
+
+
+@lru_cache()
+def thai_dictionary() -> frozenset:
+    words = set(BUILTIN_THAI_WORDS.split())
+    path = settings.KNOWLEDGE_SEARCH_DICTIONARY
+    if path:
+        with open(path, encoding="utf-8") as f:
+            words.update(line.strip() for line in f)
+    return frozenset(w for w in map(normalize_text, words) if w)
+
+
+@lru_cache()
+def _word_lengths() -> list[int]:
+    return sorted({len(w) for w in thai_dictionary()}, reverse=True)
+
+
+@lru_cache()
+def tokenizer_fingerprint() -> str:
+    """Identifies the tokenizer and word list a snapshot was built with"""
+    digest = hashlib.sha256(str(TOKENIZER_VERSION).encode())
+    for word in sorted(thai_dictionary()):
+        digest.update(word.encode() + b"\n")
+    return digest.hexdigest()
+
+
+def segment_thai(run: str) -> list[str]:
+    """Maximal-matching segmentation of a run of Thai characters"""
+    words = thai_dictionary()
+    n = len(run)
+    # best[i]: (unmatched characters, words) for run[:i], and where it split
+    best: list[Optional[tuple]] = [None] * (n + 1)
+    best[0] = (0, 0, 0, True)
+    for i in range(n):
+        if best[i] is None:
+            continue
+        unknown, count = best[i][:2]
+        for length in _word_lengths():
+            j = i + length
+            if j <= n and run[i:j] in words:
+                candidate = (unknown, count + 1, i, True)
+                if best[j] is None or candidate[:2] < best[j][:2]:
+                    best[j] = candidate
+        candidate = (unknown + 1, count + 1, i, False)
+        if best[i + 1] is None or candidate[:2] < best[i + 1][:2]:
+            best[i + 1] = candidate
+
+    pieces = []
+    i = n
+    while i > 0:
+        _, _, start, known = best[i]
+        pieces.append((run[start:i], known))
+        i = start
+    pieces.reverse()
+
+    # Adjacent unmatched characters form one unknown word
+    tokens: list[str] = []
+    pending = ""
+    for piece, known in pieces:
+        if known:
+            if pending:
+                tokens.append(pending)
+                pending = ""
+            tokens.append(piece)
+        else:
+            pending += piece
+    if pending:
+        tokens.append(pending)
+    return tokens
+
+
+def tokenize(text: Optional[str]) -> list[str]:
+    """Search terms of ``text``: words, Thai segments and Thai bigrams"""
+    text = normalize_text(_strip_markup(text or ""))
+    terms = []
+    for match in _TERM_RE.finditer(text):
+        run = match.group()
+        if match.group(1):
+            terms.extend(segment_thai(run))
+            terms.extend(_BIGRAM + run[i : i + 2] for i in range(len(run) - 1))
+        else:
+            terms.append(run)
+    return terms
+
+
+def document_terms(post) -> dict[str, float]:
+    """Field-weighted term frequencies of a post (or a row of its fields)"""
+    terms: Counter = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        for term in tokenize(getattr(post, field)):
+            terms[term] += weight
+    return dict(terms)
+
+
+class KnowledgeSearchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # One sync at a time, so an older read never overwrites a newer one
+        self._sync_lock = threading.Lock()
+        self._clear()
+        self._dirty: set[int] = set()
+        self.synced_at: Optional[float] = None
+
+    def _clear(self) -> None:
+        self._postings: dict[str, dict[int, float]] = {}
+        self._docs: dict[int, dict[str, float]] = {}
+        self._lengths: dict[int, float] = {}
+        self._versions: dict[int, str] = {}
+        self._total_length = 0.0
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _remove(self, post_id: int) -> None:
+        terms = self._docs.pop(post_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings[term]
+            del postings[post_id]
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._lengths.pop(post_id)
+        self._versions.pop(post_id, None)
+
+    def _add(self, post_id: int, version: str, terms: dict[str, float]) -> None:
+        self._remove(post_id)
+        self._docs[post_id] = terms
+        self._versions[post_id] = version
+        length = sum(terms.values())
+        self._lengths[post_id] = length
+        self._total_length += length
+        for term, frequency in terms.items():
+            self._postings.setdefault(term, {})[post_id] = frequency
+
+    def mark_dirty(self, post_ids: Iterable[int]) -> None:
+        with self._lock:
+            self._dirty.update(post_ids)
+
+    def is_stale(self, max_age: float) -> bool:
+        return (
+            self.synced_at is None
+            or bool(self._dirty)
+            or time.monotonic() - self.synced_at > max_age
+        )
+
+    def sync(self, db: Session) -> int:
+        """Re-index posts whose version differs from the database
+
+        Returns how many posts were added, changed or removed.
+        """
+        with self._sync_lock:
+            with self._lock:
+                self._dirty.clear()
+                known = dict(self._versions)
+
+            current = published_versions(db)
+            changed = [
+                post_id
+                for post_id, version in current.items()
+                if known.get(post_id) != version
+            ]
+            documents = {}
+            for start in range(0, len(changed), SYNC_BATCH_SIZE):
+                for row in db.execute(
+                    _indexed_fields().where(
+                        KnowledgePost.id.in_(changed[start : start + SYNC_BATCH_SIZE])
+                    )
+                ):
+                    documents[row.id] = (content_version(row), document_terms(row))
+
+            with self._lock:
+                removed = [post_id for post_id in self._docs if post_id not in current]
+                for post_id in removed:
+                    self._remove(post_id)
+                for post_id, (version, terms) in documents.items():
+                    self._add(post_id, version, terms)
+                self.synced_at = time.monotonic()
+            return len(removed) + len(documents)
+
+    def search(self, query: str, limit: int) -> list[tuple[int, float]]:
+        """(post id, score) of the best matches for ``query``"""
+        terms = set(tokenize(query))
+        with self._lock:
+            if not terms or not self._docs:
+                return []
+            count = len(self._docs)
+            average_length = self._total_length / count or 1.0
+            scores: Counter = Counter()
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for post_id, frequency in postings.items():
+                    norm = BM25_K1 * (
+                        1 - BM25_B + BM25_B * self._lengths[post_id] / average_length
+                    )
+                    scores[post_id] += (
+                        idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+                    )
+        return [(post_id, round(score, 4)) for post_id, score in scores.most_common(limit)]
+
+    def save(self, path: str) -> None:
+        """Write the index atomically as gzip-compressed JSON"""
+        with self._lock:
+            payload = {
+                "tokenizer": tokenizer_fingerprint(),
+                "posts": {
+                    str(post_id): [self._versions[post_id], terms]
+                    for post_id, terms in self._docs.items()
+                },
+            }
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(
+                fileobj=raw, mode="wb", mtime=0
+            ) as f:
+                f.write(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def load(self, path: str) -> bool:
+        """Replace the index with a saved snapshot; False if none is usable"""
+        try:
+            with gzip.open(path, "rb") as f:
+                payload = json.loads(f.read())
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError):
+            logger.warning("Ignoring unreadable search snapshot %s", path)
+            return False
+        if payload.get("tokenizer") != tokenizer_fingerprint():
+            return False
+        with self._lock:
+            self._clear()
+            for post_id, (version, terms) in payload["posts"].items():
+                self._add(int(post_id), version, terms)
+        return True
+
+
+def content_version(post) -> str:
+    """Hash of the indexed fields; any edit changes it, however close in time"""
+    digest = hashlib.sha256()
+    for field in FIELD_WEIGHTS:
+        digest.update((getattr(post, field) or "").encode("utf-8") + b"\x00")
+    return digest.hexdigest()
+
+
+def _sql_content_version(dialect: str):
+    """``content_version`` as a SQL expression, or None if it must run here
+
+    MySQL's SHA2 over the same NUL-separated fields gives the same hex
+    digest. PostgreSQL text cannot hold NUL, and SQLite has no SHA-256.
+    """
+    if dialect != "mysql":
+        return None
+    parts = []
+    for field in FIELD_WEIGHTS:
+        parts += [func.coalesce(getattr(KnowledgePost, field), ""), literal("\x00")]
+    return func.sha2(func.concat(*parts), 256)
+
+
+def _published(query):
+    return query.where(
+        KnowledgePost.is_published == True,
+        KnowledgePost.is_deleted == False,
+    )
+
+
+def _indexed_fields():
+    return _published(
+        select(
+            KnowledgePost.id,
+            *(getattr(KnowledgePost, field) for field in FIELD_WEIGHTS),
+        )
+    )
+
+
+def published_versions(db: Session) -> dict[int, str]:
+    """Version of every published post, without loading its text if possible"""
+    version = _sql_content_version(db.get_bind().dialect.name)
+    if version is None:
+        return {row.id: content_version(row) for row in db.execute(_indexed_fields())}
+    return dict(db.execute(_published(select(KnowledgePost.id, version))).all())
+
+
+search_index = KnowledgeSearchIndex()
+
+
+def _sync_and_save(db: Session) -> None:
+    with use_primary(db):
+        changed = search_index.sync(db)
+    if changed and settings.KNOWLEDGE_SEARCH_SNAPSHOT:
+        try:
+            search_index.save(settings.KNOWLEDGE_SEARCH_SNAPSHOT)
+        except OSError:
+            logger.warning("Could not save the knowledge search snapshot", exc_info=True)
+
+
+def load_search_index(db: Session) -> int:
+    """Load the saved snapshot, catch up with the database and save"""
+    if settings.KNOWLEDGE_SEARCH_SNAPSHOT:
+        search_index.load(settings.KNOWLEDGE_SEARCH_SNAPSHOT)
+    _sync_and_save(db)
+    return len(search_index)
+
+
+def search_knowledge_posts(db: Session, query: str, limit: int) -> list[tuple[int, float]]:
+    """Ranked (post id, score) for ``query``, syncing the index first if due"""
+    if search_index.is_stale(settings.KNOWLEDGE_SEARCH_REFRESH_SECONDS):
+        _sync_and_save(db)
+    return search_index.search(query, limit)
+
+
+CommitHook(search_index.mark_dirty).watch(KnowledgePost)
@@ -0,0 +1,218 @@
+"""In-memory autocomplete over food diary menu names.
+
+Every distinct ``FoodDiaryEntry.menu_name`` is kept in a per-process
+character trie, weighted by how many entries use it. Each trie node caches
+its top ``MENU_SUGGEST_TOP_K`` names, so a lookup is a walk down the prefix
+and a slice: no database query per keystroke.
+
+Names are matched after normalization (``app.text.normalize_text``: NFC,
+casefold, collapsed whitespace, zero-width characters removed, and common
+Thai typing variants folded). Spellings that normalize alike are merged,
+and the most used spelling is suggested.
+Besides the whole name, each word after a space is also a match start,
+so "กุ้ง" finds "ข้าวผัด กุ้ง" and "rice" finds "fried rice".
+
+Committed inserts, renames and deletes are applied incrementally through
+mapper events (``app.cache.CommitHook``), and the whole index is reloaded
+every ``MENU_INDEX_REFRESH_SECONDS``.
+"""
+
+import heapq
+import threading
+import time
+from collections import Counter
+from typing import Iterable, Optional
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session, object_session
+
+from app.cache import CommitHook
+from app.config import get_settings
+from app.database import use_primary
+from app.models import FoodDiaryEntry
+from app.text import collapse_whitespace, normalize_text
+
+settings = get_settings()
+
+def _match_starts(key: str) -> list[str]:
+    """The whole key and every suffix starting at a word"""
+    return [key] + [key[i + 1 :] for i, ch in enumerate(key) if ch == " "]
+
+
+class _Node:
+    __slots__ = ("children", "terminals", "top", "dirty")
+
+    def __init__(self):
+        self.children: dict[str, "_Node"] = {}
+        self.terminals: set[str] = set()  # keys with a match start ending here
+        self.top: list[str] = []
+        self.dirty = False
+
+
+class MenuIndex:
+    """Frequency-weighted prefix index with a cached top-k per trie node"""
+
+    def __init__(self, top_k: int):
+        self.top_k = top_k
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self) -> None:
+        self._root = _Node()
+        self._counts: Counter = Counter()  # key -> entries
+        self._spellings: dict[str, Counter] = {}  # key -> raw name -> entries
+        self.built_at: Optional[float] = None
+
+    def _rank(self, key: str) -> tuple:
+        return (-self._counts[key], self.display(key))
+
+    def display(self, key: str) -> str:
+        return self._spellings[key].most_common(1)[0][0]
+
+    def _paths(self, key: str) -> Iterable[_Node]:
+        """Every node on the way to each match start of ``key``"""
+        for start in _match_starts(key):
+            node = self._root
+            yield node
+            for ch in start:
+                node = node.children.setdefault(ch, _Node())
+                yield node
+            node.terminals.add(key)
+
+    def _update(self, name: str, delta: int) -> None:
+        raw = collapse_whitespace(name)
+        key = normalize_text(raw)
+        if not key:
+            return
+        spellings = self._spellings.setdefault(key, Counter())
+        spellings[raw] += delta
+        if spellings[raw] <= 0:
+            del spellings[raw]
+        self._counts[key] += delta
+
+        if self._counts[key] <= 0:
+            del self._counts[key]
+            del self._spellings[key]
+            for node in self._paths(key):
+                node.terminals.discard(key)
+                if key in node.top:
+                    node.dirty = True
+            return
+
+        for node in self._paths(key):
+            if node.dirty:
+                continue
+            if key in node.top:
+                if delta < 0:
+                    node.dirty = True  # a name outside the list may now rank higher
+                else:
+                    node.top.sort(key=self._rank)
+            elif delta > 0 and (
+                len(node.top) < self.top_k
+                or self._rank(key) < self._rank(node.top[-1])
+            ):
+                node.top.append(key)
+                node.top.sort(key=self._rank)
+                del node.top[self.top_k :]
+
+    def _refresh_top(self, node: _Node) -> None:
+        keys = set()
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            keys |= current.terminals
+            stack.extend(current.children.values())
+        node.top = heapq.nsmallest(self.top_k, keys, key=self._rank)
+        node.dirty = False
+
+    def apply(self, deltas: dict[str, int]) -> None:
+        """Apply entry-count changes per raw menu name"""
+        with self._lock:
+            for name, delta in deltas.items():
+                if delta:
+                    self._update(name, delta)
+
+    def rebuild(self, counts: Iterable[tuple[str, int]]) -> None:
+        """Replace the index with (menu_name, entries) rows"""
+        with self._lock:
+            self._clear()
+            for name, count in counts:
+                self._update(name, count)
+            self.built_at = time.monotonic()
+
+    def suggest(self, prefix: str, limit: int) -> list[dict]:
+        key = normalize_text(prefix)
+        with self._lock:
+            node = self._root
+            for ch in key:
+                node = node.children.get(ch)
+                if node is None:
+                    return []
+            if node.dirty:
+                self._refresh_top(node)
+            return [
+                {"menu_name": self.display(k), "count": self._counts[k]}
+                for k in node.top[:limit]
+            ]
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+
+menu_index = MenuIndex(top_k=settings.MENU_SUGGEST_TOP_K)
+
+
+def rebuild_menu_index(db: Session) -> int:
+    """Load the index from one GROUP BY over food_diary_entries"""
+    with use_primary(db):
+        rows = db.execute(
+            select(FoodDiaryEntry.menu_name, func.count()).group_by(
+                FoodDiaryEntry.menu_name
+            )
+        ).all()
+    menu_index.rebuild(rows)
+    return len(menu_index)
+
+
+def suggest_menu_names(db: Session, prefix: str, limit: int) -> list[dict]:
+    """Suggestions for ``prefix``, rebuilding the index first if it is stale"""
+    built_at = menu_index.built_at
+    if built_at is None or (
+        time.monotonic() - built_at > settings.MENU_INDEX_REFRESH_SECONDS
+    ):
+        rebuild_menu_index(db)
+    return menu_index.suggest(prefix, limit)
+
+
+def _apply_deltas(deltas: Counter) -> None:
+    if menu_index.built_at is not None:
+        menu_index.apply(deltas)
+
+
+_menu_deltas = CommitHook(_apply_deltas, factory=Counter)
+
+
+def _record(target, name: Optional[str], delta: int) -> None:
+    session = object_session(target)
+    if session is not None and name:
+        _menu_deltas.record(session, {name: delta})
+
+
+@event.listens_for(FoodDiaryEntry, "after_insert")
+def _entry_added(mapper, connection, target):
+    _record(target, target.menu_name, 1)
+
+
+@event.listens_for(FoodDiaryEntry, "after_update")
+def _entry_renamed(mapper, connection, target):
+    history = inspect(target).attrs.menu_name.history
+    if history.has_changes():
+        for name in history.deleted:
+            _record(target, name, -1)
+        for name in history.added:
+            _record(target, name, 1)
+
+
+@event.listens_for(FoodDiaryEntry, "after_delete")
+def _entry_removed(mapper, connection, target):
+    _record(target, target.menu_name, -1)
@@ -0,0 +1,243 @@
+"""Reconciliation of stored photo files against the database.
+
+Reference counting (app.services.photo_store) covers deletes that go
+through the ORM. It misses:
+
+- direct uploads that were never finalized;
+- photos removed by database-level cascades (visit or respondent
+  deletes), which leave ``photo_blobs.ref_count`` too high;
+- temp files left in the staging directory by crashed workers.
+
+``collect_garbage`` finds these in one pass. The photo objects in storage
+(grouped by content hash), the per-hash photo counts from
+``food_diary_photos`` and the ``photo_blobs`` rows are each streamed in
+hash order and merge-joined, so the cost is three sorted scans rather than
+a query per file. Then:
+
+- drifted reference counts are recomputed from ``food_diary_photos``, after
+  which ``purge_unreferenced_blobs`` handles them as usual;
+- files that no row knows about are moved under ``quarantine/`` (no longer
+  served), and deleted once they have sat there for
+  ``PHOTO_GC_QUARANTINE_HOURS``.
+
+Files younger than the grace period are never touched, so uploads in
+flight are safe. Run it from cron with
+``scripts/photo_storage_maintenance.py gc``.
+"""
+
+import heapq
+import os
+import shutil
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+from typing import Iterable, Iterator
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from app.models import FoodDiaryPhoto, PhotoBlob
+from app.services.photo_store import (
+    PHOTO_KEY_PREFIX,
+    content_hash,
+    purge_unreferenced_blobs,
+)
+from app.storage import get_storage, key_for
+
+QUARANTINE_PREFIX = "quarantine/"
+# Uploads from before content addressing live here, outside PHOTO_KEY_PREFIX
+LEGACY_PREFIX = "food_diary/"
+
+
+@dataclass
+class GarbageReport:
+    repaired: list[str] = field(default_factory=list)  # hashes
+    quarantined: list[str] = field(default_factory=list)  # keys
+    deleted: list[str] = field(default_factory=list)  # quarantined keys
+    staged: int = 0  # stale staging files removed
+    purged: list[str] = field(default_factory=list)  # hashes
+
+
+def _tagged(stream: Iterable[tuple], index: int) -> Iterator[tuple]:
+    for key, value in stream:
+        yield key, index, value
+
+
+def merge_join(*streams: Iterable[tuple]) -> Iterator[tuple[str, list]]:
+    """Join (key, value) streams sorted by key; yield (key, [value or None])"""
+    tagged = [_tagged(stream, index) for index, stream in enumerate(streams)]
+    merged = heapq.merge(*tagged, key=itemgetter(0, 1))
+    for key, items in groupby(merged, key=itemgetter(0)):
+        values = [None] * len(streams)
+        for _, index, value in items:
+            values[index] = value
+        yield key, values
+
+
+def _stored_by_hash(objects: Iterable[tuple[str, float]]):
+    """(sha256, [(key, mtime)]) for content-addressed keys, in hash order
+
+    Listings are in key order, which within a shard (``ab/cd/``) puts the
+    originals before ``variants/``. Sorting one shard at a time restores
+    hash order while holding only that shard in memory.
+    """
+    start = len(PHOTO_KEY_PREFIX)
+    for _, shard in groupby(objects, key=lambda item: item[0][start : start + 5]):
+        by_hash = sorted(
+            (sha256, item)
+            for item in shard
+            if (sha256 := content_hash(item[0])) is not None
+        )
+        for sha256, items in groupby(by_hash, key=itemgetter(0)):
+            yield sha256, [item for _, item in items]
+
+
+def _photo_counts(db: Session):
+    # Hex digests sort the same under any collation, so SQL order is hash order
+    return db.execute(
+        select(FoodDiaryPhoto.content_sha256, func.count())
+        .where(FoodDiaryPhoto.content_sha256.isnot(None))
+        .group_by(FoodDiaryPhoto.content_sha256)
+        .order_by(FoodDiaryPhoto.content_sha256)
+    )
+
+
+def _ref_counts(db: Session):
+    return db.execute(
+        select(PhotoBlob.sha256, PhotoBlob.ref_count).order_by(PhotoBlob.sha256)
+    )
+
+
+def _legacy_keys(db: Session) -> set[str]:
+    """Keys of photos stored before content addressing, and their variants"""
+    keys = set()
+    rows = db.execute(
+        select(FoodDiaryPhoto.file_path, FoodDiaryPhoto.variants).where(
+            FoodDiaryPhoto.content_sha256.is_(None)
+        )
+    )
+    for file_path, variants in rows:
+        keys.add(key_for(file_path))
+        keys.update(key_for(url) for url in (variants or {}).values())
+    return keys
+
+
+def _repair_ref_count(db: Session, sha256: str) -> None:
+    photos = (
+        select(func.count())
+        .select_from(FoodDiaryPhoto)
+        .where(FoodDiaryPhoto.content_sha256 == sha256)
+        .scalar_subquery()
+    )
+    db.execute(
+        update(PhotoBlob)
+        .where(PhotoBlob.sha256 == sha256)
+        .values(ref_count=photos, updated_at=func.now())
+    )
+    db.commit()
+
+
+def _still_orphaned(db: Session, sha256: str) -> bool:
+    blob = db.execute(
+        select(PhotoBlob.sha256).where(PhotoBlob.sha256 == sha256).with_for_update()
+    ).first()
+    photo = db.execute(
+        select(FoodDiaryPhoto.id)
+        .where(FoodDiaryPhoto.content_sha256 == sha256)
+        .limit(1)
+    ).first()
+    return blob is None and photo is None
+
+
+def _clear_staging(staging_dir: str, cutoff: float, dry_run: bool) -> int:
+    removed = 0
+    try:
+        entries = list(os.scandir(staging_dir))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        if entry.stat(follow_symlinks=False).st_mtime >= cutoff:
+            continue
+        removed += 1
+        if dry_run:
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            shutil.rmtree(entry.path, ignore_errors=True)
+        else:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+def collect_garbage(
+    db: Session,
+    grace: timedelta,
+    quarantine_for: timedelta,
+    dry_run: bool = False,
+) -> GarbageReport:
+    """Reconcile photo storage with the database; see the module docstring"""
+    storage = get_storage()
+    report = GarbageReport()
+    now = time.time()
+    cutoff = now - grace.total_seconds()
+
+    legacy_keys = _legacy_keys(db)
+    legacy_orphans = []
+
+    def photo_objects():
+        # One listing feeds both the hash merge and the legacy check
+        for key, mtime in storage.list_objects(LEGACY_PREFIX):
+            if key.startswith(PHOTO_KEY_PREFIX):
+                yield key, mtime
+            elif key not in legacy_keys and mtime < cutoff:
+                legacy_orphans.append(key)
+
+    orphans = []
+    joined = merge_join(
+        _stored_by_hash(photo_objects()), _photo_counts(db), _ref_counts(db)
+    )
+    for sha256, (stored, photos, ref_count) in joined:
+        photos = photos or 0
+        if ref_count is not None and ref_count != photos:
+            report.repaired.append(sha256)
+        elif stored and ref_count is None and photos == 0:
+            if all(mtime < cutoff for _, mtime in stored):
+                orphans.append((sha256, [key for key, _ in stored]))
+    db.rollback()  # end the read transaction before changing anything
+
+    if not dry_run:
+        for sha256 in report.repaired:
+            _repair_ref_count(db, sha256)
+
+    for sha256, keys in orphans:
+        if dry_run:
+            report.quarantined.extend(keys)
+            continue
+        if not _still_orphaned(db, sha256):
+            db.rollback()
+            continue
+        for key in keys:
+            storage.move(key, QUARANTINE_PREFIX + key)
+        db.rollback()
+        report.quarantined.extend(keys)
+
+    for key in legacy_orphans:
+        if not dry_run:
+            storage.move(key, QUARANTINE_PREFIX + key)
+        report.quarantined.append(key)
+
+    expired = now - quarantine_for.total_seconds()
+    for key, mtime in list(storage.list_objects(QUARANTINE_PREFIX)):
+        if mtime < expired:
+            if not dry_run:
+                storage.delete(key)
+            report.deleted.append(key)
+
+    report.staged = _clear_staging(storage.staging_dir, cutoff, dry_run)
+    if not dry_run:
+        report.purged = purge_unreferenced_blobs(db, grace)
+    return report
@@ -0,0 +1,211 @@
+"""Content-addressed, reference-counted storage for food diary photos.
+
+Photo files are stored once per SHA-256 under the storage key
+``food_diary/objects/ab/cd/<sha256>.<ext>`` (see app.storage). The
+``photo_blobs`` table records each file and how many ``FoodDiaryPhoto`` rows
+use it. A resubmitted photo therefore costs a metadata row, not another copy.
+
+Reference counts are maintained by mapper events on the flush connection,
+in the same transaction as the photo rows. Uploads first commit
+``reserve_blobs``, which creates or freshens the blob rows without changing
+their counts, then store or verify the files, and only then insert the photo
+rows and commit. The blob row lock is thus held for one short transaction,
+never across storage I/O. Deleting photos only decrements the count. Blobs
+left at zero for longer than the grace period are removed by
+``purge_unreferenced_blobs``, which re-checks the count and age under a row
+lock before touching the file.
+"""
+
+import posixpath
+import re
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import event, func, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.models import FoodDiaryPhoto, PhotoBlob
+from app.services.image_pipeline import VARIANT_DIR
+from app.storage import get_storage, url_for
+
+PHOTO_KEY_PREFIX = "food_diary/objects/"
+
+# <sha256>.<ext> or <sha256>_<variant>.<ext>
+_CONTENT_FILENAME = re.compile(r"^([0-9a-f]{64})(?:_[a-z]+)?\.[a-z]+$")
+
+
+def photo_key(content_name: str) -> str:
+    return PHOTO_KEY_PREFIX + content_name
+
+
+def photo_url(content_name: str) -> str:
+    return url_for(photo_key(content_name))
+
+
+def content_hash(key: str) -> Optional[str]:
+    """SHA-256 a content-addressed photo key is named after, else None"""
+    if not key.startswith(PHOTO_KEY_PREFIX):
+        return None
+    match = _CONTENT_FILENAME.match(posixpath.basename(key))
+    return match.group(1) if match else None
+
+
+def is_referenced(db: Session, key: str) -> bool:
+    """Whether ``key`` is a photo (or one of its variants) still in use"""
+    sha256 = content_hash(key)
+    if sha256 is not None:
+        ref_count = db.execute(
+            select(PhotoBlob.ref_count).where(PhotoBlob.sha256 == sha256)
+        ).scalar()
+        return bool(ref_count)
+
+    # Uploads from before content addressing are matched by their path
+    directory, filename = posixpath.split(key)
+    if posixpath.basename(directory) == VARIANT_DIR:
+        stem = filename.rsplit("_", 1)[0]
+        original = url_for(posixpath.join(posixpath.dirname(directory), stem))
+        condition = FoodDiaryPhoto.file_path.like(original + ".%")
+    else:
+        condition = FoodDiaryPhoto.file_path == url_for(key)
+    photo = db.execute(select(FoodDiaryPhoto.id).where(condition).limit(1))
+    return photo.first() is not None
+
+
+def _blob_values(photo: FoodDiaryPhoto) -> dict:
+    return {
+        "sha256": photo.content_sha256,
+        "file_path": photo.file_path,
+        "size_bytes": photo.file_size_bytes,
+        "mime_type": photo.mime_type,
+    }
+
+
+def _upsert_blob(dialect: str, values: dict, ref_delta: int):
+    """Insert a blob with ``ref_delta`` references, or add them to its count"""
+    table = PhotoBlob.__table__
+    values = {**values, "ref_count": ref_delta}
+    increment = {
+        "ref_count": table.c.ref_count + ref_delta,
+        "updated_at": func.now(),
+    }
+
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+        return (
+            mysql_insert(table).values(**values).on_duplicate_key_update(**increment)
+        )
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+    return (
+        dialect_insert(table)
+        .values(**values)
+        .on_conflict_do_update(index_elements=["sha256"], set_=increment)
+    )
+
+
+def _increment(connection: Connection, photo: FoodDiaryPhoto) -> None:
+    connection.execute(_upsert_blob(connection.dialect.name, _blob_values(photo), 1))
+
+
+def reserve_blobs(db: Session, photos: Iterable[FoodDiaryPhoto]) -> None:
+    """Keep the photos' blobs from being purged while their files are stored
+
+    Upserts each blob row with its count unchanged and ``updated_at`` set to
+    now, and commits. For the grace period ``purge_unreferenced_blobs`` then
+    skips the blob and photo_gc no longer treats its file as an orphan. A
+    purge already under way holds the row lock, so this waits for it and the
+    file is stored again afterwards. Reservations whose upload fails are
+    purged like any other unreferenced blob.
+    """
+    blobs = {photo.content_sha256: _blob_values(photo) for photo in photos}
+    dialect = db.get_bind().dialect.name
+    # Sorted, so concurrent uploads take the row locks in the same order
+    for sha256 in sorted(blobs):
+        db.execute(_upsert_blob(dialect, blobs[sha256], 0))
+    db.commit()
+
+
+def _decrement(connection: Connection, sha256: str) -> None:
+    table = PhotoBlob.__table__
+    connection.execute(
+        update(table)
+        .where(table.c.sha256 == sha256, table.c.ref_count > 0)
+        .values(ref_count=table.c.ref_count - 1, updated_at=func.now())
+    )
+
+
+@event.listens_for(FoodDiaryPhoto, "after_insert")
+def _reference_blob(mapper, connection, target):
+    if target.content_sha256:
+        _increment(connection, target)
+
+
+@event.listens_for(FoodDiaryPhoto, "after_delete")
+def _release_blob(mapper, connection, target):
+    if target.content_sha256:
+        _decrement(connection, target.content_sha256)
+
+
+def known_variants(db: Session, sha256: str):
+    """Variants already rendered for another photo with the same content"""
+    return db.execute(
+        select(FoodDiaryPhoto.variants)
+        .where(
+            FoodDiaryPhoto.content_sha256 == sha256,
+            FoodDiaryPhoto.variants.isnot(None),
+        )
+        .limit(1)
+    ).scalar()
+
+
+def blob_keys(sha256: str) -> list[str]:
+    """Storage keys of the stored file and its rendered variants"""
+    shard = photo_key(f"{sha256[:2]}/{sha256[2:4]}/")
+    return [
+        key
+        for key in get_storage().list_keys(shard)
+        if posixpath.basename(key).startswith(sha256)
+    ]
+
+
+def purge_unreferenced_blobs(db: Session, grace: timedelta) -> list[str]:
+    """Delete blobs (rows and files) unreferenced for longer than ``grace``
+
+    Each blob is re-checked under a row lock in its own transaction, so a
+    concurrent upload of the same content (see ``reserve_blobs``) either
+    keeps it or waits.
+    Returns the purged hashes.
+    """
+    cutoff = datetime.now() - grace
+    candidates = db.execute(
+        select(PhotoBlob.sha256).where(
+            PhotoBlob.ref_count == 0, PhotoBlob.updated_at < cutoff
+        )
+    ).scalars().all()
+
+    purged = []
+    for sha256 in candidates:
+        blob = db.execute(
+            select(PhotoBlob)
+            .where(
+                PhotoBlob.sha256 == sha256,
+                PhotoBlob.ref_count == 0,
+                PhotoBlob.updated_at < cutoff,
+            )
+            .with_for_update()
+        ).scalar_one_or_none()
+        if blob is None:
+            db.rollback()
+            continue
+        storage = get_storage()
+        for key in blob_keys(sha256):
+            storage.delete(key)
+        db.delete(blob)
+        db.commit()
+        purged.append(sha256)
+    return purged
@@ -0,0 +1,101 @@
+"""Cached respondent lookups by code for the self-service kiosk flow.
+
+Every kiosk session starts with ``POST /respondents/check-code`` and
+``GET /respondents/{code}``. Both read through ``lookup_respondent``, which
+keeps the serialized respondent per code in a bounded TTL cache. Unknown
+codes are cached too, as ``None`` with a shorter TTL, so a kiosk retrying a
+mistyped code does not reach the database each time.
+
+Writes in this process invalidate the affected codes. Other workers can
+serve a stale entry until it expires, so ``RESPONDENT_CACHE_TTL_SECONDS``
+bounds how long an edit or delete takes to show up everywhere.
+"""
+
+import logging
+from datetime import date
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.cache import TTLCache
+from app.config import get_settings
+from app.database import use_primary
+from app.metrics import Counter
+from app.models import Respondent, Visit
+from app.schemas import RespondentResponse
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+_cache = TTLCache(
+    maxsize=settings.RESPONDENT_CACHE_SIZE,
+    ttl_seconds=settings.RESPONDENT_CACHE_TTL_SECONDS,
+)
+_MISS = object()
+
+lookups = Counter(
+    "respondent_code_lookups_total",
+    "Respondent code lookups by cache result (hit, negative_hit, miss)",
+)
+
+
+def _serialize(respondent: Respondent) -> dict:
+    return RespondentResponse.model_validate(respondent).model_dump()
+
+
+def lookup_respondent(db: Session, respondent_code: str) -> Optional[dict]:
+    """Respondent payload for a code, or None if no live respondent has it"""
+    cached = _cache.get(respondent_code, _MISS)
+    if cached is not _MISS:
+        lookups.inc(result="hit" if cached is not None else "negative_hit")
+        return cached
+
+    lookups.inc(result="miss")
+    with use_primary(db):
+        respondent = (
+            db.query(Respondent)
+            .filter(
+                Respondent.respondent_code == respondent_code,
+                Respondent.is_deleted == False,
+            )
+            .first()
+        )
+    if respondent is None:
+        _cache.set(
+            respondent_code,
+            None,
+            ttl_seconds=settings.RESPONDENT_CACHE_NEGATIVE_TTL_SECONDS,
+        )
+        return None
+
+    payload = _serialize(respondent)
+    _cache.set(respondent_code, payload)
+    return payload
+
+
+def invalidate_respondent_codes(*codes: Optional[str]) -> None:
+    """Drop cached entries (including negative ones) for the given codes"""
+    for code in codes:
+        if code:
+            _cache.invalidate(code)
+
+
+def warm_respondent_cache(db: Session, day: Optional[date] = None) -> int:
+    """Preload respondents with a visit on ``day`` (default today)
+
+    Returns the number of respondents cached.
+    """
+    with use_primary(db):
+        respondents = (
+            db.query(Respondent)
+            .join(Visit, Visit.respondent_id == Respondent.id)
+            .filter(
+                Visit.visit_date == (day or date.today()),
+                Respondent.is_deleted == False,
+            )
+            .distinct()
+            .all()
+        )
+    for respondent in respondents:
+        _cache.set(respondent.respondent_code, _serialize(respondent))
+    return len(respondents)
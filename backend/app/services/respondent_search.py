@@ -0,0 +1,192 @@
+"""Indexed search over respondent code, phone and email.
+
+``LIKE '%term%'`` cannot use an index, so staff search is served by two
+index-backed paths instead:
+
+- prefix matches on ``respondent_code`` (unique index) and the digits-only
+  ``phone_normalized`` column
+- substring matches through ``respondent_search_tokens``, a trigram table
+  that narrows the candidates to a handful of rows before the exact
+  ``contains`` check runs on them
+
+Each path is a separate seek and their ids are combined with ``UNION`` and
+joined back, rather than ``OR``-ed in one ``WHERE`` that no index can serve.
+Generated codes all start with ``CODE_PREFIX``, so it is left out of the
+code trigrams (it would put every respondent behind the token ``res``), and
+a term that starts with it is searched as a code prefix only.
+
+Normalized columns and tokens are kept in sync by mapper events, so every
+ORM write path (API, import scripts) maintains them without extra calls.
+The events are registered when ``app.models`` is imported. Rows written
+with raw SQL are repaired by ``scripts/rebuild_respondent_search_index.py``.
+"""
+
+import re
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, event, func, inspect, insert, select, union
+from sqlalchemy.orm import Query, Session
+
+from app.models import Respondent, RespondentSearchToken
+
+NGRAM_SIZE = 3
+
+# Prefix of generated respondent codes (app.services.code_allocator)
+CODE_PREFIX = "RES"
+
+_CODE_STRIP_RE = re.compile(r"[\s\-_]+")
+_NON_DIGIT_RE = re.compile(r"\D+")
+
+_SEARCHED_FIELDS = ("respondent_code", "phone", "email")
+
+
+def normalize_code(value: Optional[str]) -> str:
+    """Uppercase a respondent code and drop spaces, dashes and underscores"""
+    return _CODE_STRIP_RE.sub("", value or "").upper()
+
+
+def normalize_phone(value: Optional[str]) -> str:
+    """Reduce a phone number to its digits"""
+    return _NON_DIGIT_RE.sub("", value or "")
+
+
+def code_search_key(value: Optional[str]) -> str:
+    """Lowercased normalized code without the generated-code prefix"""
+    code = normalize_code(value)
+    if code.startswith(CODE_PREFIX):
+        code = code[len(CODE_PREFIX) :]
+    return code.lower()
+
+
+def ngrams(value: str, size: int = NGRAM_SIZE) -> set[str]:
+    """Overlapping character n-grams of ``value`` (empty if it is too short)"""
+    return {value[i : i + size] for i in range(len(value) - size + 1)}
+
+
+def respondent_tokens(
+    respondent_code: Optional[str], phone: Optional[str], email: Optional[str]
+) -> set[str]:
+    """All search tokens for one respondent"""
+    tokens = ngrams(code_search_key(respondent_code))
+    tokens |= ngrams(normalize_phone(phone))
+    tokens |= ngrams((email or "").strip().lower())
+    return tokens
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _token_match_ids(grams: Iterable[str]):
+    """Respondent ids that carry every one of ``grams``"""
+    grams = sorted(set(grams))
+    return (
+        select(RespondentSearchToken.respondent_id)
+        .where(RespondentSearchToken.token.in_(grams))
+        .group_by(RespondentSearchToken.respondent_id)
+        .having(func.count(func.distinct(RespondentSearchToken.token)) == len(grams))
+    )
+
+
+def _prefix_ids(column, prefix: str):
+    return select(Respondent.id).where(
+        column.like(_escape_like(prefix) + "%", escape="\\")
+    )
+
+
+def _substring_ids(column, value: str, grams: Iterable[str]):
+    """Ids whose ``column`` contains ``value``, narrowed by the trigram table
+
+    The exact ``contains`` check discards rows whose trigrams matched out of
+    order, and only runs on the narrowed candidates.
+    """
+    candidates = _token_match_ids(grams).subquery()
+    return (
+        select(Respondent.id)
+        .join(candidates, Respondent.id == candidates.c.respondent_id)
+        .where(column.contains(value, autoescape=True))
+    )
+
+
+def apply_respondent_search(query: Query, term: str) -> Query:
+    """Filter a Respondent query by ``term`` using only index-backed lookups"""
+    term = term.strip()
+    code = normalize_code(term)
+    digits = normalize_phone(term)
+    text = term.lower()
+
+    seeks = []
+    # A bare (part of the) prefix would match every generated code
+    if code and not CODE_PREFIX.startswith(code):
+        seeks.append(_prefix_ids(Respondent.respondent_code, code))
+
+    if not code.startswith(CODE_PREFIX):
+        # Terms typed without the start of the prefix, e.g. "ES12"
+        for i in range(1, len(CODE_PREFIX)):
+            if code.startswith(CODE_PREFIX[i:]):
+                seeks.append(
+                    _prefix_ids(Respondent.respondent_code, CODE_PREFIX[:i] + code)
+                )
+        if digits:
+            seeks.append(_prefix_ids(Respondent.phone_normalized, digits))
+        # Code and email are tokenized differently, so each gets its own set
+        if len(code) >= NGRAM_SIZE:
+            seeks.append(
+                _substring_ids(Respondent.respondent_code, code, ngrams(code.lower()))
+            )
+        if len(text) >= NGRAM_SIZE:
+            seeks.append(_substring_ids(Respondent.email, text, ngrams(text)))
+        if len(digits) >= NGRAM_SIZE:
+            seeks.append(
+                _substring_ids(Respondent.phone_normalized, digits, ngrams(digits))
+            )
+
+    if not seeks:
+        return query.filter(False)
+    matches = (seeks[0] if len(seeks) == 1 else union(*seeks)).subquery()
+    return query.join(matches, Respondent.id == matches.c.id)
+
+
+def rebuild_tokens(db: Session, respondent: Respondent) -> None:
+    """Recompute the normalized phone and trigram rows for one respondent"""
+    respondent.phone_normalized = normalize_phone(respondent.phone) or None
+    db.flush()
+    _write_tokens(db.connection(), respondent)
+
+
+def _write_tokens(connection, respondent: Respondent) -> None:
+    connection.execute(
+        delete(RespondentSearchToken).where(
+            RespondentSearchToken.respondent_id == respondent.id
+        )
+    )
+    tokens = respondent_tokens(
+        respondent.respondent_code, respondent.phone, respondent.email
+    )
+    if tokens:
+        connection.execute(
+            insert(RespondentSearchToken),
+            [{"token": t, "respondent_id": respondent.id} for t in sorted(tokens)],
+        )
+
+
+def _searched_fields_changed(respondent: Respondent) -> bool:
+    state = inspect(respondent)
+    return any(state.attrs[f].history.has_changes() for f in _SEARCHED_FIELDS)
+
+
+@event.listens_for(Respondent, "before_insert")
+@event.listens_for(Respondent, "before_update")
+def _normalize_search_columns(mapper, connection, target: Respondent) -> None:
+    target.phone_normalized = normalize_phone(target.phone) or None
+
+
+@event.listens_for(Respondent, "after_insert")
+def _index_new_respondent(mapper, connection, target: Respondent) -> None:
+    _write_tokens(connection, target)
+
+
+@event.listens_for(Respondent, "after_update")
+def _reindex_respondent(mapper, connection, target: Respondent) -> None:
+    if _searched_fields_changed(target):
+        _write_tokens(connection, target)
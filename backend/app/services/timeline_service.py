@@ -0,0 +1,174 @@
+"""Longitudinal SANSA/MNA/BIA trajectory for one respondent.
+
+The timeline is built from a single joined query over the respondent's
+visits. It takes the SANSA and MNA totals and the BMI and body fat of the
+latest BIA record per visit. Deltas and least-squares slopes for all metrics
+are then computed together in one numpy pass over a visits x metrics matrix.
+
+Results are cached per respondent. Inserts, updates and deletes of visits,
+instruments or the respondent record the respondent on a
+``app.cache.CommitHook``, and the entry is dropped once that transaction
+commits.
+"""
+
+from datetime import date
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session, object_session
+
+from app.cache import CommitHook, TTLCache
+from app.config import get_settings
+from app.database import use_primary
+from app.models import BIARecord, MNAResponse, Respondent, SANSAResponse, Visit
+
+settings = get_settings()
+
+METRICS = ("sansa_total", "mna_total", "bmi", "body_fat_percentage")
+
+_cache = TTLCache(
+    maxsize=settings.TIMELINE_CACHE_SIZE,
+    ttl_seconds=settings.TIMELINE_CACHE_TTL_SECONDS,
+)
+
+
+def _timeline_rows(db: Session, respondent_id: int):
+    latest_bia = (
+        select(BIARecord.visit_id, func.max(BIARecord.id).label("bia_id"))
+        .join(Visit, Visit.id == BIARecord.visit_id)
+        .where(Visit.respondent_id == respondent_id)
+        .group_by(BIARecord.visit_id)
+        .subquery()
+    )
+    return db.execute(
+        select(
+            Visit.id,
+            Visit.visit_number,
+            Visit.visit_date,
+            SANSAResponse.result_level,
+            MNAResponse.result_category,
+            SANSAResponse.total_score,
+            MNAResponse.mna_total,
+            BIARecord.bmi,
+            BIARecord.body_fat_percentage,
+        )
+        .outerjoin(SANSAResponse, SANSAResponse.visit_id == Visit.id)
+        .outerjoin(MNAResponse, MNAResponse.visit_id == Visit.id)
+        .outerjoin(latest_bia, latest_bia.c.visit_id == Visit.id)
+        .outerjoin(BIARecord, BIARecord.id == latest_bia.c.bia_id)
+        .where(Visit.respondent_id == respondent_id, Visit.is_deleted == False)
+        .order_by(Visit.visit_date, Visit.visit_number)
+    ).all()
+
+
+def _to_float(value) -> float:
+    return np.nan if value is None else float(value)
+
+
+def _as_dict(values: np.ndarray) -> dict[str, Optional[float]]:
+    return {
+        metric: None if np.isnan(value) else round(float(value), 4)
+        for metric, value in zip(METRICS, values)
+    }
+
+
+def compute_trajectory(visit_dates: list[date], values: np.ndarray):
+    """Deltas and slopes for a visits x metrics matrix (NaN = not recorded)
+
+    A delta compares a visit with the most recent earlier visit where the
+    same metric was recorded. Slopes are least-squares fits per metric
+    against days since the first visit; they need two distinct dates.
+    """
+    observed = ~np.isnan(values)
+    n_visits, n_metrics = values.shape
+
+    # Index of the last visit at or before each row that recorded the metric
+    last_seen = np.where(observed, np.arange(n_visits)[:, None], -1)
+    np.maximum.accumulate(last_seen, axis=0, out=last_seen)
+    carried = values[np.maximum(last_seen, 0), np.arange(n_metrics)]
+    carried[last_seen < 0] = np.nan
+    previous = np.vstack([np.full((1, n_metrics), np.nan), carried[:-1]])
+    deltas = values - previous
+
+    days = np.array(
+        [(d - visit_dates[0]).days for d in visit_dates], dtype=float
+    )[:, None]
+    counts = observed.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x_mean = np.where(observed, days, 0).sum(axis=0) / counts
+        y_mean = np.where(observed, values, 0).sum(axis=0) / counts
+        dx = np.where(observed, days - x_mean, 0)
+        dy = np.where(observed, values - y_mean, 0)
+        variance = (dx * dx).sum(axis=0)
+        slopes = np.where(variance > 0, (dx * dy).sum(axis=0) / variance, np.nan)
+
+    return deltas, slopes
+
+
+def build_timeline(db: Session, respondent_id: int) -> dict:
+    rows = _timeline_rows(db, respondent_id)
+    visits = []
+    slopes = {metric: None for metric in METRICS}
+
+    if rows:
+        values = np.array([[_to_float(v) for v in row[5:]] for row in rows])
+        deltas, slope_values = compute_trajectory(
+            [row.visit_date for row in rows], values
+        )
+        slopes = _as_dict(slope_values)
+        for i, row in enumerate(rows):
+            visits.append(
+                {
+                    "visit_id": row.id,
+                    "visit_number": row.visit_number,
+                    "visit_date": row.visit_date,
+                    "sansa_level": row.result_level,
+                    "mna_category": row.result_category,
+                    "values": _as_dict(values[i]),
+                    "deltas": _as_dict(deltas[i]),
+                }
+            )
+
+    return {
+        "respondent_id": respondent_id,
+        "visits": visits,
+        "slopes_per_day": slopes,
+    }
+
+
+def get_timeline(db: Session, respondent_id: int) -> dict:
+    timeline = _cache.get(respondent_id)
+    if timeline is None:
+        with use_primary(db):
+            timeline = build_timeline(db, respondent_id)
+        _cache.set(respondent_id, timeline)
+    return timeline
+
+
+def invalidate_timeline(respondent_id: int) -> None:
+    _cache.invalidate(respondent_id)
+
+
+def _invalidate_committed(respondent_ids: set) -> None:
+    for respondent_id in respondent_ids:
+        invalidate_timeline(respondent_id)
+
+
+_timeline_invalidations = CommitHook(_invalidate_committed)
+_timeline_invalidations.watch(Visit, lambda visit: [visit.respondent_id])
+_timeline_invalidations.watch(Respondent)
+
+
+def _mark_instrument_change(mapper, connection, target):
+    respondent_id = connection.execute(
+        select(Visit.respondent_id).where(Visit.id == target.visit_id)
+    ).scalar()
+    session = object_session(target)
+    if session is not None and respondent_id is not None:
+        _timeline_invalidations.record(session, [respondent_id])
+
+
+for _model in (SANSAResponse, MNAResponse, BIARecord):
+    for _event in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event, _mark_instrument_change)
@@ -0,0 +1,318 @@
+"""Pluggable object storage for uploaded files.
+
+Files are addressed by a storage key such as
+``food_diary/objects/ab/cd/<sha256>.jpg`` and are always referenced in the
+API as ``/uploads/<key>``. Two backends are available, chosen with
+``STORAGE_BACKEND``:
+
+- ``local``: files live under ``UPLOAD_DIR``. Presigned uploads are
+  short-lived signed URLs to ``PUT /storage/direct/{token}``, which streams
+  the body to disk.
+- ``s3``: any S3-compatible service (AWS, MinIO, Ceph...). Presigned PUTs
+  go straight to the bucket, signed with the expected length and SHA-256
+  checksum, so the bytes never pass through the API workers. Requires the
+  ``boto3`` package.
+
+Both backends stage incoming bytes in ``staging_dir`` first, which is on the
+same filesystem as local storage so placing a file is an atomic rename.
+"""
+
+import base64
+import os
+import tempfile
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Iterator, Optional
+
+from jose import JWTError, jwt
+
+from app.config import get_settings
+
+settings = get_settings()
+
+UPLOADS_URL_PREFIX = "/uploads/"
+DIRECT_UPLOAD_AUDIENCE = "direct-upload"
+
+
+class StorageError(Exception):
+    """Raised when the storage backend cannot complete an operation"""
+
+
+def sign_token(claims: dict, audience: str, expires: datetime) -> str:
+    """Short-lived signed token for an upload step"""
+    return jwt.encode(
+        {**claims, "aud": audience, "exp": expires},
+        settings.JWT_SECRET_KEY,
+        algorithm=settings.JWT_ALGORITHM,
+    )
+
+
+def verify_token(token: str, audience: str) -> Optional[dict]:
+    """Claims of a token from ``sign_token``, or None if invalid or expired"""
+    try:
+        return jwt.decode(
+            token,
+            settings.JWT_SECRET_KEY,
+            algorithms=[settings.JWT_ALGORITHM],
+            audience=audience,
+        )
+    except JWTError:
+        return None
+
+
+def presign_expiry() -> datetime:
+    return datetime.utcnow() + timedelta(
+        seconds=settings.STORAGE_PRESIGN_EXPIRE_SECONDS
+    )
+
+
+def url_for(key: str) -> str:
+    """API path under which a stored file is referenced"""
+    return UPLOADS_URL_PREFIX + key
+
+
+def key_for(url_path: str) -> str:
+    """Storage key of an ``/uploads/...`` path"""
+    return url_path.removeprefix(UPLOADS_URL_PREFIX).lstrip("/")
+
+
+class LocalStorage:
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+        self.staging_dir = os.path.join(root, ".incoming")
+
+    def path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise StorageError(f"Invalid storage key {key!r}")
+        return path
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def size(self, key: str) -> Optional[int]:
+        try:
+            return os.path.getsize(self.path(key))
+        except FileNotFoundError:
+            return None
+
+    def read_head(self, key: str, length: int) -> bytes:
+        with open(self.path(key), "rb") as f:
+            return f.read(length)
+
+    def store_file(
+        self, local_path: str, key: str, content_type: str, replace: bool = False
+    ) -> bool:
+        """Move a staged file to ``key``; False if the key already existed
+
+        The staged file is consumed either way.
+        """
+        path = self.path(key)
+        if not replace and os.path.exists(path):
+            os.remove(local_path)
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(local_path, path)
+        return True
+
+    def fetch(self, key: str) -> tuple[str, bool]:
+        """Local path holding the file, and whether it is a temp copy"""
+        return self.path(key), False
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def move(self, key: str, new_key: str) -> None:
+        """Rename ``key``; its modification time becomes the time of the move"""
+        path, new_path = self.path(key), self.path(new_key)
+        os.makedirs(os.path.dirname(new_path), exist_ok=True)
+        os.replace(path, new_path)
+        os.utime(new_path)
+
+    def list_objects(self, prefix: str = "") -> Iterator[tuple[str, float]]:
+        """(key, mtime) under ``prefix`` in lexicographic order, like S3"""
+        base = self.path(prefix) if prefix else self.root
+
+        def walk(directory: str) -> Iterator[tuple[str, float]]:
+            try:
+                entries = sorted(os.scandir(directory), key=lambda e: e.name)
+            except FileNotFoundError:
+                return
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue  # staging and temp files
+                if entry.is_dir(follow_symlinks=False):
+                    yield from walk(entry.path)
+                else:
+                    key = os.path.relpath(entry.path, self.root)
+                    yield key.replace(os.sep, "/"), entry.stat().st_mtime
+
+        yield from walk(base)
+
+    def list_keys(self, prefix: str = "") -> Iterator[str]:
+        return (key for key, _ in self.list_objects(prefix))
+
+    def presign_put(
+        self, key: str, content_type: str, size_bytes: int, sha256: str
+    ) -> dict:
+        expires = presign_expiry()
+        token = sign_token(
+            {
+                "key": key,
+                "content_type": content_type,
+                "size": size_bytes,
+                "sha256": sha256,
+            },
+            DIRECT_UPLOAD_AUDIENCE,
+            expires,
+        )
+        return {
+            "method": "PUT",
+            "url": f"/storage/direct/{token}",
+            "headers": {"Content-Type": content_type},
+            "expires_at": expires,
+        }
+
+
+class S3Storage:
+    name = "s3"
+
+    def __init__(self):
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError:
+            raise RuntimeError(
+                "STORAGE_BACKEND=s3 requires the boto3 package to be installed"
+            )
+        self.bucket = settings.S3_BUCKET
+        self.prefix = settings.S3_KEY_PREFIX
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.S3_ENDPOINT_URL or None,
+            region_name=settings.S3_REGION or None,
+            aws_access_key_id=settings.S3_ACCESS_KEY_ID or None,
+            aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY or None,
+            config=Config(
+                signature_version="s3v4",
+                s3={"addressing_style": "path" if settings.S3_ENDPOINT_URL else "auto"},
+            ),
+        )
+        self.staging_dir = os.path.join(settings.UPLOAD_DIR, ".incoming")
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+    def _head(self, key: str) -> Optional[dict]:
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise StorageError(str(e))
+
+    def exists(self, key: str) -> bool:
+        return self._head(key) is not None
+
+    def size(self, key: str) -> Optional[int]:
+        head = self._head(key)
+        return head["ContentLength"] if head else None
+
+    def read_head(self, key: str, length: int) -> bytes:
+        response = self.client.get_object(
+            Bucket=self.bucket, Key=self._key(key), Range=f"bytes=0-{length - 1}"
+        )
+        return response["Body"].read()
+
+    def store_file(
+        self, local_path: str, key: str, content_type: str, replace: bool = False
+    ) -> bool:
+        try:
+            if not replace and self.exists(key):
+                return False
+            self.client.upload_file(
+                local_path,
+                self.bucket,
+                self._key(key),
+                ExtraArgs={"ContentType": content_type},
+            )
+            return True
+        finally:
+            os.remove(local_path)
+
+    def fetch(self, key: str) -> tuple[str, bool]:
+        fd, path = tempfile.mkstemp(dir=self.staging_dir, suffix=".fetch")
+        os.close(fd)
+        self.client.download_file(self.bucket, self._key(key), path)
+        return path, True
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def move(self, key: str, new_key: str) -> None:
+        self.client.copy_object(
+            Bucket=self.bucket,
+            Key=self._key(new_key),
+            CopySource={"Bucket": self.bucket, "Key": self._key(key)},
+        )
+        self.delete(key)
+
+    def list_objects(self, prefix: str = "") -> Iterator[tuple[str, float]]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix)):
+            for item in page.get("Contents", []):
+                key = item["Key"][len(self.prefix) :]
+                yield key, item["LastModified"].timestamp()
+
+    def list_keys(self, prefix: str = "") -> Iterator[str]:
+        return (key for key, _ in self.list_objects(prefix))
+
+    def presign_put(
+        self, key: str, content_type: str, size_bytes: int, sha256: str
+    ) -> dict:
+        checksum = base64.b64encode(bytes.fromhex(sha256)).decode("ascii")
+        url = self.client.generate_presigned_url(
+            "put_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": self._key(key),
+                "ContentType": content_type,
+                "ContentLength": size_bytes,
+                "ChecksumSHA256": checksum,
+            },
+            ExpiresIn=settings.STORAGE_PRESIGN_EXPIRE_SECONDS,
+        )
+        return {
+            "method": "PUT",
+            "url": url,
+            "headers": {
+                "Content-Type": content_type,
+                "x-amz-checksum-sha256": checksum,
+            },
+            "expires_at": presign_expiry(),
+        }
+
+    def presign_get(self, key: str) -> str:
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self._key(key)},
+            ExpiresIn=settings.STORAGE_PRESIGN_EXPIRE_SECONDS,
+        )
+
+
+@lru_cache()
+def get_storage():
+    """The configured storage backend (one per process)"""
+    if settings.STORAGE_BACKEND == "s3":
+        storage = S3Storage()
+    else:
+        storage = LocalStorage(settings.UPLOAD_DIR)
+    os.makedirs(storage.staging_dir, exist_ok=True)
+    return storage
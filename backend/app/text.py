@@ -0,0 +1,33 @@
+"""Unicode and Thai normalization for matching user-typed text.
+
+``normalize_text`` maps a string to a matching key: NFC, zero-width
+characters removed, casefolded, two common Thai typing variants folded
+(``เเ`` typed for ``แ``, and nikhahit + sara aa typed for sara am) and
+whitespace collapsed. Menu autocomplete and knowledge search both match on
+these keys.
+"""
+
+import re
+import unicodedata
+from typing import Optional
+
+_ZERO_WIDTH_RE = re.compile("[\u200b\u200c\u200d\u2060\ufeff]")
+_SPACE_RE = re.compile(r"\s+")
+# เ + เ typed for แ; nikhahit (+ tone mark) + sara aa typed for sara am
+_THAI_FOLDS = (
+    (re.compile("\u0e40\u0e40"), "\u0e41"),
+    (re.compile("\u0e4d([\u0e48-\u0e4b]?)\u0e32"), "\\1\u0e33"),
+)
+
+
+def collapse_whitespace(value: str) -> str:
+    return _SPACE_RE.sub(" ", value).strip()
+
+
+def normalize_text(value: Optional[str]) -> str:
+    """Matching key for a name, a typed prefix or a search text"""
+    value = unicodedata.normalize("NFC", value or "")
+    value = _ZERO_WIDTH_RE.sub("", value).casefold()
+    for typed, canonical in _THAI_FOLDS:
+        value = typed.sub(canonical, value)
+    return collapse_whitespace(value)
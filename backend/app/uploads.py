@@ -0,0 +1,164 @@
+"""Streaming, content-addressed intake of uploaded images.
+
+``receive_stream`` copies an upload body to a temp file in fixed-size
+chunks, so memory per upload stays at one chunk whatever the file size.
+Along the way it:
+
+- sniffs the real image type from the first bytes and rejects anything not
+  in ``ALLOWED_IMAGE_TYPES`` (415), ignoring the client's Content-Type;
+- aborts as soon as ``MAX_UPLOAD_SIZE_MB`` is exceeded (413);
+- hashes the bytes with SHA-256.
+
+The temp file is then handed to the storage backend under its content
+address (``ab/cd/<sha256>.<ext>``, see app.storage). If identical bytes are
+already stored, the temp file is simply dropped.
+
+Disk writes run in the threadpool, off the event loop.
+"""
+
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException, UploadFile, status
+from starlette.concurrency import run_in_threadpool
+
+from app.config import get_settings
+
+settings = get_settings()
+
+CHUNK_SIZE = 256 * 1024
+SNIFF_BYTES = 12
+
+# Magic-number prefixes; WebP is RIFF....WEBP and checked separately
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+    "image/gif": ".gif",
+}
+
+
+@dataclass
+class ReceivedUpload:
+    tmp_path: str
+    size_bytes: int
+    sha256: str
+    mime_type: str
+
+    @property
+    def content_name(self) -> str:
+        return content_name(self.sha256, self.mime_type)
+
+
+def content_name(sha256: str, mime_type: str) -> str:
+    """Sharded content address, e.g. ``ab/cd/abcd...ef.jpg``"""
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}{EXTENSIONS[mime_type]}"
+
+
+def allowed_image_types() -> set[str]:
+    return {t.strip() for t in settings.ALLOWED_IMAGE_TYPES.split(",") if t.strip()}
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Image MIME type from the leading bytes, or None if unrecognised"""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, mime_type in _SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    return None
+
+
+def _checked_type(head: bytes, name: str) -> str:
+    mime_type = sniff_image_type(head)
+    if mime_type not in allowed_image_types():
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"{name}: unsupported image type",
+        )
+    return mime_type
+
+
+def _discard(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def _read_chunks(upload: UploadFile) -> AsyncIterator[bytes]:
+    while chunk := await upload.read(CHUNK_SIZE):
+        yield chunk
+
+
+async def receive_upload(upload: UploadFile, directory: str) -> ReceivedUpload:
+    """Stream a multipart ``upload`` into a temp file in ``directory``"""
+    return await receive_stream(_read_chunks(upload), upload.filename, directory)
+
+
+async def receive_stream(
+    chunks: AsyncIterator[bytes],
+    name: str,
+    directory: str,
+    max_bytes: Optional[int] = None,
+) -> ReceivedUpload:
+    """Stream ``chunks`` (e.g. a raw request body) into a temp file"""
+    if max_bytes is None:
+        max_bytes = settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".upload-", suffix=".part")
+    out = os.fdopen(fd, "wb")
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    mime_type = None
+    try:
+        async for chunk in chunks:
+            # Raw bodies may arrive in tiny pieces; sniff once SNIFF_BYTES are in
+            if mime_type is None:
+                head += chunk[:SNIFF_BYTES]
+                if len(head) >= SNIFF_BYTES:
+                    mime_type = _checked_type(head, name)
+            size += len(chunk)
+            if size > max_bytes:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"{name}: larger than {max_bytes} bytes",
+                )
+            digest.update(chunk)
+            await run_in_threadpool(out.write, chunk)
+
+        if size == 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"{name}: empty file",
+            )
+        if mime_type is None:
+            mime_type = _checked_type(head, name)
+
+        await run_in_threadpool(out.flush)
+        await run_in_threadpool(os.fsync, out.fileno())
+        out.close()
+    except BaseException:
+        out.close()
+        _discard(tmp_path)
+        raise
+
+    return ReceivedUpload(tmp_path, size, digest.hexdigest(), mime_type)
+
+
+def discard_uploads(received: list[ReceivedUpload]) -> None:
+    """Delete temp files left by a request that failed"""
+    for item in received:
+        _discard(item.tmp_path)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Audit log partition maintenance and archive queries.
+
+Usage:
+    python scripts/audit_log_maintenance.py rotate [--months-ahead 3]
+    python scripts/audit_log_maintenance.py archive [--retain-months 24] [--dry-run]
+    python scripts/audit_log_maintenance.py query [--since 2024-01-01] [--until ...]
+        [--table respondents] [--record-id 42] [--user-id 1]
+
+Run `rotate` and `archive` monthly (e.g. from cron). `archive` writes each
+expired month to AUDIT_ARCHIVE_DIR as gzip JSONL plus a checksummed manifest,
+verifies it, and only then drops the partition. `query` searches the archive
+files and prints matching records as JSON lines.
+"""
+
+import argparse
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Add backend directory to path
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.config import get_settings
+from app.database import engine
+from app.services.audit_archive import (
+    ArchiveError,
+    archive_and_drop,
+    ensure_future_partitions,
+    expired_partitions,
+    iter_archived_records,
+)
+
+settings = get_settings()
+
+
+def rotate(args):
+    with engine.begin() as conn:
+        added = ensure_future_partitions(conn, args.months_ahead)
+    if added:
+        print(f"✓ Added partitions: {', '.join(added)}")
+    else:
+        print("✓ Future partitions already in place")
+
+
+def archive(args):
+    archive_dir = Path(args.archive_dir)
+    with engine.connect() as conn:
+        partitions = expired_partitions(conn, args.retain_months)
+
+    if not partitions:
+        print("No partitions past the retention window")
+        return
+
+    for partition in partitions:
+        if args.dry_run:
+            print(f"Would archive and drop {partition}")
+            continue
+        with engine.begin() as conn:
+            result = archive_and_drop(conn, partition, archive_dir)
+        print(
+            f"✓ {partition}: {result.rows} rows → {result.path} "
+            f"(sha256 {result.sha256[:12]}…), partition dropped"
+        )
+
+
+def query(args):
+    records = iter_archived_records(
+        Path(args.archive_dir),
+        since=args.since,
+        until=args.until,
+        table_name=args.table,
+        record_id=args.record_id,
+        user_id=args.user_id,
+    )
+    for record in records:
+        print(json.dumps(record, ensure_ascii=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit log maintenance")
+    parser.add_argument(
+        "--archive-dir",
+        default=settings.AUDIT_ARCHIVE_DIR,
+        help="Directory holding archive files (default: AUDIT_ARCHIVE_DIR)",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    rotate_parser = subparsers.add_parser("rotate", help="Create upcoming partitions")
+    rotate_parser.add_argument("--months-ahead", type=int, default=3)
+    rotate_parser.set_defaults(func=rotate)
+
+    archive_parser = subparsers.add_parser(
+        "archive", help="Archive and drop expired partitions"
+    )
+    archive_parser.add_argument(
+        "--retain-months", type=int, default=settings.AUDIT_RETENTION_MONTHS
+    )
+    archive_parser.add_argument("--dry-run", action="store_true")
+    archive_parser.set_defaults(func=archive)
+
+    query_parser = subparsers.add_parser("query", help="Search archived records")
+    query_parser.add_argument("--since", type=datetime.fromisoformat)
+    query_parser.add_argument("--until", type=datetime.fromisoformat)
+    query_parser.add_argument("--table")
+    query_parser.add_argument("--record-id", type=int)
+    query_parser.add_argument("--user-id", type=int)
+    query_parser.set_defaults(func=query)
+
+    args = parser.parse_args()
+    try:
+        args.func(args)
+    except ArchiveError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
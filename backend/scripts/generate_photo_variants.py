@@ -0,0 +1,68 @@
+"""Render thumb/medium variants for food diary photos that have none
+
+Variants are normally rendered right after upload. Run this for photos
+uploaded before the pipeline existed, or whose rendering failed.
+
+Usage:
+    python scripts/generate_photo_variants.py [--all]
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Add backend directory to path
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.database import SessionLocal
+from app.models import FoodDiaryPhoto
+from app.services.image_pipeline import image_pipeline
+from app.storage import get_storage, key_for
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--all", action="store_true", help="Re-render photos that already have variants"
+    )
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        query = db.query(FoodDiaryPhoto.id, FoodDiaryPhoto.file_path)
+        if not args.all:
+            query = query.filter(FoodDiaryPhoto.variants.is_(None))
+        photos = query.order_by(FoodDiaryPhoto.id).all()
+    finally:
+        db.close()
+
+    storage = get_storage()
+    jobs = []
+    missing = 0
+    for photo_id, file_path in photos:
+        key = key_for(file_path)
+        if not storage.exists(key):
+            print(f"✗ Photo {photo_id}: file not found ({key})")
+            missing += 1
+            continue
+        jobs.append((photo_id, key))
+
+    futures = image_pipeline.submit_many(jobs)
+    failed = 0
+    for (photo_id, _), future in zip(jobs, futures):
+        try:
+            future.result()
+        except Exception as e:
+            print(f"✗ Photo {photo_id}: {e}")
+            failed += 1
+    image_pipeline.shutdown()
+
+    print(
+        f"✓ Rendered variants for {len(jobs) - failed} photos "
+        f"({failed} failed, {missing} missing files)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Food diary photo storage maintenance.
+
+Usage:
+    python scripts/photo_storage_maintenance.py purge [--grace-hours 24] [--dry-run]
+    python scripts/photo_storage_maintenance.py gc [--grace-hours 24]
+        [--quarantine-hours 168] [--dry-run]
+
+Deleting photos only releases their reference on the stored file. `purge`
+removes stored files (and their variants) that no photo has referenced for
+longer than the grace period.
+
+`gc` reconciles storage with the database: it repairs reference counts,
+quarantines files no photo row knows about (failed uploads, unfinished
+direct uploads, cascade-deleted visits), deletes expired quarantine, clears
+stale temp files and then purges like `purge`. Run `gc` daily, e.g. from
+cron.
+"""
+
+import argparse
+import sys
+from datetime import timedelta
+from pathlib import Path
+
+# Add backend directory to path
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.config import get_settings
+from app.database import SessionLocal
+from app.models import PhotoBlob
+from app.services.photo_gc import collect_garbage
+from app.services.photo_store import purge_unreferenced_blobs
+
+settings = get_settings()
+
+
+def purge(args):
+    db = SessionLocal()
+    try:
+        if args.dry_run:
+            count = db.query(PhotoBlob).filter(PhotoBlob.ref_count == 0).count()
+            print(f"{count} unreferenced blobs (before applying the grace period)")
+            return
+        purged = purge_unreferenced_blobs(db, timedelta(hours=args.grace_hours))
+        print(f"✓ Purged {len(purged)} unreferenced photo files")
+    finally:
+        db.close()
+
+
+def gc(args):
+    db = SessionLocal()
+    try:
+        report = collect_garbage(
+            db,
+            grace=timedelta(hours=args.grace_hours),
+            quarantine_for=timedelta(hours=args.quarantine_hours),
+            dry_run=args.dry_run,
+        )
+    finally:
+        db.close()
+
+    verb = "Would" if args.dry_run else "Did"
+    print(f"{verb} repair {len(report.repaired)} reference counts")
+    print(f"{verb} quarantine {len(report.quarantined)} orphaned files")
+    for key in report.quarantined:
+        print(f"  {key}")
+    print(f"{verb} delete {len(report.deleted)} expired quarantined files")
+    print(f"{verb} remove {report.staged} stale temp files")
+    if not args.dry_run:
+        print(f"✓ Purged {len(report.purged)} unreferenced photo files")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Photo storage maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    purge_parser = subparsers.add_parser(
+        "purge", help="Delete stored files no photo references any more"
+    )
+    purge_parser.add_argument(
+        "--grace-hours", type=float, default=settings.PHOTO_PURGE_GRACE_HOURS
+    )
+    purge_parser.add_argument("--dry-run", action="store_true")
+    purge_parser.set_defaults(func=purge)
+
+    gc_parser = subparsers.add_parser(
+        "gc", help="Reconcile stored files with the database and clean up"
+    )
+    gc_parser.add_argument(
+        "--grace-hours", type=float, default=settings.PHOTO_PURGE_GRACE_HOURS
+    )
+    gc_parser.add_argument(
+        "--quarantine-hours", type=float, default=settings.PHOTO_GC_QUARANTINE_HOURS
+    )
+    gc_parser.add_argument("--dry-run", action="store_true")
+    gc_parser.set_defaults(func=gc)
+
+    args = parser.parse_args()
+    try:
+        args.func(args)
+    except Exception as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
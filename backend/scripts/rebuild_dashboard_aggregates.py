@@ -0,0 +1,35 @@
+"""Recompute dashboard_daily_counts from SANSA and MNA responses
+
+The counts are normally maintained on every write. Rebuild after bulk
+imports, after editing visit dates/facilities or respondent demographics,
+or if the table is ever suspected to have drifted.
+"""
+
+import sys
+from pathlib import Path
+
+# Add backend directory to path
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.database import SessionLocal
+from app.services.dashboard_service import rebuild_dashboard_counts
+
+
+def main():
+    db = SessionLocal()
+
+    try:
+        buckets = rebuild_dashboard_counts(db)
+        db.commit()
+        print(f"✓ Rebuilt dashboard aggregates ({buckets} buckets)")
+    except Exception as e:
+        db.rollback()
+        print(f"✗ Error: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Rebuild respondent search keys (phone_normalized + trigram tokens)
+
+The migration that adds the search columns fills them once; run this
+whenever rows were written with the mapper events bypassed (raw SQL imports).
+"""
+
+import sys
+from pathlib import Path
+
+# Add backend directory to path
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.database import SessionLocal
+from app.models import Respondent
+from app.services.respondent_search import rebuild_tokens
+
+BATCH_SIZE = 500
+
+
+def main():
+    db = SessionLocal()
+
+    try:
+        last_id = 0
+        total = 0
+        while True:
+            batch = (
+                db.query(Respondent)
+                .filter(Respondent.id > last_id)
+                .order_by(Respondent.id)
+                .limit(BATCH_SIZE)
+                .all()
+            )
+            if not batch:
+                break
+
+            for respondent in batch:
+                rebuild_tokens(db, respondent)
+            db.commit()
+
+            last_id = batch[-1].id
+            total += len(batch)
+            print(f"Indexed {total} respondents")
+
+        print(f"✓ Search index rebuilt for {total} respondents")
+    except Exception as e:
+        db.rollback()
+        print(f"✗ Error: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""S3Storage against an in-process S3 (moto).
+
+Needs ``boto3`` and ``moto``; skipped when they are not installed.
+"""
+
+import hashlib
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+requests = pytest.importorskip("requests")
+
+from app import storage as storage_module  # noqa: E402
+from app.storage import S3Storage  # noqa: E402
+from app.uploads import SNIFF_BYTES, sniff_image_type  # noqa: E402
+
+BUCKET = "sansa-test"
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 60
+
+
+@pytest.fixture
+def s3(tmp_path, monkeypatch):
+    settings = storage_module.settings
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setattr(settings, "S3_BUCKET", BUCKET)
+    monkeypatch.setattr(settings, "S3_KEY_PREFIX", "uploads/")
+    monkeypatch.setattr(settings, "S3_REGION", "us-east-1")
+    monkeypatch.setattr(settings, "S3_ENDPOINT_URL", "")
+    monkeypatch.setattr(settings, "S3_ACCESS_KEY_ID", "")
+    monkeypatch.setattr(settings, "S3_SECRET_ACCESS_KEY", "")
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    with moto.mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET)
+        backend = S3Storage()
+        os.makedirs(backend.staging_dir, exist_ok=True)
+        yield backend
+
+
+def _staged(backend, data: bytes) -> str:
+    path = os.path.join(backend.staging_dir, "upload.part")
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def test_store_file_head_fetch_and_delete(s3):
+    key = "food_diary/objects/ab/cd/photo.jpg"
+
+    assert s3.store_file(_staged(s3, JPEG), key, "image/jpeg") is True
+    assert s3.exists(key)
+    assert s3.size(key) == len(JPEG)
+    assert s3.read_head(key, SNIFF_BYTES) == JPEG[:SNIFF_BYTES]
+
+    # Existing content is kept; the staged copy is consumed either way
+    staged = _staged(s3, b"other")
+    assert s3.store_file(staged, key, "image/jpeg") is False
+    assert not os.path.exists(staged)
+    assert s3.size(key) == len(JPEG)
+
+    path, is_temp = s3.fetch(key)
+    try:
+        assert is_temp
+        assert Path(path).read_bytes() == JPEG
+    finally:
+        os.remove(path)
+
+    s3.delete(key)
+    assert not s3.exists(key)
+    assert s3.size(key) is None
+
+
+def test_list_objects_and_move(s3):
+    keys = [
+        "food_diary/objects/aa/00/a.jpg",
+        "food_diary/objects/aa/00/variants/a_thumb.webp",
+        "food_diary/objects/bb/11/b.jpg",
+        "other/c.jpg",
+    ]
+    for key in keys:
+        s3.store_file(_staged(s3, JPEG), key, "image/jpeg")
+
+    listed = list(s3.list_objects("food_diary/"))
+    assert [key for key, _ in listed] == sorted(keys[:3])
+    assert all(isinstance(mtime, float) for _, mtime in listed)
+
+    s3.move(keys[2], "quarantine/" + keys[2])
+    assert not s3.exists(keys[2])
+    assert list(s3.list_keys("quarantine/")) == ["quarantine/" + keys[2]]
+
+
+def test_presigned_put_then_finalize_checks(s3):
+    key = "food_diary/objects/cd/ef/direct.jpg"
+    sha256 = hashlib.sha256(JPEG).hexdigest()
+
+    upload = s3.presign_put(key, "image/jpeg", len(JPEG), sha256)
+    assert upload["method"] == "PUT"
+    response = requests.put(upload["url"], data=JPEG, headers=upload["headers"])
+    assert response.status_code == 200
+
+    # What the finalize endpoint checks before attaching the photo
+    assert s3.size(key) == len(JPEG)
+    assert sniff_image_type(s3.read_head(key, SNIFF_BYTES)) == "image/jpeg"
+
+    assert s3.presign_get(key).startswith("https://")
+    s3.delete(key)
+    assert not s3.exists(key)
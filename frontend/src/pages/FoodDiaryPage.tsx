@@ -36,6 +36,7 @@ interface FoodDiaryEntry {
     id: number;
     file_path: string;
     original_filename: string;
+    variants?: { thumb?: string; medium?: string } | null;
   }>;
 }
 
@@ -403,7 +404,7 @@ export default function FoodDiaryPage() {
                       {entry.photos.map((photo) => (
                         <img
                           key={photo.id}
-                          src={`${import.meta.env.VITE_API_URL}${photo.file_path}`}
+                          src={`${import.meta.env.VITE_API_URL}${photo.variants?.thumb ?? photo.file_path}`}
                           alt={photo.original_filename}
                           className="w-24 h-24 object-cover rounded-lg border-2 border-gray-200 hover:border-primary-400 cursor-pointer"
                           onClick={() =>
@@ -175,6 +175,7 @@ export interface FoodDiaryPhoto {
   file_path: string;
   file_size_bytes?: number;
   mime_type?: string;
+  variants?: { thumb?: string; medium?: string } | null;
   uploaded_at: string;
 }
 